@@ -0,0 +1,144 @@
+"""Compare threaded and asyncio clones and permission updates on a synthetic tree.
+
+The threaded helpers run against the in-process fake, one worker thread and service
+per unit of concurrency. The async helpers run on a single thread against the same
+fake served over local HTTP, with up to `--concurrency` requests in flight. The HTTP
+server shares the process, so the async rows also pay for serving every request.
+
+Usage:
+    python -m benchmarks.bench_async --files 2000 --latency 0.05 --concurrency 16 64 256
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import threading
+import time
+
+from google.oauth2.credentials import Credentials
+
+from benchmarks.bench_suite import make_drive_tree
+from benchmarks.fake_drive import FakeDrive
+from benchmarks.fake_drive_server import FakeDriveServer
+from src.gdrive_api.async_client import AsyncDriveClient
+from src.gdrive_api.async_operations import apply_permissions_async, clone_drive_folder_async
+from src.gdrive_api.folder_clone import CloneProgress, clone_drive_folder
+from src.gdrive_api.permission_planner import apply_permissions
+from src.gdrive_api.request_executor import RequestExecutor, set_executor
+from src.gdrive_api.update_file_permissions import Role
+
+
+class PeakThreads:
+    """Samples the number of live threads in the background and keeps the maximum."""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self) -> "PeakThreads":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.wait(0.01):
+            # Not counting the sampler itself
+            self.peak = max(self.peak, threading.active_count() - 1)
+
+
+def run_threaded(n_files: int, latency: float, workers: int) -> dict:
+    drive = FakeDrive(latency=latency, page_size=1000)
+    source_id = make_drive_tree(drive, n_files)
+    destination_id = drive.add_folder("destination")
+    with PeakThreads() as threads, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        clone_drive_folder(
+            drive.service(),
+            source_id,
+            destination_id,
+            is_url=False,
+            max_workers=workers,
+            service_factory=drive.service,
+            progress=CloneProgress(report_every=0),
+        )
+        clone_seconds = time.perf_counter() - start
+        copies = [f["id"] for folder in drive.children(destination_id) for f in drive.children(folder["id"])]
+        start = time.perf_counter()
+        apply_permissions(
+            drive.service(),
+            {"reviewer@example.com": {file_id: Role.EDITOR for file_id in copies}},
+            is_url=False,
+        )
+        permission_seconds = time.perf_counter() - start
+    return {
+        "clone": clone_seconds,
+        "permissions": permission_seconds,
+        "threads": threads.peak,
+        "http": drive.http_requests,
+    }
+
+
+async def run_async(n_files: int, latency: float, concurrency: int) -> dict:
+    drive = FakeDrive(latency=latency, page_size=1000)
+    source_id = make_drive_tree(drive, n_files)
+    destination_id = drive.add_folder("destination")
+    server = FakeDriveServer(drive)
+    base_url = await server.start()
+    try:
+        with PeakThreads() as threads, contextlib.redirect_stdout(io.StringIO()):
+            async with AsyncDriveClient(
+                Credentials(token="benchmark"), max_concurrency=concurrency, base_url=base_url
+            ) as client:
+                start = time.perf_counter()
+                copies = await clone_drive_folder_async(
+                    client, source_id, destination_id, is_url=False
+                )
+                clone_seconds = time.perf_counter() - start
+                start = time.perf_counter()
+                await apply_permissions_async(
+                    client,
+                    {"reviewer@example.com": {file_id: Role.EDITOR for file_id in copies.values()}},
+                    is_url=False,
+                )
+                permission_seconds = time.perf_counter() - start
+    finally:
+        await server.close()
+    return {
+        "clone": clone_seconds,
+        "permissions": permission_seconds,
+        "threads": threads.peak,
+        "http": drive.http_requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per API call.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256])
+    args = parser.parse_args()
+    # Measure the code paths, not the client-side quota
+    set_executor(RequestExecutor(queries_per_second=None))
+    print(f"{args.files} files, {args.latency * 1000:.0f} ms per call")
+    print(
+        f"{'mode':>8} {'in flight':>9} {'threads':>8} {'clone s':>8} {'files/s':>8} "
+        f"{'perms s':>8} {'http':>6}"
+    )
+    for concurrency in args.concurrency:
+        for mode in ("threads", "asyncio"):
+            if mode == "threads":
+                stats = run_threaded(args.files, args.latency, concurrency)
+            else:
+                stats = asyncio.run(run_async(args.files, args.latency, concurrency))
+            print(
+                f"{mode:>8} {concurrency:>9} {stats['threads']:>8} {stats['clone']:>8.2f} "
+                f"{args.files / stats['clone']:>8.0f} {stats['permissions']:>8.2f} {stats['http']:>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Time conversation parsing with fuzzy matching on every cell versus `src.conversation_parser`.
+
+The `notebooks/v0` fixtures only hold a user turn, so each one is extended with
+assistant and code turns, a few of them with misspelled or restyled headers, and
+the set is replicated up to `--count` notebooks.
+
+Usage:
+    python -m benchmarks.bench_conversation_parser --count 5000 --processes 4
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import random
+import time
+from difflib import SequenceMatcher
+
+import nbformat
+
+from src.conversation_parser import parse_notebook, parse_notebooks
+
+FIXTURES = os.path.join(os.path.dirname(__file__), os.pardir, "notebooks", "v0")
+
+# Header variants written by hand in delivered notebooks
+USER_HEADERS = ["**User**", "**User**", "**User**", "**user**", "** User **", "**Usr**"]
+ASSISTANT_HEADERS = ["**Assistant**", "**Assistant**", "**Assistant:**", "**Asistant**"]
+CODE_HEADERS = ["# Assistant", "# Assistant", "#Assistant", "# assistant"]
+
+
+def make_notebooks(count: int, turns: int, seed: int = 0) -> list:
+    """Return `count` (file ID, notebook JSON) pairs built from the fixtures."""
+    rng = random.Random(seed)
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.ipynb"))):
+        with open(path) as f:
+            fixtures.append(json.load(f))
+    notebooks = []
+    for i in range(count):
+        notebook = json.loads(json.dumps(fixtures[i % len(fixtures)]))
+        cells = notebook["cells"]
+        for _ in range(turns):
+            cells.append(_cell("markdown", rng.choice(USER_HEADERS), "Can you show an example?"))
+            cells.append(_cell("markdown", rng.choice(ASSISTANT_HEADERS), "Sure, here it is:"))
+            cells.append(_cell("code", rng.choice(CODE_HEADERS), "print(sorted([3, 1, 2]))"))
+        notebooks.append((f"notebook{i}", json.dumps(notebook)))
+    return notebooks
+
+
+def _cell(cell_type: str, header: str, body: str) -> dict:
+    cell = {
+        "cell_type": cell_type,
+        "id": os.urandom(4).hex(),
+        "metadata": {},
+        "source": f"{header}\n\n{body}\n",
+    }
+    if cell_type == "code":
+        cell.update(execution_count=None, outputs=[])
+    return cell
+
+
+def _ratio(a: str, b: str) -> int:
+    try:
+        from fuzzywuzzy import fuzz
+    except ImportError:
+        return round(100 * SequenceMatcher(None, a, b).ratio())
+    return fuzz.ratio(a, b)
+
+
+def legacy_parse(file_id: str, data: str) -> dict:
+    """The parser of `parse_batch_into_jsonl.ipynb`: nbformat and a fuzzy score per cell."""
+    notebook = nbformat.read(io.StringIO(data), as_version=4)
+    messages = []
+    for cell in notebook.cells[2:]:
+        headers = ["**User**", "**Assistant**"] if cell["cell_type"] == "markdown" else ["# User", "# Assistant"]
+        lines = cell["source"].split("\n")
+        best_role, best_score = None, 0
+        for header in headers:
+            score = _ratio(lines[0], header)
+            if score > best_score and score > 25:
+                best_role, best_score = header, score
+        if best_score > 25:
+            messages.append(
+                {
+                    "role": best_role.replace("*", "").replace("#", "").strip(),
+                    "content": "\n".join(lines[1:]).strip("\n"),
+                    "type": cell["cell_type"],
+                }
+            )
+    return {"id": file_id, "messages": messages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    notebooks = make_notebooks(args.count, args.turns)
+    print(f"{len(notebooks)} notebooks, {os.cpu_count()} CPUs")
+    print(f"{'parser':>16} {'seconds':>8} {'notebooks/s':>12} {'messages':>9}")
+    runs = (
+        ("legacy", lambda: (legacy_parse(i, d) for i, d in notebooks)),
+        ("fast path", lambda: (parse_notebook(i, d) for i, d in notebooks)),
+        (f"{args.processes} processes", lambda: parse_notebooks(notebooks, args.processes)),
+    )
+    for name, run in runs:
+        started_at = time.perf_counter()
+        messages = sum(len(record["messages"]) for record in run())
+        elapsed = time.perf_counter() - started_at
+        print(f"{name:>16} {elapsed:>8.2f} {len(notebooks) / elapsed:>12.0f} {messages:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark `download_folder` against in-memory downloads of the same folder.
+
+The in-memory row downloads every file with a single `get_media` call, the way the
+notebooks did, and reports the peak memory that holds. The `download_folder` rows
+stream the files to disk in ranges over a thread pool, then run again over the
+now up-to-date local copy, which skips every file without downloading it.
+
+Usage:
+    python -m benchmarks.bench_download --files 200 --file-size 1000000 --latency 0.05 --workers 8
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fake_drive import FakeDrive
+from src.gdrive_api.folder_download import download_folder
+from src.gdrive_api.request_executor import RequestExecutor, execute, set_executor
+from src.gdrive_api.workers import ServicePool
+
+
+def make_folder(drive: FakeDrive, n_files: int, file_size: int) -> str:
+    root_id = drive.add_folder("batch")
+    for i in range(n_files):
+        drive.add_file(f"task_{i}.ipynb", root_id, os.urandom(file_size))
+    return root_id
+
+
+def download_in_memory(drive: FakeDrive, root_id: str, workers: int) -> int:
+    """Download every file of the folder into memory and return the bytes held."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    service_pool = ServicePool(drive.service)
+    file_ids = [f["id"] for f in drive.children(root_id)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        contents = list(
+            executor.map(
+                lambda file_id: execute(service_pool.get().files().get_media(fileId=file_id)),
+                file_ids,
+            )
+        )
+    return sum(len(content) for content in contents)
+
+
+def measure(fn) -> tuple[float, float]:
+    """Return the seconds and peak traced MiB of a call."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--file-size", type=int, default=1_000_000, help="Bytes per file.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per API call.")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--chunk-size", type=int, default=256 * 1024)
+    args = parser.parse_args()
+    # Measure the code paths, not the client-side quota
+    set_executor(RequestExecutor(queries_per_second=None))
+    drive = FakeDrive(latency=args.latency, page_size=1000)
+    root_id = make_folder(drive, args.files, args.file_size)
+    print(
+        f"{args.files} files of {args.file_size} bytes, {args.latency * 1000:.0f} ms per call, "
+        f"{args.workers} workers, {args.chunk_size} byte ranges"
+    )
+    print(f"{'run':<22} {'seconds':>8} {'peak MiB':>9} {'calls':>6}")
+
+    calls = drive.http_requests
+    seconds, peak = measure(lambda: download_in_memory(drive, root_id, args.workers))
+    print(f"{'in memory':<22} {seconds:>8.2f} {peak:>9.1f} {drive.http_requests - calls:>6}")
+
+    with tempfile.TemporaryDirectory() as destination:
+        for run in ("download_folder", "download_folder again"):
+            calls = drive.http_requests
+            seconds, peak = measure(
+                lambda: download_folder(
+                    drive.service(),
+                    root_id,
+                    destination,
+                    is_url=False,
+                    max_workers=args.workers,
+                    service_factory=drive.service,
+                    manifest_path=os.path.join(destination, ".manifest.json"),
+                    chunk_size=args.chunk_size,
+                )
+            )
+            print(f"{run:<22} {seconds:>8.2f} {peak:>9.1f} {drive.http_requests - calls:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Count folder lookup calls with per-segment queries versus `DriveFolderIndex`.
+
+Resolves every directory of a deep local tree the way `upload_folder` does, once
+against an empty destination and once against a destination that already holds
+the tree.
+
+Usage:
+    python -m benchmarks.bench_folder_index --depth 12 --width 2
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.fake_drive import FakeDrive
+from src.gdrive_api.request_executor import RequestExecutor, set_executor
+from src.gdrive_api.folder_index import DriveFolderIndex
+from src.gdrive_api.utils import create_folder_path, get_nested_folder_id
+
+
+def make_deep_tree(root: str, depth: int, width: int):
+    """Create `width` chains of `depth` nested directories under `root`."""
+    for chain in range(width):
+        path = root
+        for level in range(depth):
+            path = os.path.join(path, f"chain{chain}_level{level}")
+        os.makedirs(path)
+
+
+def relative_dirs(root: str) -> list:
+    return [os.path.relpath(dirpath, root) for dirpath, _, _ in os.walk(root)]
+
+
+def resolve_per_segment(service, paths: list, destination_id: str):
+    for relative_path in paths:
+        if relative_path == ".":
+            continue
+        if get_nested_folder_id(service, relative_path, destination_id) is None:
+            create_folder_path(service, relative_path, destination_id)
+
+
+def resolve_with_index(service, paths: list, destination_id: str):
+    index = DriveFolderIndex(service, destination_id)
+    for relative_path in paths:
+        index.ensure(relative_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depth", type=int, default=12)
+    parser.add_argument("--width", type=int, default=2)
+    args = parser.parse_args()
+    # Measure the code paths, not the client-side quota
+    set_executor(RequestExecutor(queries_per_second=None))
+
+    with tempfile.TemporaryDirectory() as source:
+        make_deep_tree(source, args.depth, args.width)
+        paths = relative_dirs(source)
+        print(f"{len(paths)} directories, depth {args.depth}")
+        print(f"{'strategy':>12} {'run':>6} {'files.list':>11} {'files.create':>13}")
+        for name, resolve in (("per-segment", resolve_per_segment), ("index", resolve_with_index)):
+            drive = FakeDrive()
+            destination_id = drive.add_folder("destination")
+            for run in ("empty", "again"):
+                drive.reset_calls()
+                resolve(drive.service(), paths, destination_id)
+                print(
+                    f"{name:>12} {run:>6} {drive.calls['files.list']:>11} "
+                    f"{drive.calls['files.create']:>13}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark `generate_tasks` against the notebook's serial generation loop.
+
+Both run every leaf of `topic_hierarchy.json` through a local stub of the
+chat-completions endpoint with the OpenAI client. The serial row sends one blocking
+request per topic and prompt, the way the notebook did. The `generate_tasks` rows
+send up to `--workers` at a time, first with an empty response cache, then again
+with the cache the first run filled, which sends no request at all. With
+`--fail-every`, that share of the requests fail with a 429 or a 500 and are retried.
+
+Usage:
+    python -m benchmarks.bench_generation --latency 0.2 --workers 16 --fail-every 10
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from openai import OpenAI
+
+from benchmarks.fake_chat_server import FakeChatServer
+from src.batch_planner import load_topic_hierarchy
+from src.task_generation import (
+    DEFAULT_MODEL,
+    MODIFICATION_PROMPT,
+    QUERY_PROMPT,
+    ChatRequestExecutor,
+    generate_tasks,
+)
+
+
+def generate_serially(client: OpenAI, topics: list[str]) -> int:
+    """The notebook's approach: one blocking request per topic and prompt, errors skipped."""
+    problems = 0
+    for prompt in (QUERY_PROMPT, MODIFICATION_PROMPT):
+        for topic in topics:
+            try:
+                client.chat.completions.create(
+                    model=DEFAULT_MODEL,
+                    messages=[
+                        {"role": "system", "content": prompt.system_prompt},
+                        {"role": "user", "content": prompt.user_prompt.format(topic=topic, n=prompt.n)},
+                    ],
+                    temperature=0.0,
+                    max_tokens=4096,
+                    seed=42,
+                    response_format={"type": "json_object"},
+                )
+                problems += 1
+            except Exception:
+                continue
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per request.")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--fail-every", type=int, default=10, help="Fail every n-th request, 0 never.")
+    args = parser.parse_args()
+    topics = load_topic_hierarchy()
+    print(
+        f"{len(topics)} topics x 2 prompts, {args.latency * 1000:.0f} ms per request, "
+        f"every {args.fail_every or 'no'} request failing, {args.workers} workers"
+    )
+    print(f"{'run':<26} {'seconds':>8} {'requests':>9} {'failed':>7}")
+
+    with FakeChatServer(args.latency, args.fail_every) as server:
+        client = OpenAI(base_url=server.base_url, api_key="stub", max_retries=0)
+        start = time.perf_counter()
+        answered = generate_serially(client, topics)
+        print(
+            f"{'serial':<26} {time.perf_counter() - start:>8.2f} {server.requests:>9} "
+            f"{2 * len(topics) - answered:>7}"
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache_path = os.path.join(directory, "cache.jsonl")
+            for run in ("generate_tasks", "generate_tasks cached"):
+                requests = server.requests
+                # Retry quickly, the stub's errors are not a real quota to back off from
+                executor = ChatRequestExecutor(requests_per_minute=None, base_delay=0.05)
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    report = generate_tasks(
+                        client,
+                        topics,
+                        os.path.join(directory, "tasks.jsonl"),
+                        cache_path=cache_path,
+                        max_workers=args.workers,
+                        executor=executor,
+                    )
+                print(
+                    f"{run:<26} {time.perf_counter() - start:>8.2f} "
+                    f"{server.requests - requests:>9} {len(report.failed):>7}"
+                )
+
+
+if __name__ == "__main__":
+    main()
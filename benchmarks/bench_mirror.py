@@ -0,0 +1,120 @@
+"""Compare re-listing a folder tree with refreshing a `DriveMirror` of it from the change feed.
+
+Each run builds a synthetic tree, mirrors it, then makes `--edits` changes (new files,
+trashed files and a folder moved out of the tree) and brings a view of the tree up to
+date twice: once by listing every folder again, once with `DriveMirror.refresh`. Both
+views are compared, so the mirror is checked for correctness as well as timed.
+
+Usage:
+    python -m benchmarks.bench_mirror --sizes 1000 10000 --edits 20 --latency 0.05
+"""
+import argparse
+import time
+
+from benchmarks.bench_suite import make_drive_tree
+from benchmarks.fake_drive import FakeDrive
+from src.gdrive_api.drive_mirror import DriveMirror
+from src.gdrive_api.request_executor import RequestExecutor, set_executor
+from src.gdrive_api.utils import FOLDER_MIME_TYPE, list_children
+
+
+def relist(service, root_id: str, page_size: int) -> set:
+    """Return the (parent ID, file ID) pairs of the tree, listing it a level at a time."""
+    pairs = set()
+    level = [root_id]
+    while level:
+        listed = set(level)
+        level = []
+        for item in list_children(service, listed, page_size=page_size):
+            pairs.update((p, item["id"]) for p in item["parents"] if p in listed)
+            if item["mimeType"] == FOLDER_MIME_TYPE:
+                level.append(item["id"])
+    return pairs
+
+
+def mirrored(mirror: DriveMirror, root_id: str) -> set:
+    pairs = set()
+    level = [root_id]
+    while level:
+        folder_id = level.pop()
+        for item in mirror.list_children(folder_id):
+            pairs.add((folder_id, item["id"]))
+            if item["mimeType"] == FOLDER_MIME_TYPE:
+                level.append(item["id"])
+    return pairs
+
+
+def edit_tree(drive: FakeDrive, root_id: str, n_edits: int):
+    """Add, trash and move files below the root, about a third of the edits each."""
+    service = drive.service()
+    folders = [f["id"] for f in drive.children(root_id) if f["mimeType"] == FOLDER_MIME_TYPE]
+    outside_id = drive.add_folder("outside")
+    for i in range(n_edits):
+        folder_id = folders[i % len(folders)]
+        if i % 3 == 0:
+            drive.add_file(f"added_{i}.ipynb", folder_id, b"{}")
+        elif i % 3 == 1:
+            victim = next(f for f in drive.children(folder_id) if not f["name"].startswith("added_"))
+            service.files().update(fileId=victim["id"], body={"trashed": True}).execute()
+        else:
+            victim = next(f for f in drive.children(folder_id) if not f["name"].startswith("added_"))
+            service.files().update(
+                fileId=victim["id"], addParents=outside_id, removeParents=folder_id
+            ).execute()
+
+
+def run(n_files: int, n_edits: int, latency: float, page_size: int) -> dict:
+    drive = FakeDrive(latency=latency, page_size=page_size)
+    root_id = make_drive_tree(drive, n_files)
+    service = drive.service()
+    mirror = DriveMirror(service, ":memory:", max_staleness=float("inf"), page_size=page_size)
+
+    calls = drive.http_requests
+    start = time.perf_counter()
+    mirror.add_root(root_id)
+    seed_seconds, seed_calls = time.perf_counter() - start, drive.http_requests - calls
+
+    edit_tree(drive, root_id, n_edits)
+
+    calls = drive.http_requests
+    start = time.perf_counter()
+    expected = relist(service, root_id, page_size)
+    relist_seconds, relist_calls = time.perf_counter() - start, drive.http_requests - calls
+
+    calls = drive.http_requests
+    start = time.perf_counter()
+    changes = mirror.refresh()
+    refresh_seconds, refresh_calls = time.perf_counter() - start, drive.http_requests - calls
+
+    if mirrored(mirror, root_id) != expected:
+        raise AssertionError("The refreshed mirror differs from a fresh listing")
+    mirror.close()
+    return {
+        "seed": (seed_seconds, seed_calls),
+        "relist": (relist_seconds, relist_calls),
+        "refresh": (refresh_seconds, refresh_calls),
+        "changes": changes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--edits", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per API call.")
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+    # Measure the code paths, not the client-side quota
+    set_executor(RequestExecutor(queries_per_second=None))
+    print(f"{args.edits} edits, {args.latency * 1000:.0f} ms per call")
+    print(f"{'files':>7} {'step':>8} {'seconds':>8} {'calls':>6}")
+    for n_files in args.sizes:
+        stats = run(n_files, args.edits, args.latency, args.page_size)
+        for step in ("seed", "relist", "refresh"):
+            seconds, calls = stats[step]
+            print(f"{n_files:>7} {step:>8} {seconds:>8.2f} {calls:>6}")
+        print(f"{n_files:>7} {'changes':>8} {stats['changes']:>8}")
+
+
+if __name__ == "__main__":
+    main()
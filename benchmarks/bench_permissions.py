@@ -0,0 +1,72 @@
+"""Compare per-pair, batched and planned permission updates against the fake Drive.
+
+Usage:
+    python -m benchmarks.bench_permissions --files 335 --users 20 --latency 0.005
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from benchmarks.fake_drive import FakeDrive
+from src.gdrive_api.request_executor import RequestExecutor, set_executor
+from src.gdrive_api.permission_planner import apply_permissions
+from src.gdrive_api.update_file_permissions import (
+    Role,
+    update_permissions_for_multiple_users,
+    update_permissions_in_batches,
+)
+
+
+def make_files(drive: FakeDrive, n_files: int, users: list) -> list:
+    """Create `n_files` files, every other one already shared with all users as readers
+    and every fourth one as writers."""
+    folder_id = drive.add_folder("batch")
+    file_ids = []
+    for i in range(n_files):
+        file_id = drive.add_file(f"task_{i}.ipynb", folder_id)
+        if i % 2:
+            for user in users:
+                drive.add_permission(file_id, user, "writer" if i % 4 == 3 else "reader")
+        file_ids.append(file_id)
+    return file_ids
+
+
+def run(strategy, n_files: int, n_users: int, latency: float) -> dict:
+    drive = FakeDrive(latency=latency)
+    users = [f"reviewer{i}@example.com" for i in range(n_users)]
+    file_ids = make_files(drive, n_files, users)
+    users_permissions = {user: {file_id: Role.EDITOR for file_id in file_ids} for user in users}
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        strategy(drive.service(), users_permissions, is_url=False)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "http_requests": drive.http_requests,
+        "api_calls": sum(drive.calls.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds per HTTP round-trip.")
+    args = parser.parse_args()
+    # Measure the code paths, not the client-side quota
+    set_executor(RequestExecutor(queries_per_second=None))
+
+    print(f"{args.files} files x {args.users} users")
+    print(f"{'strategy':>10} {'seconds':>9} {'http':>7} {'calls':>7}")
+    for name, strategy in (
+        ("per-pair", update_permissions_for_multiple_users),
+        ("batched", update_permissions_in_batches),
+        ("planned", apply_permissions),
+    ):
+        stats = run(strategy, args.files, args.users, args.latency)
+        print(f"{name:>10} {stats['seconds']:>9.2f} {stats['http_requests']:>7} {stats['api_calls']:>7}")
+
+
+if __name__ == "__main__":
+    main()
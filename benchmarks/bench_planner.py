@@ -0,0 +1,92 @@
+"""Benchmark `plan_batches` on synthetic task tables against the notebook's shuffle-and-slice.
+
+Tasks get random topics from `topic_hierarchy.json`, types and target lengths, and a
+tenth of them are marked as already shared. The shuffle-and-slice baseline checks
+every task against the shared list, the way the notebook did, and is skipped when
+that would take more than `--max-baseline-checks` comparisons. The spread columns
+are the largest difference, over all topics, types or lengths, between the number
+of tasks two batches got.
+
+Usage:
+    python -m benchmarks.bench_planner --sizes 1000 10000 100000 --batches 10
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.batch_planner import (
+    LENGTH_COLUMN,
+    TOPIC_COLUMN,
+    TYPE_COLUMN,
+    batch_balance,
+    load_topic_hierarchy,
+    plan_batches,
+)
+
+
+def make_tasks(n_tasks: int, topics: list[str], seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # Skewed like a real backlog, a few topics much more common than the rest
+    weights = rng.pareto(1.5, len(topics)) + 0.1
+    return pd.DataFrame(
+        {
+            "task_link": [f"https://colab.research.google.com/drive/task{i:08d}" for i in range(n_tasks)],
+            TOPIC_COLUMN: rng.choice(topics, n_tasks, p=weights / weights.sum()),
+            TYPE_COLUMN: rng.choice(["query", "modification"], n_tasks, p=[0.6, 0.4]),
+            LENGTH_COLUMN: rng.choice(["1", "2", "4", "8"], n_tasks),
+        }
+    )
+
+
+def shuffle_and_slice(links: list, shared: list, n_batches: int, seed: int) -> list:
+    """The notebook's approach: shuffle, slice at fixed offsets, check membership in a list."""
+    links = [link for link in links if link not in shared]
+    random.Random(seed).shuffle(links)
+    size = -(-len(links) // n_batches)
+    return [links[i : i + size] for i in range(0, len(links), size)]
+
+
+def spreads(plan: pd.DataFrame) -> list[int]:
+    return [int(batch_balance(plan, by)["spread"].max()) for by in (TOPIC_COLUMN, TYPE_COLUMN, LENGTH_COLUMN)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-baseline-checks", type=float, default=2e8)
+    args = parser.parse_args()
+    topics = load_topic_hierarchy()
+    print(f"{len(topics)} topics, {args.batches} batches")
+    print(
+        f"{'tasks':>7} {'method':>16} {'seconds':>8} {'topic':>6} {'type':>6} {'length':>6}"
+    )
+    for n_tasks in args.sizes:
+        tasks = make_tasks(n_tasks, topics, args.seed)
+        shared = tasks["task_link"].iloc[::10].tolist()
+
+        start = time.perf_counter()
+        plan = plan_batches(tasks, n_batches=args.batches, seed=args.seed, topics=topics, exclude=shared)
+        seconds = time.perf_counter() - start
+        topic, type_, length = spreads(plan)
+        print(f"{n_tasks:>7} {'plan_batches':>16} {seconds:>8.3f} {topic:>6} {type_:>6} {length:>6}")
+
+        if n_tasks * len(shared) > args.max_baseline_checks:
+            print(f"{n_tasks:>7} {'shuffle+slice':>16} {'skipped':>8}")
+            continue
+        start = time.perf_counter()
+        batches = shuffle_and_slice(tasks["task_link"].tolist(), shared, args.batches, args.seed)
+        seconds = time.perf_counter() - start
+        batch_of = {link: number for number, batch in enumerate(batches) for link in batch}
+        sliced = tasks[tasks["task_link"].isin(batch_of)]
+        sliced = sliced.assign(batch=sliced["task_link"].map(batch_of))
+        topic, type_, length = spreads(sliced)
+        print(f"{n_tasks:>7} {'shuffle+slice':>16} {seconds:>8.3f} {topic:>6} {type_:>6} {length:>6}")
+
+
+if __name__ == "__main__":
+    main()
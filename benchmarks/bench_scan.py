@@ -0,0 +1,104 @@
+"""Benchmark the single-pass `scan_folder` against the triple `os.walk` `upload_folder` used to do.
+
+The walk rows list a tree of small files the way `upload_folder` did before uploading:
+two walks counting the folders and files, then the walk doing the work. The scan row
+lists it once with `scan_folder`. The `upload_folder` rows upload the tree to the fake
+Drive, once collecting the results in the returned dict and once streaming them to a
+JSONL manifest, and report the peak memory traced during each, the fake's own
+bookkeeping included.
+
+Usage:
+    python -m benchmarks.bench_scan --files 100000 --dirs 1000 --upload-files 20000
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fake_drive import FakeDrive
+from src.gdrive_api.folder_upload import scan_folder, upload_folder
+from src.gdrive_api.request_executor import RequestExecutor, set_executor
+
+
+def make_tree(root: str, n_files: int, n_dirs: int):
+    """Write `n_files` empty JSONL files spread over `n_dirs` folders two levels deep."""
+    for i in range(n_files):
+        folder = os.path.join(root, f"export_{i % n_dirs % 10}", f"shard_{i % n_dirs}")
+        os.makedirs(folder, exist_ok=True)
+        open(os.path.join(folder, f"conversation_{i}.jsonl"), "wb").close()
+
+
+def walk_three_times(root: str) -> int:
+    """The previous approach: count folders and files in two walks, then walk again."""
+    total_dirs = sum([len(dirs) for _, dirs, _ in os.walk(root)])
+    total_files = sum([len(files) for _, _, files in os.walk(root)])
+    walked = 0
+    for _, _, files in os.walk(root):
+        walked += len(files)
+    return walked
+
+
+def scan_once(root: str) -> int:
+    return sum(len(folder.file_names) for folder in scan_folder(root))
+
+
+def measure(fn) -> tuple[float, float]:
+    """Return the seconds and peak traced MiB of a call."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--dirs", type=int, default=1000)
+    parser.add_argument("--upload-files", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    # Measure the code paths, not the client-side quota
+    set_executor(RequestExecutor(queries_per_second=None))
+
+    print(f"{'run':<28} {'files':>7} {'seconds':>8} {'peak MiB':>9}")
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, args.files, args.dirs)
+        for label, fn in (("os.walk x3", walk_three_times), ("scan_folder", scan_once)):
+            # Warm the dentry cache so both rows read metadata from memory
+            fn(root)
+            seconds = time.perf_counter()
+            files = fn(root)
+            seconds = time.perf_counter() - seconds
+            print(f"{label:<28} {files:>7} {seconds:>8.2f} {'':>9}")
+
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as results:
+        make_tree(root, args.upload_files, args.dirs)
+        for label, results_path in (
+            ("upload_folder dict", None),
+            ("upload_folder results_path", os.path.join(results, "results.jsonl")),
+        ):
+            drive = FakeDrive()
+            destination_id = drive.add_folder("destination")
+            seconds, peak = measure(
+                lambda: upload_folder(
+                    drive.service(),
+                    root,
+                    destination_id,
+                    is_url=False,
+                    max_workers=args.workers,
+                    service_factory=drive.service,
+                    results_path=results_path,
+                )
+            )
+            print(f"{label:<28} {args.upload_files:>7} {seconds:>8.2f} {peak:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Time package import and service construction in a fresh interpreter, eager versus lazy.
+
+Each scenario runs in its own subprocess so module caches start cold. A throwaway
+service account key is generated, no request is sent to Google.
+
+Usage:
+    python -m benchmarks.bench_startup --services 10 --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+SUBMODULES = [
+    "auth",
+    "backup_folder",
+    "folder_clone",
+    "folder_index",
+    "folder_sync",
+    "folder_upload",
+    "job_journal",
+    "permission_planner",
+    "request_executor",
+    "update_file_permissions",
+    "utils",
+    "workers",
+]
+
+# Import every submodule and build each service from the key file, as the package did
+EAGER = f"""
+import time
+started_at = time.perf_counter()
+{"".join(f"import src.gdrive_api.{name}; " for name in SUBMODULES)}
+from google.oauth2 import service_account
+from googleapiclient.discovery import build
+imported_at = time.perf_counter()
+
+def build_service(path):
+    credentials = service_account.Credentials.from_service_account_file(
+        filename=path, scopes=["https://www.googleapis.com/auth/drive"]
+    )
+    return build("drive", "v3", credentials=credentials)
+"""
+
+LAZY = """
+import time
+started_at = time.perf_counter()
+from src.gdrive_api import build_service
+imported_at = time.perf_counter()
+"""
+
+# Only the journal, e.g. a script inspecting a resume file
+LAZY_JOURNAL = """
+import time
+started_at = time.perf_counter()
+from src.gdrive_api import JobJournal
+imported_at = time.perf_counter()
+build_service = None
+"""
+
+MEASURE = """
+import json, sys
+first = rest = 0.0
+if build_service is not None:
+    t = time.perf_counter()
+    build_service(sys.argv[1])
+    first = time.perf_counter() - t
+    t = time.perf_counter()
+    for _ in range(int(sys.argv[2]) - 1):
+        build_service(sys.argv[1])
+    rest = time.perf_counter() - t
+print(json.dumps({
+    "import": imported_at - started_at,
+    "first": first,
+    "rest": rest,
+    "googleapiclient": "googleapiclient.discovery" in sys.modules,
+}))
+"""
+
+
+def write_key(path: str):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "type": "service_account",
+                "project_id": "benchmark",
+                "private_key_id": "0",
+                "private_key": pem,
+                "client_email": "benchmark@benchmark.iam.gserviceaccount.com",
+                "client_id": "0",
+                "token_uri": "https://oauth2.googleapis.com/token",
+            },
+            f,
+        )
+
+
+def run(code: str, key_path: str, services: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", code + MEASURE, key_path, str(services)],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--services", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        key_path = os.path.join(temp_dir, "key.json")
+        write_key(key_path)
+        print(f"median of {args.repeat} runs, {args.services} build_service calls per run")
+        print(
+            f"{'scenario':>14} {'import ms':>10} {'1st service ms':>15} "
+            f"{'next services ms':>17} {'googleapiclient':>16}"
+        )
+        for name, code in (("eager", EAGER), ("lazy", LAZY), ("lazy, journal", LAZY_JOURNAL)):
+            runs = [run(code, key_path, args.services) for _ in range(args.repeat)]
+            print(
+                f"{name:>14} {statistics.median(r['import'] for r in runs) * 1000:>10.1f} "
+                f"{statistics.median(r['first'] for r in runs) * 1000:>15.1f} "
+                f"{statistics.median(r['rest'] for r in runs) * 1000:>17.1f} "
+                f"{'loaded' if runs[0]['googleapiclient'] else 'not loaded':>16}"
+            )
+
+
+if __name__ == "__main__":
+    main()
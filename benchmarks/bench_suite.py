@@ -0,0 +1,233 @@
+"""Run every Drive and Sheets operation against the fake backend at several sizes.
+
+For each operation and size, reports the wall time, throughput and the API calls
+and HTTP round-trips it took, plus the quota errors injected along the way. These
+are the numbers every optimization is held to.
+
+Usage:
+    python -m benchmarks.bench_suite --sizes 100 1000 10000 --latency 0.001 --workers 8
+    python -m benchmarks.bench_suite --operations upload clone --quota-error-rate 0.01
+    python -m benchmarks.bench_suite --sizes 1000 --latency 0.005 --latencies
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.fake_drive import FakeDrive
+from src.gdrive_api.backup_folder import backup_folder
+from src.gdrive_api.folder_clone import CloneProgress, clone_drive_folder
+from src.gdrive_api.folder_upload import upload_folder
+from src.gdrive_api.instrumentation import Recorder, set_instrumentation
+from src.gdrive_api.permission_planner import apply_permissions
+from src.gdrive_api.request_executor import RequestExecutor, set_executor
+from src.gdrive_api.update_file_permissions import Role
+from src.sheets_utils import SheetsClient
+
+SHEET_COLUMNS = [
+    "task_link",
+    "assigned_to_email",
+    "completion_status",
+    "duration_mins",
+    "completion_date",
+    "metadata__type",
+    "metadata__topic",
+    "metadata__target_length",
+]
+
+
+def make_local_tree(root: str, n_files: int, n_dirs: int = 20, size: int = 1024):
+    for i in range(n_files):
+        folder = os.path.join(root, f"dir_{i % n_dirs}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"conversation_{i}.jsonl"), "wb") as f:
+            f.write(os.urandom(size))
+
+
+def make_drive_tree(drive: FakeDrive, n_files: int, n_dirs: int = 20) -> str:
+    root_id = drive.add_folder("source")
+    folders = [drive.add_folder(f"dir_{i}", root_id) for i in range(n_dirs)]
+    for i in range(n_files):
+        drive.add_file(f"conversation_{i}.jsonl", folders[i % n_dirs], b"{}")
+    return root_id
+
+
+def task_rows(n_rows: int) -> list:
+    return [
+        [
+            f"https://colab.research.google.com/drive/task{i}",
+            f"annotator{i % 40}@example.com" if i % 3 else "",
+            "Completed" if i % 3 == 2 else ("Claimed" if i % 3 else "Unclaimed"),
+            str(20 + i % 50) if i % 3 == 2 else "",
+            "2024-03-01" if i % 3 == 2 else "",
+            "query",
+            "algorithms > arrays",
+            str(1 + i % 5),
+        ]
+        for i in range(n_rows)
+    ]
+
+
+def bench_upload(drive: FakeDrive, n: int, workers: int, temp_dir: str) -> int:
+    source = os.path.join(temp_dir, "upload")
+    make_local_tree(source, n)
+    destination_id = drive.add_folder("destination")
+    drive.reset_calls()
+    result = upload_folder(
+        drive.service(),
+        source,
+        destination_id,
+        is_url=False,
+        max_workers=workers,
+        service_factory=drive.service,
+    )
+    return len(result)
+
+
+def bench_clone(drive: FakeDrive, n: int, workers: int, temp_dir: str) -> int:
+    source_id = make_drive_tree(drive, n)
+    destination_id = drive.add_folder("destination")
+    progress = CloneProgress(report_every=0)
+    drive.reset_calls()
+    clone_drive_folder(
+        drive.service(),
+        source_id,
+        destination_id,
+        is_url=False,
+        max_workers=workers,
+        service_factory=drive.service,
+        progress=progress,
+    )
+    return progress.copied_files
+
+
+def bench_backup(drive: FakeDrive, n: int, workers: int, temp_dir: str) -> int:
+    source_id = make_drive_tree(drive, n)
+    parent_id = drive.add_folder("backups")
+    drive.reset_calls()
+    backup_folder(
+        drive.service(),
+        source_id,
+        parent_id,
+        "2024/03/01",
+        is_url=False,
+        max_workers=workers,
+        service_factory=drive.service,
+    )
+    return n
+
+
+def bench_permissions(drive: FakeDrive, n: int, workers: int, temp_dir: str) -> int:
+    folder_id = drive.add_folder("batch")
+    file_ids = [drive.add_file(f"task_{i}.ipynb", folder_id) for i in range(n)]
+    for file_id in file_ids[::2]:
+        drive.add_permission(file_id, "reviewer@example.com", "reader")
+    drive.reset_calls()
+    apply_permissions(
+        drive.service(),
+        {"reviewer@example.com": {file_id: Role.EDITOR for file_id in file_ids}},
+        is_url=False,
+    )
+    return n
+
+
+def bench_sheets_read(drive: FakeDrive, n: int, workers: int, temp_dir: str) -> int:
+    sheet_id = drive.add_spreadsheet(
+        "tasks", {"Tasks": [SHEET_COLUMNS] + task_rows(n), "Reviews": [["Author Email"]]}
+    )
+    client = SheetsClient.from_services(drive.service(), drive.service())
+    drive.reset_calls()
+    # The second read is served from the revision cache
+    for _ in range(2):
+        client.read_dfs(sheet_id, ["Tasks", "Reviews"])
+    return n
+
+
+def bench_sheets_write(drive: FakeDrive, n: int, workers: int, temp_dir: str) -> int:
+    rows = task_rows(n)
+    sheet_id = drive.add_spreadsheet("tasks", {"Tasks": [SHEET_COLUMNS] + rows})
+    client = SheetsClient.from_services(drive.service(), drive.service())
+    df = pd.DataFrame(task_rows(n + n // 100), columns=SHEET_COLUMNS)
+    # One percent of the tasks change status, one percent are new
+    changed = df.index[: n : 100]
+    df.loc[changed, "completion_status"] = "Completed"
+    df.loc[changed, "duration_mins"] = "45"
+    drive.reset_calls()
+    client.write_df_incremental(sheet_id, "Tasks", df)
+    return n
+
+
+OPERATIONS = {
+    "upload": bench_upload,
+    "clone": bench_clone,
+    "backup": bench_backup,
+    "permissions": bench_permissions,
+    "sheets_read": bench_sheets_read,
+    "sheets_write": bench_sheets_write,
+}
+
+
+def run(operation: str, n: int, args) -> dict:
+    drive = FakeDrive(
+        latency=args.latency, page_size=args.page_size, quota_error_rate=args.quota_error_rate
+    )
+    recorder = Recorder()
+    set_instrumentation(recorder if args.latencies else None)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            items = OPERATIONS[operation](drive, n, args.workers, temp_dir)
+        elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "items_per_second": items / elapsed,
+        "api_calls": sum(drive.calls.values()),
+        "http_requests": drive.http_requests,
+        "quota_errors": sum(drive.quota_errors.values()),
+        "recorder": recorder,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument(
+        "--operations", nargs="+", choices=list(OPERATIONS), default=list(OPERATIONS)
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per HTTP round-trip.")
+    parser.add_argument("--page-size", type=int, default=1000, help="Maximum files per list page.")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument(
+        "--quota-error-rate", type=float, default=0.0, help="Fraction of calls failing with 429."
+    )
+    parser.add_argument(
+        "--latencies", action="store_true", help="Print p50/p95 latencies per API operation."
+    )
+    args = parser.parse_args()
+    # Measure the code paths, not the client-side quota. Injected errors back off briefly.
+    set_executor(RequestExecutor(queries_per_second=None, base_delay=0.001, max_delay=0.01))
+    print(
+        f"latency {args.latency * 1000:.1f} ms, {args.workers} workers, "
+        f"page size {args.page_size}, quota error rate {args.quota_error_rate}"
+    )
+    print(
+        f"{'operation':>13} {'items':>7} {'seconds':>9} {'items/s':>9} "
+        f"{'calls':>7} {'http':>7} {'429s':>5}"
+    )
+    for operation in args.operations:
+        for n in args.sizes:
+            stats = run(operation, n, args)
+            print(
+                f"{operation:>13} {n:>7} {stats['seconds']:>9.2f} {stats['items_per_second']:>9.0f} "
+                f"{stats['api_calls']:>7} {stats['http_requests']:>7} {stats['quota_errors']:>5}"
+            )
+            if args.latencies:
+                print(stats["recorder"].summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare serial and parallel `upload_folder` throughput against the fake Drive.
+
+Usage:
+    python -m benchmarks.bench_upload --files 500 --latency 0.02 --workers 1 8 16
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.fake_drive import FakeDrive
+from src.gdrive_api.request_executor import RequestExecutor, set_executor
+from src.gdrive_api.folder_upload import upload_folder
+
+
+def make_tree(root: str, n_files: int, n_dirs: int = 5, size: int = 2048):
+    """Write `n_files` small files spread over `n_dirs` subfolders of `root`."""
+    for i in range(n_files):
+        folder = os.path.join(root, f"dir_{i % n_dirs}")
+        os.makedirs(folder, exist_ok=True)
+        # Some names carry an apostrophe, which must survive Drive query quoting
+        name = f"conversation_{i}.jsonl" if i % 10 else f"user's conversation_{i}.jsonl"
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(os.urandom(size))
+
+
+def run(source: str, latency: float, workers: int, force_replace: bool = False) -> list:
+    """Upload `source` into a fresh fake Drive, then upload it again over the result."""
+    drive = FakeDrive(latency=latency)
+    destination_id = drive.add_folder("destination")
+    runs = []
+    for _ in range(2):
+        drive.reset_calls()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = upload_folder(
+                drive.service(),
+                source,
+                destination_id,
+                force_replace=force_replace,
+                is_url=False,
+                max_workers=workers,
+                service_factory=drive.service,
+            )
+        elapsed = time.perf_counter() - start
+        runs.append(
+            {
+                "workers": workers,
+                "files": len(result),
+                "seconds": elapsed,
+                "files_per_second": len(result) / elapsed,
+                "list_calls": drive.calls["files.list"],
+                "api_calls": sum(drive.calls.values()),
+            }
+        )
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per API call.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--force-replace", action="store_true", help="Replace files on the second run.")
+    args = parser.parse_args()
+    # Measure the code paths, not the client-side quota
+    set_executor(RequestExecutor(queries_per_second=None))
+
+    with tempfile.TemporaryDirectory() as source:
+        make_tree(source, args.files)
+        baseline = None
+        print(
+            f"{'run':>7} {'workers':>8} {'files':>7} {'seconds':>9} {'files/s':>9} "
+            f"{'lists':>6} {'calls':>7} {'speedup':>8}"
+        )
+        for workers in args.workers:
+            for label, stats in zip(("fresh", "again"), run(source, args.latency, workers, args.force_replace)):
+                if label == "fresh":
+                    baseline = baseline or stats["seconds"]
+                print(
+                    f"{label:>7} {stats['workers']:>8} {stats['files']:>7} {stats['seconds']:>9.2f} "
+                    f"{stats['files_per_second']:>9.1f} {stats['list_calls']:>6} {stats['api_calls']:>7} "
+                    f"{baseline / stats['seconds']:>7.1f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Serve a stub of the OpenAI chat-completions endpoint, for clients pointed at its `base_url`.
+
+Every request waits `latency` seconds on its own thread, so many requests can be in
+flight at once, and answers with a {"questions": [...]} JSON object built from the
+user message. Every `fail_every`-th request fails with a 429 or a 500 instead, to
+exercise the client's retries.
+"""
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeChatServer:
+    """A stub chat-completions server, started with `start` on a free local port."""
+
+    def __init__(self, latency: float = 0.0, fail_every: int = 0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.requests = 0
+        self.failures = 0
+        self.base_url = None
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self) -> str:
+        """Start serving in a background thread and return the base URL to point a client at."""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, payload = server.complete(self.path, body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+        return self.base_url
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeChatServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def complete(self, path: str, body: dict) -> tuple[int, dict]:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            number = next(self._counter)
+        if path != "/v1/chat/completions":
+            return 404, {"error": {"message": f"Unknown route {path}", "type": "invalid_request_error"}}
+        if self.fail_every and number % self.fail_every == 0:
+            with self._lock:
+                self.failures += 1
+            status = 429 if number // self.fail_every % 2 else 500
+            return status, {"error": {"message": "Stubbed transient error", "type": "server_error"}}
+        prompt = body["messages"][-1]["content"]
+        questions = [f"Question {i + 1} about {prompt!r}" for i in range(3)]
+        return 200, {
+            "id": f"chatcmpl-{number}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "system_fingerprint": "fp_stub",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": json.dumps({"questions": questions})},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
@@ -0,0 +1,891 @@
+"""In-process stand-in for the subset of the Drive v3 and Sheets v4 APIs used by `src`.
+
+The fake mimics the `Resource` call chain (`service.files().list(...).execute()`,
+`service.spreadsheets().values().get(...).execute()`) so the real helpers can run
+against it unchanged. Every `execute()` sleeps for a configurable latency and is
+counted per operation, which is what the benchmarks report on. Batch requests
+count one HTTP round-trip but every call inside them. Calls can be made to fail
+with quota errors at a configurable rate.
+"""
+import csv
+import hashlib
+import io
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+SPREADSHEET_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+GOOGLE_APPS_MIME_PREFIX = "application/vnd.google-apps."
+
+# Statuses googleapiclient's own `num_retries` retries
+CLIENT_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FakeRequest:
+    """A deferred call, executed against the backend on `execute()`."""
+
+    def __init__(self, backend: "FakeDrive", operation: str, handler, api: str = "drive"):
+        self._backend = backend
+        self._operation = operation
+        self._handler = handler
+        self.methodId = f"{api}.{operation}"
+        self.headers = {}
+        # The media body, like `HttpRequest.resumable`
+        self.resumable = None
+        self.resumable_uri = None
+        self.resumable_progress = 0
+        self.http = _FakeUploadHttp(backend)
+
+    def execute(self, num_retries: int = 0):
+        """Run the call, retrying retryable errors up to `num_retries` times like `HttpRequest`."""
+        for attempt in range(num_retries + 1):
+            self._backend.round_trip()
+            try:
+                return self._backend.call(self._operation, self._handler)
+            except HttpError as e:
+                if attempt == num_retries or e.resp.status not in CLIENT_RETRYABLE_STATUSES:
+                    raise
+
+    def next_chunk(self, num_retries: int = 0):
+        """Send a resumable upload in one chunk, starting a session first if needed."""
+        if self.resumable_uri is None:
+            self._backend.round_trip()
+            self.resumable_uri = f"https://fake.upload/{id(self)}"
+            return None, None
+        return None, self.execute()
+
+    def execute_in_batch(self):
+        return self._backend.call(self._operation, self._handler)
+
+
+class _FakeUploadHttp:
+    """Answers the status queries of resumable upload sessions, like `HttpRequest.http`.
+
+    The fake sends an upload in a single chunk, so a session never holds any bytes yet.
+    """
+
+    def __init__(self, backend: "FakeDrive"):
+        self._backend = backend
+
+    def request(self, uri: str, method: str = "GET", body=None, headers=None):
+        self._backend.round_trip()
+        return httplib2.Response({"status": "308"}), b""
+
+
+class FakeFiles:
+    """The `service.files()` collection."""
+
+    def __init__(self, backend: "FakeDrive"):
+        self._backend = backend
+
+    def list(self, q: str = "", pageSize: int = 100, pageToken: Optional[str] = None, **kwargs):
+        return FakeRequest(
+            self._backend, "files.list", lambda: self._backend.list_files(q, pageSize, pageToken)
+        )
+
+    def get(self, fileId: str, **kwargs):
+        return FakeRequest(self._backend, "files.get", lambda: self._backend.get_file(fileId))
+
+    def create(self, body: dict, media_body=None, **kwargs):
+        request = FakeRequest(
+            self._backend, "files.create", lambda: self._backend.create_file(body, media_body)
+        )
+        request.resumable = media_body
+        return request
+
+    def update(
+        self,
+        fileId: str,
+        body: Optional[dict] = None,
+        media_body=None,
+        addParents: Optional[str] = None,
+        removeParents: Optional[str] = None,
+        **kwargs,
+    ):
+        request = FakeRequest(
+            self._backend,
+            "files.update",
+            lambda: self._backend.update_file(
+                fileId, body or {}, media_body, addParents, removeParents
+            ),
+        )
+        request.resumable = media_body
+        return request
+
+    def copy(self, fileId: str, body: Optional[dict] = None, **kwargs):
+        return FakeRequest(
+            self._backend, "files.copy", lambda: self._backend.copy_file(fileId, body or {})
+        )
+
+    def get_media(self, fileId: str, **kwargs):
+        """Download a file's content, honouring a `Range` header set on the request."""
+        request = FakeRequest(self._backend, "files.get_media", None)
+        request._handler = lambda: self._backend.get_media(fileId, request.headers.get("Range"))
+        return request
+
+    def export(self, fileId: str, mimeType: str, **kwargs):
+        return FakeRequest(
+            self._backend, "files.export", lambda: self._backend.export_file(fileId, mimeType)
+        )
+
+
+class FakePermissions:
+    """The `service.permissions()` collection."""
+
+    def __init__(self, backend: "FakeDrive"):
+        self._backend = backend
+
+    def list(self, fileId: str, **kwargs):
+        return FakeRequest(
+            self._backend, "permissions.list", lambda: self._backend.list_permissions(fileId)
+        )
+
+    def create(self, fileId: str, body: dict, **kwargs):
+        return FakeRequest(
+            self._backend,
+            "permissions.create",
+            lambda: self._backend.create_permission(fileId, body),
+        )
+
+    def update(self, fileId: str, permissionId: str, body: dict, **kwargs):
+        return FakeRequest(
+            self._backend,
+            "permissions.update",
+            lambda: self._backend.update_permission(fileId, permissionId, body),
+        )
+
+    def delete(self, fileId: str, permissionId: str, **kwargs):
+        return FakeRequest(
+            self._backend,
+            "permissions.delete",
+            lambda: self._backend.delete_permission(fileId, permissionId),
+        )
+
+
+class FakeBatch:
+    """A `BatchHttpRequest`: one round-trip, per-call callbacks with (request_id, response, exception)."""
+
+    def __init__(self, backend: "FakeDrive", callback=None):
+        self._backend = backend
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request: FakeRequest, callback=None, request_id: Optional[str] = None):
+        if len(self._requests) >= 1000:
+            raise ValueError("Exceeded maximum number of requests in a batch.")
+        request_id = request_id if request_id is not None else str(len(self._requests) + 1)
+        self._requests.append((request_id, request, callback or self._callback))
+
+    def execute(self):
+        if len(self._requests) > self._backend.max_batch_size:
+            raise ValueError(f"Batch of {len(self._requests)} calls exceeds the Drive limit.")
+        self._backend.round_trip()
+        for request_id, request, callback in self._requests:
+            try:
+                response, exception = request.execute_in_batch(), None
+            except Exception as e:
+                response, exception = None, e
+            if callback is not None:
+                callback(request_id, response, exception)
+
+
+class FakeService:
+    """A per-thread facade over a shared `FakeDrive`, like a real `Resource`."""
+
+    def __init__(self, backend: "FakeDrive"):
+        self._backend = backend
+
+    def files(self) -> FakeFiles:
+        return FakeFiles(self._backend)
+
+    def permissions(self) -> FakePermissions:
+        return FakePermissions(self._backend)
+
+    def changes(self) -> "FakeChanges":
+        return FakeChanges(self._backend)
+
+    def spreadsheets(self) -> "FakeSpreadsheets":
+        return FakeSpreadsheets(self._backend)
+
+    def new_batch_http_request(self, callback=None) -> FakeBatch:
+        return FakeBatch(self._backend, callback)
+
+
+class FakeChanges:
+    """The `service.changes()` collection, a feed of every file created or updated."""
+
+    def __init__(self, backend: "FakeDrive"):
+        self._backend = backend
+
+    def getStartPageToken(self, **kwargs):
+        return FakeRequest(self._backend, "changes.getStartPageToken", self._backend.start_page_token)
+
+    def list(self, pageToken: str, pageSize: int = 100, **kwargs):
+        return FakeRequest(
+            self._backend, "changes.list", lambda: self._backend.list_changes(pageToken, pageSize)
+        )
+
+
+class FakeSpreadsheets:
+    """The `service.spreadsheets()` collection of the Sheets API."""
+
+    def __init__(self, backend: "FakeDrive"):
+        self._backend = backend
+
+    def get(self, spreadsheetId: str, **kwargs):
+        return FakeRequest(
+            self._backend,
+            "spreadsheets.get",
+            lambda: self._backend.get_spreadsheet(spreadsheetId),
+            api="sheets",
+        )
+
+    def batchUpdate(self, spreadsheetId: str, body: dict, **kwargs):
+        return FakeRequest(
+            self._backend,
+            "spreadsheets.batchUpdate",
+            lambda: self._backend.batch_update_spreadsheet(spreadsheetId, body["requests"]),
+            api="sheets",
+        )
+
+    def values(self) -> "FakeValues":
+        return FakeValues(self._backend)
+
+
+class FakeValues:
+    """The `service.spreadsheets().values()` collection of the Sheets API."""
+
+    def __init__(self, backend: "FakeDrive"):
+        self._backend = backend
+
+    def _request(self, operation: str, handler) -> FakeRequest:
+        return FakeRequest(self._backend, f"spreadsheets.values.{operation}", handler, api="sheets")
+
+    def get(self, spreadsheetId: str, range: str, **kwargs):
+        return self._request("get", lambda: self._backend.get_values(spreadsheetId, range))
+
+    def batchGet(self, spreadsheetId: str, ranges: list, **kwargs):
+        return self._request(
+            "batchGet",
+            lambda: {
+                "valueRanges": [self._backend.get_values(spreadsheetId, r) for r in ranges]
+            },
+        )
+
+    def update(self, spreadsheetId: str, range: str, body: dict, **kwargs):
+        return self._request(
+            "update", lambda: self._backend.update_values(spreadsheetId, range, body["values"])
+        )
+
+    def batchUpdate(self, spreadsheetId: str, body: dict, **kwargs):
+        def handler():
+            responses = [
+                self._backend.update_values(spreadsheetId, d["range"], d["values"])
+                for d in body["data"]
+            ]
+            return {
+                "totalUpdatedCells": sum(r["updatedCells"] for r in responses),
+                "responses": responses,
+            }
+
+        return self._request("batchUpdate", handler)
+
+    def append(self, spreadsheetId: str, range: str, body: dict, **kwargs):
+        return self._request(
+            "append", lambda: self._backend.append_values(spreadsheetId, range, body["values"])
+        )
+
+
+class FakeDrive:
+    """Shared, thread-safe state of the fake Drive.
+
+    Args:
+        latency: Seconds every HTTP round-trip sleeps, outside the lock.
+        page_size: Upper bound on the number of files returned by one `files.list` page.
+        max_batch_size: Maximum number of calls accepted in one batch request.
+        quota_error_rate: Fraction of calls failing with a 429 rate limit error instead of
+            running. Failed calls are counted under `quota_errors`, not `calls`.
+        seed: Seed of the quota error draws.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        page_size: int = 100,
+        max_batch_size: int = 100,
+        quota_error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.page_size = page_size
+        self.max_batch_size = max_batch_size
+        self.quota_error_rate = quota_error_rate
+        self.calls = Counter()
+        self.quota_errors = Counter()
+        self.http_requests = 0
+        self._files = {}
+        # parent ID -> {file ID: file}, so listing a folder does not scan every file
+        self._children = {}
+        # listing ID -> files matching its query, until its last page is read
+        self._listings = {}
+        # IDs of the files changed, in order, one entry per change
+        self._change_log = []
+        self._ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+
+    def service(self) -> FakeService:
+        """Return a new service bound to this backend."""
+        return FakeService(self)
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+            self.quota_errors.clear()
+            self.http_requests = 0
+
+    def round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+        self.count_round_trip()
+
+    def count_round_trip(self):
+        with self._lock:
+            self.http_requests += 1
+
+    def call(self, operation: str, handler):
+        with self._lock:
+            if self.quota_error_rate and self._random.random() < self.quota_error_rate:
+                self.quota_errors[operation] += 1
+                raise _http_error(429, "rateLimitExceeded", "Rate limit exceeded.")
+            self.calls[operation] += 1
+            return handler()
+
+    def add_folder(self, name: str, parent_id: Optional[str] = None) -> str:
+        """Create a folder directly in the backend without counting an API call."""
+        with self._lock:
+            return self._insert({"name": name, "mimeType": FOLDER_MIME_TYPE}, parent_id)["id"]
+
+    def add_file(self, name: str, parent_id: str, content: bytes = b"") -> str:
+        """Create a file directly in the backend without counting an API call."""
+        with self._lock:
+            return self._insert({"name": name}, parent_id, content)["id"]
+
+    def add_permission(self, file_id: str, email: str, role: str) -> str:
+        """Grant a user a role directly in the backend without counting an API call."""
+        with self._lock:
+            return self.create_permission(file_id, {"type": "user", "role": role, "emailAddress": email})["id"]
+
+    def add_spreadsheet(self, name: str, sheets: dict, parent_id: Optional[str] = None) -> str:
+        """Create a spreadsheet directly in the backend without counting an API call.
+
+        Args:
+            name: The file name of the spreadsheet.
+            sheets: A dictionary mapping each tab title to its rows of values.
+        """
+        with self._lock:
+            tabs = {}
+            for title, rows in sheets.items():
+                rows = [[_display(v) for v in row] for row in rows]
+                tabs[title] = {
+                    "rows": rows,
+                    "rowCount": max(1000, len(rows)),
+                    "columnCount": max([26] + [len(row) for row in rows]),
+                }
+            file = self._insert({"name": name, "mimeType": SPREADSHEET_MIME_TYPE}, parent_id)
+            file["sheets"] = tabs
+            return file["id"]
+
+    def sheet_rows(self, spreadsheet_id: str, title: str) -> list:
+        """Return the rows of a tab, bypassing the API surface."""
+        with self._lock:
+            return [list(row) for row in self._lookup(spreadsheet_id)["sheets"][title]["rows"]]
+
+    def permissions_of(self, file_id: str) -> list:
+        """Return the permissions of a file, bypassing the API surface."""
+        with self._lock:
+            return [dict(p) for p in self._lookup(file_id)["permissions"]]
+
+    def children(self, parent_id: str) -> list:
+        """Return the untrashed children of a folder, bypassing the API surface."""
+        with self._lock:
+            return [
+                self._public(f)
+                for f in self._children.get(parent_id, {}).values()
+                if not f["trashed"]
+            ]
+
+    # Handlers, always called with the lock held
+
+    def list_files(self, q: str, page_size: int, page_token: Optional[str]) -> dict:
+        if page_token:
+            # Later pages come from the result set of the first, like a server-side cursor
+            listing_id, start = page_token.split(":")
+            matches, start = self._listings[listing_id], int(start)
+        else:
+            predicate = parse_query(q)
+            parents = query_parents(q)
+            if parents is None:
+                candidates = self._files.values()
+            else:
+                candidates = {
+                    file_id: file
+                    for parent_id in parents
+                    for file_id, file in self._children.get(parent_id, {}).items()
+                }.values()
+            matches = [f for f in candidates if predicate(f)]
+            listing_id, start = str(next(self._ids)), 0
+        end = start + min(page_size or 100, self.page_size)
+        response = {"files": [self._public(f) for f in matches[start:end]]}
+        if end < len(matches):
+            self._listings[listing_id] = matches
+            response["nextPageToken"] = f"{listing_id}:{end}"
+        else:
+            self._listings.pop(listing_id, None)
+        return response
+
+    def get_file(self, file_id: str) -> dict:
+        return self._public(self._lookup(file_id))
+
+    def get_media(self, file_id: str, range_header: Optional[str] = None) -> bytes:
+        file = self._lookup(file_id)
+        if file["mimeType"].startswith(GOOGLE_APPS_MIME_PREFIX):
+            raise _http_error(
+                403, "fileNotDownloadable", "Only files with binary content can be downloaded."
+            )
+        # A fresh copy, like the body of a real response
+        content = memoryview(file["content"])
+        if range_header is None:
+            return bytes(content)
+        start, _, end = range_header.split("=", 1)[1].partition("-")
+        start = int(start)
+        if start >= len(content):
+            raise _http_error(416, "requestedRangeNotSatisfiable", "Range not satisfiable.")
+        return bytes(content[start : int(end) + 1 if end else None])
+
+    def export_file(self, file_id: str, mime_type: str) -> bytes:
+        """Export a Google-native file. Spreadsheets export their first tab as CSV."""
+        file = self._lookup(file_id)
+        if not file["mimeType"].startswith(GOOGLE_APPS_MIME_PREFIX):
+            raise _http_error(
+                403, "fileNotExportable", "Export only supports Docs Editors files."
+            )
+        if "sheets" not in file:
+            return file["content"]
+        output = io.StringIO()
+        for tab in file["sheets"].values():
+            csv.writer(output).writerows(tab["rows"])
+            break
+        return output.getvalue().encode()
+
+    def create_file(self, body: dict, media_body=None) -> dict:
+        parents = body.get("parents") or [None]
+        metadata = {k: v for k, v in body.items() if k != "parents"}
+        return self._public(self._insert(metadata, parents[0], _read_media(media_body)))
+
+    def update_file(
+        self,
+        file_id: str,
+        body: dict,
+        media_body=None,
+        add_parents: Optional[str] = None,
+        remove_parents: Optional[str] = None,
+    ) -> dict:
+        file = self._lookup(file_id)
+        file.update({k: v for k, v in body.items() if k != "parents"})
+        if media_body is not None:
+            self._set_content(file, _read_media(media_body))
+        for parent_id in (remove_parents or "").split(","):
+            if parent_id in file["parents"]:
+                file["parents"].remove(parent_id)
+                self._children[parent_id].pop(file_id, None)
+        for parent_id in (add_parents or "").split(","):
+            if parent_id and parent_id not in file["parents"]:
+                file["parents"].append(parent_id)
+                self._children.setdefault(parent_id, {})[file_id] = file
+        self._change_log.append(file_id)
+        return self._public(file)
+
+    def start_page_token(self) -> dict:
+        return {"startPageToken": str(len(self._change_log) + 1)}
+
+    def list_changes(self, page_token: str, page_size: int) -> dict:
+        start = int(page_token) - 1
+        end = min(start + min(page_size, 1000), len(self._change_log))
+        changes = []
+        for file_id in self._change_log[start:end]:
+            file = self._public(self._files[file_id])
+            file["parents"] = list(file["parents"])
+            changes.append({"fileId": file_id, "removed": False, "file": file})
+        response = {"changes": changes}
+        if end < len(self._change_log):
+            response["nextPageToken"] = str(end + 1)
+        else:
+            response["newStartPageToken"] = str(end + 1)
+        return response
+
+    def copy_file(self, file_id: str, body: dict) -> dict:
+        source = self._lookup(file_id)
+        metadata = {"name": source["name"], "mimeType": source["mimeType"]}
+        metadata.update({k: v for k, v in body.items() if k != "parents"})
+        parents = body.get("parents") or source["parents"]
+        return self._public(self._insert(metadata, parents[0], source["content"]))
+
+    def get_spreadsheet(self, spreadsheet_id: str) -> dict:
+        sheets = self._lookup(spreadsheet_id)["sheets"]
+        return {
+            "sheets": [
+                {
+                    "properties": {
+                        "title": title,
+                        "gridProperties": {
+                            "rowCount": tab["rowCount"],
+                            "columnCount": tab["columnCount"],
+                        },
+                    }
+                }
+                for title, tab in sheets.items()
+            ]
+        }
+
+    def batch_update_spreadsheet(self, spreadsheet_id: str, requests: list) -> dict:
+        """Apply structural requests. Only `addSheet` is supported."""
+        sheets = self._lookup(spreadsheet_id)["sheets"]
+        replies = []
+        for request in requests:
+            title = request["addSheet"]["properties"]["title"]
+            if title in sheets:
+                raise _http_error(400, "badRequest", f"A sheet with the name \"{title}\" already exists.")
+            sheets[title] = {"rows": [], "rowCount": 1000, "columnCount": 26}
+            replies.append({"addSheet": {"properties": {"title": title}}})
+        self._bump_version(spreadsheet_id)
+        return {"spreadsheetId": spreadsheet_id, "replies": replies}
+
+    def get_values(self, spreadsheet_id: str, a1_range: str) -> dict:
+        tab, (row_start, col_start, row_end, col_end) = self._tab(spreadsheet_id, a1_range)
+        rows = [row[col_start:col_end] for row in tab["rows"][row_start:row_end]]
+        # Like the real API, trailing empty cells and rows are left out
+        rows = [_rstrip_row(row) for row in rows]
+        while rows and not rows[-1]:
+            rows.pop()
+        response = {"range": a1_range}
+        if rows:
+            response["values"] = rows
+        return response
+
+    def update_values(self, spreadsheet_id: str, a1_range: str, values: list) -> dict:
+        tab, (row_start, col_start, _, _) = self._tab(spreadsheet_id, a1_range)
+        self._write_rows(tab, row_start, col_start, values)
+        self._bump_version(spreadsheet_id)
+        return {"updatedRange": a1_range, "updatedCells": sum(len(row) for row in values)}
+
+    def append_values(self, spreadsheet_id: str, a1_range: str, values: list) -> dict:
+        tab, (_, col_start, _, _) = self._tab(spreadsheet_id, a1_range)
+        last = len(tab["rows"])
+        while last > 0 and not any(tab["rows"][last - 1]):
+            last -= 1
+        self._write_rows(tab, last, col_start, values)
+        self._bump_version(spreadsheet_id)
+        return {"updates": {"updatedCells": sum(len(row) for row in values)}}
+
+    def _tab(self, spreadsheet_id: str, a1_range: str) -> tuple:
+        title, bounds = _parse_a1(a1_range)
+        sheets = self._lookup(spreadsheet_id)["sheets"]
+        if title not in sheets:
+            raise _http_error(400, "badRequest", f"Unable to parse range: {a1_range}")
+        return sheets[title], bounds
+
+    @staticmethod
+    def _write_rows(tab: dict, row_start: int, col_start: int, values: list):
+        rows = tab["rows"]
+        for offset, row in enumerate(values):
+            index = row_start + offset
+            while len(rows) <= index:
+                rows.append([])
+            target = rows[index]
+            if len(target) < col_start + len(row):
+                target.extend([""] * (col_start + len(row) - len(target)))
+            target[col_start : col_start + len(row)] = [_display(v) for v in row]
+            tab["columnCount"] = max(tab["columnCount"], len(target))
+        tab["rowCount"] = max(tab["rowCount"], len(rows))
+
+    def _bump_version(self, file_id: str):
+        file = self._lookup(file_id)
+        file["version"] = str(int(file["version"]) + 1)
+        file["modifiedTime"] = datetime.now(timezone.utc).isoformat()
+
+    def list_permissions(self, file_id: str) -> dict:
+        return {"permissions": [dict(p) for p in self._lookup(file_id)["permissions"]]}
+
+    def create_permission(self, file_id: str, body: dict) -> dict:
+        permission = {"id": f"perm{next(self._ids)}"}
+        permission.update(body)
+        self._lookup(file_id)["permissions"].append(permission)
+        return dict(permission)
+
+    def update_permission(self, file_id: str, permission_id: str, body: dict) -> dict:
+        permission = self._lookup_permission(file_id, permission_id)
+        permission.update(body)
+        return dict(permission)
+
+    def delete_permission(self, file_id: str, permission_id: str) -> str:
+        file = self._lookup(file_id)
+        file["permissions"].remove(self._lookup_permission(file_id, permission_id))
+        return ""
+
+    def _lookup_permission(self, file_id: str, permission_id: str) -> dict:
+        for permission in self._lookup(file_id)["permissions"]:
+            if permission["id"] == permission_id:
+                return permission
+        raise KeyError(f"Permission not found: {permission_id}")
+
+    def _insert(self, metadata: dict, parent_id: Optional[str], content: bytes = b"") -> dict:
+        file = {
+            "id": f"fake{next(self._ids)}",
+            "mimeType": "application/octet-stream",
+            "parents": [parent_id] if parent_id else [],
+            "trashed": False,
+            "permissions": [],
+        }
+        file.update(metadata)
+        file["webViewLink"] = f"https://drive.google.com/file/d/{file['id']}/view"
+        file["version"] = "0"
+        self._set_content(file, content)
+        self._files[file["id"]] = file
+        if parent_id:
+            self._children.setdefault(parent_id, {})[file["id"]] = file
+        self._change_log.append(file["id"])
+        return file
+
+    def _lookup(self, file_id: str) -> dict:
+        if file_id not in self._files:
+            raise KeyError(f"File not found: {file_id}")
+        return self._files[file_id]
+
+    @staticmethod
+    def _set_content(file: dict, content: bytes):
+        file["content"] = content
+        file["size"] = str(len(content))
+        file["md5Checksum"] = hashlib.md5(content).hexdigest()
+        file["modifiedTime"] = datetime.now(timezone.utc).isoformat()
+        file["version"] = str(int(file["version"]) + 1)
+
+    @staticmethod
+    def _public(file: dict) -> dict:
+        public = {k: v for k, v in file.items() if k not in ("content", "permissions", "sheets")}
+        if public["mimeType"] in (FOLDER_MIME_TYPE, SPREADSHEET_MIME_TYPE):
+            public.pop("size", None)
+            public.pop("md5Checksum", None)
+        return public
+
+
+def _http_error(status: int, reason: str, message: str) -> HttpError:
+    content = json.dumps(
+        {"error": {"code": status, "message": message, "errors": [{"reason": reason}]}}
+    ).encode("utf-8")
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+def _display(value) -> str:
+    """Store a written value the way Sheets shows it with USER_ENTERED input."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _rstrip_row(row: list) -> list:
+    end = len(row)
+    while end > 0 and row[end - 1] == "":
+        end -= 1
+    return row[:end]
+
+
+_CELL_RE = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+def _parse_a1(a1_range: str) -> tuple:
+    """Split an A1 range into its sheet title and 0-based (row start, col start, row end, col end).
+
+    Ends are exclusive and None when the range is open, e.g. `'Tab'!A:Z` or just `'Tab'`.
+    """
+    if a1_range.startswith("'"):
+        end = 1
+        while True:
+            end = a1_range.index("'", end)
+            if a1_range[end + 1 : end + 2] == "'":
+                end += 2
+                continue
+            break
+        title = a1_range[1:end].replace("''", "'")
+        cells = a1_range[end + 2 :] if a1_range[end + 1 : end + 2] == "!" else ""
+    else:
+        title, _, cells = a1_range.partition("!")
+    if not cells:
+        return title, (0, 0, None, None)
+    first, _, last = cells.partition(":")
+    first_col, first_row = _parse_cell(first)
+    last_col, last_row = _parse_cell(last or first)
+    return title, (
+        first_row - 1 if first_row else 0,
+        first_col - 1 if first_col else 0,
+        last_row if last_row else None,
+        last_col if last_col else None,
+    )
+
+
+def _parse_cell(cell: str) -> tuple:
+    letters, digits = _CELL_RE.match(cell).groups()
+    column = 0
+    for letter in letters:
+        column = column * 26 + ord(letter) - ord("A") + 1
+    return column, int(digits) if digits else 0
+
+
+def _read_media(media_body) -> bytes:
+    """Read the bytes behind a `MediaFileUpload` (or any `MediaUpload`)."""
+    if media_body is None:
+        return b""
+    return media_body.getbytes(0, media_body.size())
+
+
+_TOKEN_RE = re.compile(r"\s*('(?:\\.|[^'\\])*'|\(|\)|!=|=|[A-Za-z_]+)")
+
+
+def parse_query(q: str):
+    """Compile the subset of the Drive query language we use into a predicate.
+
+    Supports `and`/`or`/`not`, parentheses, `'<id>' in parents`, `name = / contains`,
+    `mimeType = / !=` and `trashed = true/false`.
+    """
+    tokens = _tokenize(q)
+    if not tokens:
+        return lambda f: True
+    position = [0]
+
+    def peek():
+        return tokens[position[0]] if position[0] < len(tokens) else None
+
+    def take():
+        token = tokens[position[0]]
+        position[0] += 1
+        return token
+
+    def expression():
+        terms = [conjunction()]
+        while peek() == "or":
+            take()
+            terms.append(conjunction())
+        return lambda f: any(term(f) for term in terms)
+
+    def conjunction():
+        factors = [factor()]
+        while peek() == "and":
+            take()
+            factors.append(factor())
+        return lambda f: all(factor(f) for factor in factors)
+
+    def factor():
+        token = take()
+        if token == "not":
+            inner = factor()
+            return lambda f: not inner(f)
+        if token == "(":
+            inner = expression()
+            take()
+            return inner
+        if token.startswith("'"):
+            value = _unquote(token)
+            take()  # in
+            take()  # parents
+            return lambda f: value in f["parents"]
+        operator = take()
+        value = take()
+        if token == "trashed":
+            expected = value == "true"
+            return lambda f: f["trashed"] == expected
+        value = _unquote(value)
+        if operator == "contains":
+            return lambda f: value in f.get(token, "")
+        if operator == "!=":
+            return lambda f: f.get(token) != value
+        return lambda f: f.get(token) == value
+
+    return expression()
+
+
+def query_parents(q: str) -> Optional[set]:
+    """Return the folder IDs one of which every file matching `q` has as parent.
+
+    None when the query does not restrict parents, e.g. under `not` or when only one
+    side of an `or` does.
+    """
+    tokens = _tokenize(q)
+    position = [0]
+
+    def peek():
+        return tokens[position[0]] if position[0] < len(tokens) else None
+
+    def expression():
+        terms = [conjunction()]
+        while peek() == "or":
+            position[0] += 1
+            terms.append(conjunction())
+        if any(term is None for term in terms):
+            return None
+        return set().union(*terms)
+
+    def conjunction():
+        factors = [factor()]
+        while peek() == "and":
+            position[0] += 1
+            factors.append(factor())
+        restricted = [f for f in factors if f is not None]
+        return min(restricted, key=len) if restricted else None
+
+    def factor():
+        token = tokens[position[0]]
+        position[0] += 1
+        if token == "not":
+            factor()
+            return None
+        if token == "(":
+            inner = expression()
+            position[0] += 1
+            return inner
+        position[0] += 2
+        if token.startswith("'"):
+            return {_unquote(token)}
+        return None
+
+    return expression() if tokens else None
+
+
+def _tokenize(q: str) -> list:
+    tokens = []
+    position = 0
+    q = q.strip()
+    while position < len(q):
+        match = _TOKEN_RE.match(q, position)
+        if match is None:
+            raise ValueError(f"Unsupported query near: {q[position:]!r}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+def _unquote(token: str) -> str:
+    return re.sub(r"\\(.)", r"\1", token[1:-1])
@@ -0,0 +1,175 @@
+"""Serve a `FakeDrive` backend over HTTP, for clients that talk to the REST API directly.
+
+Implements the Drive v3 routes `AsyncDriveClient` uses: files list/get/create/copy,
+resumable uploads and permissions. Every request waits for the backend's latency with
+`asyncio.sleep`, so many requests can be in flight at once, and is counted by the
+backend like the in-process fake counts `execute()` calls.
+"""
+import asyncio
+import itertools
+import json
+
+from aiohttp import web
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaInMemoryUpload
+
+from benchmarks.fake_drive import FakeDrive
+
+
+class FakeDriveServer:
+    """An aiohttp server in front of a `FakeDrive`, started with `start` on a free local port."""
+
+    def __init__(self, drive: FakeDrive):
+        self.drive = drive
+        self.base_url = None
+        self._sessions = {}
+        self._session_ids = itertools.count(1)
+        self._runner = None
+        app = web.Application(client_max_size=1024**3)
+        app.add_routes(
+            [
+                web.get("/drive/v3/files", self.list_files),
+                web.post("/drive/v3/files", self.create_file),
+                web.get("/drive/v3/files/{file_id}", self.get_file),
+                web.post("/drive/v3/files/{file_id}/copy", self.copy_file),
+                web.get("/drive/v3/files/{file_id}/permissions", self.list_permissions),
+                web.post("/drive/v3/files/{file_id}/permissions", self.create_permission),
+                web.patch(
+                    "/drive/v3/files/{file_id}/permissions/{permission_id}", self.update_permission
+                ),
+                web.delete(
+                    "/drive/v3/files/{file_id}/permissions/{permission_id}", self.delete_permission
+                ),
+                web.post("/upload/drive/v3/files", self.start_upload),
+                web.patch("/upload/drive/v3/files/{file_id}", self.start_upload),
+                web.put("/upload/session/{session_id}", self.upload_chunk),
+            ]
+        )
+        self._app = app
+
+    async def start(self) -> str:
+        """Start serving and return the base URL to point a client at."""
+        self._runner = web.AppRunner(self._app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _call(self, operation: str, handler, status: int = 200) -> web.Response:
+        if self.drive.latency:
+            await asyncio.sleep(self.drive.latency)
+        self.drive.count_round_trip()
+        try:
+            result = self.drive.call(operation, handler)
+        except HttpError as e:
+            return web.Response(status=e.resp.status, body=e.content, content_type="application/json")
+        except KeyError as e:
+            return _error(404, "notFound", str(e))
+        if result == "":
+            return web.Response(status=204)
+        return web.json_response(result, status=status)
+
+    async def list_files(self, request: web.Request) -> web.Response:
+        query = request.query
+        return await self._call(
+            "files.list",
+            lambda: self.drive.list_files(
+                query.get("q", ""), int(query.get("pageSize", 100)), query.get("pageToken")
+            ),
+        )
+
+    async def create_file(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        return await self._call("files.create", lambda: self.drive.create_file(body))
+
+    async def get_file(self, request: web.Request) -> web.Response:
+        file_id = request.match_info["file_id"]
+        return await self._call("files.get", lambda: self.drive.get_file(file_id))
+
+    async def copy_file(self, request: web.Request) -> web.Response:
+        file_id = request.match_info["file_id"]
+        body = await request.json()
+        return await self._call("files.copy", lambda: self.drive.copy_file(file_id, body))
+
+    async def list_permissions(self, request: web.Request) -> web.Response:
+        file_id = request.match_info["file_id"]
+        return await self._call("permissions.list", lambda: self.drive.list_permissions(file_id))
+
+    async def create_permission(self, request: web.Request) -> web.Response:
+        file_id = request.match_info["file_id"]
+        body = await request.json()
+        return await self._call(
+            "permissions.create", lambda: self.drive.create_permission(file_id, body)
+        )
+
+    async def update_permission(self, request: web.Request) -> web.Response:
+        file_id, permission_id = request.match_info["file_id"], request.match_info["permission_id"]
+        body = await request.json()
+        return await self._call(
+            "permissions.update", lambda: self.drive.update_permission(file_id, permission_id, body)
+        )
+
+    async def delete_permission(self, request: web.Request) -> web.Response:
+        file_id, permission_id = request.match_info["file_id"], request.match_info["permission_id"]
+        return await self._call(
+            "permissions.delete", lambda: self.drive.delete_permission(file_id, permission_id)
+        )
+
+    async def start_upload(self, request: web.Request) -> web.Response:
+        """Open a resumable upload session, for a new file or for an existing one."""
+        if self.drive.latency:
+            await asyncio.sleep(self.drive.latency)
+        self.drive.count_round_trip()
+        session_id = str(next(self._session_ids))
+        self._sessions[session_id] = {
+            "file_id": request.match_info.get("file_id"),
+            "metadata": await request.json() if request.can_read_body else {},
+            "size": int(request.headers["X-Upload-Content-Length"]),
+            "content": bytearray(),
+        }
+        location = f"{self.base_url}/upload/session/{session_id}"
+        return web.Response(status=200, headers={"Location": location})
+
+    async def upload_chunk(self, request: web.Request) -> web.Response:
+        """Receive a chunk of an upload, completing it once every byte has arrived."""
+        session = self._sessions.get(request.match_info["session_id"])
+        if session is None:
+            return _error(404, "notFound", "Upload session not found.")
+        # A retried chunk is sent again from the same offset
+        content_range = request.headers.get("Content-Range", "")
+        start = content_range.partition(" ")[2].partition("-")[0]
+        if start.isdigit():
+            del session["content"][int(start) :]
+        session["content"] += await request.read()
+        if len(session["content"]) < session["size"]:
+            if self.drive.latency:
+                await asyncio.sleep(self.drive.latency)
+            self.drive.count_round_trip()
+            return web.Response(
+                status=308, headers={"Range": f"bytes=0-{len(session['content']) - 1}"}
+            )
+        media = MediaInMemoryUpload(bytes(session["content"]))
+        if session["file_id"] is None:
+            response = await self._call(
+                "files.create", lambda: self.drive.create_file(session["metadata"], media)
+            )
+        else:
+            response = await self._call(
+                "files.update",
+                lambda: self.drive.update_file(session["file_id"], session["metadata"], media),
+            )
+        if response.status < 300:
+            del self._sessions[request.match_info["session_id"]]
+        return response
+
+
+def _error(status: int, reason: str, message: str) -> web.Response:
+    content = {"error": {"code": status, "message": message, "errors": [{"reason": reason}]}}
+    return web.Response(status=status, text=json.dumps(content), content_type="application/json")
@@ -0,0 +1,228 @@
+import json
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.sheets_utils import SheetsClient, SheetWriteReport
+
+# Separator of the levels of a topic, e.g. "algorithms > by_topic > sorting"
+TOPIC_SEPARATOR = " > "
+
+TOPIC_COLUMN = "metadata__topic"
+TYPE_COLUMN = "metadata__type"
+LENGTH_COLUMN = "metadata__target_length"
+
+# Columns of a batch tab of the task sheet, in order
+BATCH_COLUMNS = [
+    "task_link",
+    "assigned_to_email",
+    "completion_status",
+    "modified_question",
+    "duration_mins",
+    "completion_date",
+    "comments",
+    TYPE_COLUMN,
+    TOPIC_COLUMN,
+    LENGTH_COLUMN,
+]
+UNCLAIMED_STATUS = "Unclaimed"
+BATCH_SHEET_NAME = "Conversations_Batch_{}"
+
+# A Colab or Drive link, with the Drive file ID as the first group
+_FILE_LINK = r"^.*?(?:/drive/|/d/|[?&]id=)([A-Za-z0-9_-]+).*$"
+
+
+def load_topic_hierarchy(path: str = "topic_hierarchy.json") -> list[str]:
+    """Return the leaf topics of a topic hierarchy file, in file order.
+
+    Each topic is the path of keys down to a leaf, joined with `TOPIC_SEPARATOR` the
+    way notebooks state their topic, e.g. "algorithms > by_data_structure > arrays".
+    """
+    with open(path) as f:
+        hierarchy = json.load(f)
+    return list(_leaf_topics(hierarchy, []))
+
+
+def _leaf_topics(node: dict, path: list[str]) -> Iterable[str]:
+    for key, child in node.items():
+        if child:
+            yield from _leaf_topics(child, path + [key])
+        else:
+            yield TOPIC_SEPARATOR.join(path + [key])
+
+
+def task_keys(links: pd.Series) -> pd.Series:
+    """Return the Drive file ID of each task link, so Colab and Drive links of a notebook match.
+
+    Values without a recognizable file ID are kept as they are, stripped.
+    """
+    # A whole-string replace rather than an extract, which runs row by row in Python
+    return links.astype("string").str.strip().str.replace(_FILE_LINK, r"\1", regex=True)
+
+
+def assigned_task_keys(
+    client: SheetsClient, sheet_id: str, sheet_names: Iterable[str], key_column: str = "task_link"
+) -> set[str]:
+    """Return the keys of the tasks already written to some tabs, see `task_keys`.
+
+    The tabs are read with a single request, tabs without `key_column` are ignored.
+    """
+    keys = set()
+    for df in client.read_dfs(sheet_id, list(sheet_names)).values():
+        if key_column in df:
+            keys.update(task_keys(df[key_column]).dropna())
+    return keys
+
+
+def _sort_codes(values: pd.Series, order: Optional[list] = None) -> np.ndarray:
+    """Integer codes sorting `values` by `order`, then unknown values numerically and by text."""
+    values = values.astype("string").str.strip().fillna("")
+    uniques = pd.Series(values.unique())
+    if order is not None:
+        uniques = uniques[~uniques.isin(order)]
+    numbers = pd.to_numeric(uniques, errors="coerce")
+    rest = uniques.iloc[np.lexsort((uniques.to_numpy(dtype=str), numbers.fillna(np.inf)))]
+    categories = list(order or []) + rest.tolist()
+    return pd.Categorical(values, categories=categories).codes
+
+
+def plan_batches(
+    tasks: pd.DataFrame,
+    n_batches: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    seed: int = 0,
+    topics: Optional[list[str]] = None,
+    exclude: Iterable[str] = (),
+    first_batch: int = 1,
+    key_column: str = "task_link",
+) -> pd.DataFrame:
+    """Split tasks into batches with the same mix of topics, types and target lengths.
+
+    Tasks are grouped into strata of one topic, type and target length. Every stratum
+    is split evenly across the batches, and the tasks left over once it can't be split
+    further go to the batches that are smallest overall, then have the fewest tasks of
+    that topic, type and target length so far. Batch sizes end up within one task of
+    each other, and so does the share of every stratum. Which task of a stratum lands
+    in which batch follows a hash of the task's key and `seed`, so the same seed gives
+    the same plan whatever the order of the rows. Duplicate tasks and tasks whose key
+    is in `exclude` are left out.
+
+    Args:
+        tasks: The task table, with `key_column` and the metadata columns.
+        n_batches: Number of batches. Exactly one of `n_batches` and `batch_size` is required.
+        batch_size: Maximum number of tasks per batch, the number of batches following
+            from it. The batches are balanced, so some may be one task smaller.
+        seed: Seed of the assignment within strata.
+        topics: The known topics in display order, e.g. from `load_topic_hierarchy`,
+            so the plan lists related topics together. Other topics are ordered after them.
+        exclude: Task links or keys of the tasks to leave out, e.g. from `assigned_task_keys`.
+        first_batch: Number of the first batch.
+        key_column: The column identifying a task, see `task_keys`.
+
+    Returns:
+        The planned tasks with a "batch" column, ordered by batch, then stratum.
+    """
+    if (n_batches is None) == (batch_size is None):
+        raise ValueError("Exactly one of n_batches and batch_size is required.")
+    if (n_batches or batch_size) < 1:
+        raise ValueError("n_batches and batch_size must be at least 1.")
+    keys = task_keys(tasks[key_column])
+    exclude_keys = task_keys(pd.Series(list(exclude), dtype="string"))
+    keep = (~keys.duplicated() & ~keys.isin(exclude_keys)).to_numpy()
+    tasks = tasks[keep]
+    keys = keys[keep]
+    if n_batches is None:
+        n_batches = max(1, -(-len(tasks) // batch_size))
+
+    column = lambda name: tasks[name] if name in tasks else pd.Series("", index=tasks.index)
+    strata = np.stack(
+        [
+            _sort_codes(column(TOPIC_COLUMN), topics),
+            _sort_codes(column(TYPE_COLUMN)),
+            _sort_codes(column(LENGTH_COLUMN)),
+        ]
+    ).astype(np.int64)
+    hash_key = f"{seed % 10**16:016d}"
+    ranks = pd.util.hash_pandas_object(keys, index=False, hash_key=hash_key).to_numpy()
+    order = np.lexsort((ranks, strata[2], strata[1], strata[0]))
+    sorted_strata = strata[:, order]
+    starts = np.flatnonzero(
+        np.concatenate(([True], (sorted_strata[:, 1:] != sorted_strata[:, :-1]).any(axis=0)))
+    )
+    ends = np.append(starts[1:], len(order))
+
+    # Tasks per batch, overall and per topic, type and target length
+    totals = np.zeros(n_batches, dtype=np.int64)
+    marginals = [np.zeros((codes.max(initial=-1) + 1, n_batches), dtype=np.int64) for codes in strata]
+    batches = np.empty(len(order), dtype=np.int64)
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        stratum = sorted_strata[:, start]
+        counts = np.full(n_batches, (end - start) // n_batches)
+        leftover = (end - start) % n_batches
+        if leftover:
+            filled = sum(m[code] for m, code in zip(marginals, stratum))
+            # Smallest batches first, then the least filled ones, rotating between ties
+            priority = np.lexsort((np.roll(np.arange(n_batches), i), filled, totals))
+            counts[priority[:leftover]] += 1
+        batches[start:end] = np.repeat(np.arange(n_batches), counts)
+        totals += counts
+        for m, code in zip(marginals, stratum):
+            m[code] += counts
+
+    plan = tasks.iloc[order].assign(batch=batches + first_batch)
+    # Stratum order within each batch, ready to be written as is
+    return plan.iloc[np.argsort(batches, kind="stable")]
+
+
+def batch_balance(plan: pd.DataFrame, by: str = TOPIC_COLUMN) -> pd.DataFrame:
+    """Count the tasks of each value of `by` per batch, plus the spread between batches.
+
+    Returns:
+        A frame indexed by `by` with one count column per batch and a spread column,
+        the largest minus the smallest count.
+    """
+    counts = pd.crosstab(plan[by], plan["batch"])
+    counts["spread"] = counts.max(axis=1) - counts.min(axis=1)
+    return counts
+
+
+def write_batches(
+    client: SheetsClient,
+    sheet_id: str,
+    plan: pd.DataFrame,
+    sheet_name: str = BATCH_SHEET_NAME,
+    columns: list[str] = BATCH_COLUMNS,
+    key_column: str = "task_link",
+) -> dict[str, SheetWriteReport]:
+    """Write each batch of a plan to its own tab of the task sheet.
+
+    Missing tabs are added first, in one request. Tasks already in any of the batch
+    tabs are left as they are, so assignments and progress recorded in the sheet are
+    kept and rewriting a plan is a no-op. The other tasks are appended to their tab
+    with `SheetsClient.write_df_incremental`.
+
+    Args:
+        client: The Sheets client.
+        sheet_id: The ID of the task spreadsheet.
+        plan: The plan from `plan_batches`.
+        sheet_name: Template of the tab names, formatted with the batch number.
+        columns: The columns to write, missing ones written empty and a missing
+            completion_status as `UNCLAIMED_STATUS`.
+        key_column: The column identifying a task, in the plan and in the tabs.
+
+    Returns:
+        A dictionary mapping each tab name to its write report.
+    """
+    names = {batch: sheet_name.format(batch) for batch in plan["batch"].unique()}
+    client.add_sheets(sheet_id, names.values())
+    written = assigned_task_keys(client, sheet_id, names.values(), key_column)
+    rows = plan.reindex(columns=columns)
+    if "completion_status" in rows:
+        rows["completion_status"] = rows["completion_status"].fillna(UNCLAIMED_STATUS)
+    rows = rows.fillna("")
+    new = ~task_keys(plan[key_column]).isin(written).to_numpy()
+    return {
+        names[batch]: client.write_df_incremental(sheet_id, names[batch], batch_rows)
+        for batch, batch_rows in rows[new].groupby(plan["batch"][new], sort=True)
+    }
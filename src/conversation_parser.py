@@ -0,0 +1,280 @@
+import json
+import os
+import re
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from difflib import SequenceMatcher
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+from googleapiclient.discovery import Resource
+
+from src.gdrive_api.request_executor import execute
+from src.gdrive_api.workers import ServicePool
+from src.notebook_metadata import parse_task_metadata
+
+try:
+    from fuzzywuzzy import fuzz
+except ImportError:
+    fuzz = None
+
+MARKDOWN_HEADERS = ["**User**", "**Assistant**"]
+CODE_HEADERS = ["# User", "# Assistant"]
+
+# Minimum fuzzy score, out of 100, of a first line to count as a role header
+FUZZY_THRESHOLD = 25
+
+# Conversation cells start after the metadata and "# Conversation" cells
+FIRST_MESSAGE_CELL = 2
+
+_HEADER_NOISE = re.compile(r"[\s*#:_]+")
+
+
+def _normalize(line: str) -> str:
+    return _HEADER_NOISE.sub("", line).lower()
+
+
+def _role_name(header: str) -> str:
+    return header.replace("*", "").replace("#", "").strip()
+
+
+def _fuzzy_ratio(a: str, b: str) -> int:
+    if fuzz is not None:
+        return fuzz.ratio(a, b)
+    # The same score fuzzywuzzy computes without python-Levenshtein
+    return round(100 * SequenceMatcher(None, a, b).ratio())
+
+
+def match_role(first_line: str, headers: list[str]) -> Optional[str]:
+    """Return the role a cell's first line is a header of, or None.
+
+    Exact and normalized (case, whitespace and markup insensitive) matches are
+    resolved with string comparisons. Only lines matching neither are scored
+    against every header with fuzzy matching.
+
+    Args:
+        first_line: The first line of the cell.
+        headers: The role headers of the cell type, e.g. `MARKDOWN_HEADERS`.
+
+    Returns:
+        The role name, e.g. "User", or None if no header scores above `FUZZY_THRESHOLD`.
+    """
+    if first_line in headers:
+        return _role_name(first_line)
+    normalized = _normalize(first_line)
+    for header in headers:
+        if normalized == _normalize(header):
+            return _role_name(header)
+
+    best_role = None
+    best_score = FUZZY_THRESHOLD
+    for header in headers:
+        score = _fuzzy_ratio(first_line, header)
+        if score > best_score:
+            best_score = score
+            best_role = _role_name(header)
+    return best_role
+
+
+def parse_messages(notebook: dict) -> list[dict]:
+    """Extract the messages of a conversation notebook.
+
+    Args:
+        notebook: The notebook JSON as a dictionary.
+
+    Returns:
+        A list of {"role", "content", "type"} messages in cell order.
+    """
+    messages = []
+    for cell in notebook.get("cells", [])[FIRST_MESSAGE_CELL:]:
+        if cell["cell_type"] == "markdown":
+            headers = MARKDOWN_HEADERS
+        elif cell["cell_type"] == "code":
+            headers = CODE_HEADERS
+        else:
+            continue
+        source = cell["source"]
+        if isinstance(source, list):
+            source = "".join(source)
+        lines = source.split("\n")
+        role = match_role(lines[0], headers)
+        if role is not None:
+            messages.append(
+                {
+                    "role": role,
+                    "content": "\n".join(lines[1:]).strip("\n"),
+                    "type": cell["cell_type"],
+                }
+            )
+    return messages
+
+
+def parse_notebook(file_id: str, data: Union[bytes, str]) -> dict:
+    """Parse a downloaded notebook into a conversation record.
+
+    Returns:
+        A {"id", "metadata", "messages"} dictionary.
+    """
+    notebook = json.loads(data)
+    cells = notebook.get("cells", [])
+    metadata = {}
+    if cells:
+        source = cells[0]["source"]
+        metadata = parse_task_metadata("".join(source) if isinstance(source, list) else source)
+    return {"id": file_id, "metadata": metadata, "messages": parse_messages(notebook)}
+
+
+def read_notebook_file(file_path: str) -> bytes:
+    """Read a local notebook as bytes, which `json.loads` parses without decoding them first."""
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def _parse_chunk(chunk: list) -> list[dict]:
+    return [parse_notebook(file_id, data) for file_id, data in chunk]
+
+
+def _parse_file_chunk(chunk: list) -> list[dict]:
+    return [parse_notebook(file_id, read_notebook_file(path)) for file_id, path in chunk]
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _as_completed(executor: Executor, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """Run `fn` over `items` with at most `window` calls in flight, yielding results as they finish.
+
+    `items` is consumed lazily, so it can itself be a stream.
+    """
+    items = iter(items)
+    pending = set()
+    try:
+        while True:
+            for item in items:
+                pending.add(executor.submit(fn, item))
+                if len(pending) >= window:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def parse_notebooks(
+    notebooks: Iterable[tuple[str, Union[bytes, str]]],
+    processes: Optional[int] = None,
+    chunksize: int = 16,
+) -> Iterator[dict]:
+    """Parse many notebooks over a pool of processes, yielding records as they finish.
+
+    Header matching is CPU-bound, so a process pool lets it use every core instead of
+    being serialized by the GIL. Notebooks are sent to the workers `chunksize` at a
+    time to amortize the inter-process overhead.
+
+    Args:
+        notebooks: (file ID, notebook JSON) pairs. Consumed lazily, e.g. straight
+            from `download_notebooks`.
+        processes: Number of worker processes. Defaults to the number of CPUs.
+            1 parses in the calling process.
+        chunksize: Number of notebooks per task sent to a worker.
+
+    Yields:
+        {"id", "metadata", "messages"} records, in completion order.
+    """
+    if processes == 1:
+        for file_id, data in notebooks:
+            yield parse_notebook(file_id, data)
+        return
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        # Keep every worker busy without reading the whole input ahead
+        window = 2 * processes
+        for records in _as_completed(executor, _parse_chunk, _chunks(notebooks, chunksize), window):
+            yield from records
+
+
+def parse_local_notebooks(
+    local_paths: dict[str, str],
+    processes: Optional[int] = None,
+    chunksize: int = 16,
+) -> Iterator[dict]:
+    """Parse notebooks from local files, e.g. a batch folder fetched with `download_folder`.
+
+    Only the paths are sent to the worker processes, which read the files themselves,
+    so the notebooks are neither held in the calling process nor pickled across.
+
+    Args:
+        local_paths: File ID -> local path, as returned by `download_folder`.
+        processes: Number of worker processes. Defaults to the number of CPUs.
+            1 parses in the calling process.
+        chunksize: Number of notebooks per task sent to a worker.
+
+    Yields:
+        {"id", "metadata", "messages"} records, in completion order.
+    """
+    items = [(file_id, path) for file_id, path in local_paths.items() if path.endswith(".ipynb")]
+    if processes == 1:
+        for file_id, path in items:
+            yield parse_notebook(file_id, read_notebook_file(path))
+        return
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        window = 2 * processes
+        for records in _as_completed(executor, _parse_file_chunk, _chunks(items, chunksize), window):
+            yield from records
+
+
+def download_notebooks(
+    service_factory: Callable[[], Resource],
+    file_ids: Iterable[str],
+    max_workers: int = 8,
+) -> Iterator[tuple[str, bytes]]:
+    """Download notebooks over a bounded pool of threads, yielding them as they finish.
+
+    Args:
+        service_factory: A callable returning a new authorized service, e.g. from
+            `build_service_factory`.
+        file_ids: The IDs of the notebooks in Google Drive.
+        max_workers: Maximum number of concurrent downloads.
+
+    Yields:
+        (file ID, notebook JSON) pairs, in completion order.
+    """
+    service_pool = ServicePool(service_factory)
+
+    def download(file_id: str) -> tuple[str, bytes]:
+        data = execute(service_pool.get().files().get_media(fileId=file_id))
+        return file_id, data
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from _as_completed(executor, download, file_ids, 2 * max_workers)
+
+
+def download_and_parse_notebooks(
+    service_factory: Callable[[], Resource],
+    file_ids: Iterable[str],
+    max_workers: int = 8,
+    processes: Optional[int] = None,
+) -> Iterator[dict]:
+    """Download notebooks on threads and parse them on processes, overlapping both.
+
+    Yields:
+        {"id", "metadata", "messages"} records, in completion order.
+    """
+    return parse_notebooks(download_notebooks(service_factory, file_ids, max_workers), processes)
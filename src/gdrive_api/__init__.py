@@ -1,11 +1,122 @@
-from src.gdrive_api.backup_folder import backup_folder
-from src.gdrive_api.auth import build_service
-from src.gdrive_api.folder_clone import clone_drive_folder
-from src.gdrive_api.folder_upload import upload_folder, upload_file
-from src.gdrive_api.update_file_permissions import (
-    remove_permissions,
-    update_file_permissions,
-    update_permissions_for_multiple_files,
-    update_permissions_for_multiple_users,
-    update_permissions_for_user,
-)
+"""Google Drive helpers.
+
+Submodules are imported on first use of one of their names, so importing the package
+does not pull in googleapiclient until something that needs it is used.
+"""
+import importlib
+import sys
+import types
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.gdrive_api.async_client import AsyncDriveClient
+    from src.gdrive_api.async_operations import (
+        apply_permissions_async,
+        clone_drive_folder_async,
+        remove_permissions_async,
+        update_file_permissions_async,
+        upload_file_async,
+        upload_folder_async,
+    )
+    from src.gdrive_api.backup_folder import backup_folder
+    from src.gdrive_api.auth import build_service, build_service_factory
+    from src.gdrive_api.drive_mirror import DriveMirror
+    from src.gdrive_api.folder_clone import CloneProgress, clone_drive_folder
+    from src.gdrive_api.folder_download import DownloadError, download_file, download_folder
+    from src.gdrive_api.folder_index import DriveFolderIndex
+    from src.gdrive_api.folder_sync import HashManifest, SyncStats
+    from src.gdrive_api.folder_upload import upload_folder, upload_file
+    from src.gdrive_api.instrumentation import (
+        ApiEvent,
+        Instrumentation,
+        ProgressEvent,
+        Recorder,
+        get_instrumentation,
+        set_instrumentation,
+    )
+    from src.gdrive_api.job_journal import JobJournal
+    from src.gdrive_api.permission_planner import (
+        PermissionCache,
+        apply_permissions,
+        execute_plan,
+        plan_permissions,
+    )
+    from src.gdrive_api.request_executor import RequestExecutor, get_executor, set_executor
+    from src.gdrive_api.update_file_permissions import (
+        remove_permissions,
+        update_file_permissions,
+        update_permissions_for_multiple_files,
+        update_permissions_for_multiple_users,
+        update_permissions_for_user,
+        update_permissions_in_batches,
+    )
+
+_EXPORTS = {
+    "AsyncDriveClient": "async_client",
+    "apply_permissions_async": "async_operations",
+    "clone_drive_folder_async": "async_operations",
+    "remove_permissions_async": "async_operations",
+    "update_file_permissions_async": "async_operations",
+    "upload_file_async": "async_operations",
+    "upload_folder_async": "async_operations",
+    "backup_folder": "backup_folder",
+    "build_service": "auth",
+    "build_service_factory": "auth",
+    "DriveMirror": "drive_mirror",
+    "CloneProgress": "folder_clone",
+    "clone_drive_folder": "folder_clone",
+    "DownloadError": "folder_download",
+    "download_file": "folder_download",
+    "download_folder": "folder_download",
+    "DriveFolderIndex": "folder_index",
+    "HashManifest": "folder_sync",
+    "SyncStats": "folder_sync",
+    "upload_folder": "folder_upload",
+    "upload_file": "folder_upload",
+    "ApiEvent": "instrumentation",
+    "Instrumentation": "instrumentation",
+    "ProgressEvent": "instrumentation",
+    "Recorder": "instrumentation",
+    "get_instrumentation": "instrumentation",
+    "set_instrumentation": "instrumentation",
+    "JobJournal": "job_journal",
+    "PermissionCache": "permission_planner",
+    "apply_permissions": "permission_planner",
+    "execute_plan": "permission_planner",
+    "plan_permissions": "permission_planner",
+    "RequestExecutor": "request_executor",
+    "get_executor": "request_executor",
+    "set_executor": "request_executor",
+    "remove_permissions": "update_file_permissions",
+    "update_file_permissions": "update_file_permissions",
+    "update_permissions_for_multiple_files": "update_file_permissions",
+    "update_permissions_for_multiple_users": "update_file_permissions",
+    "update_permissions_for_user": "update_file_permissions",
+    "update_permissions_in_batches": "update_file_permissions",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{_EXPORTS[name]}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name: str, value):
+        # Importing the backup_folder or update_file_permissions submodule binds it on the
+        # package, which must not hide the function of the same name
+        if isinstance(value, types.ModuleType) and _EXPORTS.get(name) == name:
+            return
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
@@ -0,0 +1,388 @@
+import asyncio
+import json
+import mimetypes
+import os
+import time
+from typing import AsyncIterator, Iterable, Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from src.gdrive_api.auth import SCOPES, load_credentials
+from src.gdrive_api.instrumentation import ApiEvent, get_instrumentation
+from src.gdrive_api.request_executor import RequestExecutor, get_executor
+from src.gdrive_api.utils import FOLDER_MIME_TYPE, PARENTS_PER_QUERY, RemoteFile
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+DRIVE_API_URL = "https://www.googleapis.com"
+
+# Maximum number of requests in flight at once, and of pooled connections
+DEFAULT_CONCURRENCY = 100
+
+# Size of the chunks resumable uploads are sent in, a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+
+
+class AsyncDriveClient:
+    """Drive v3 client for asyncio, sending every request over one pooled aiohttp session.
+
+    Connections are kept alive and shared by all requests, and a semaphore bounds the
+    number of requests in flight, so hundreds of concurrent calls need neither threads
+    nor one service per thread. Requests take their quota tokens from, and are retried
+    with the policy of, the shared `RequestExecutor`, and are reported to the installed
+    instrumentation like the threaded calls. Errors are raised as `HttpError`, so callers
+    can handle them the same way.
+
+    Use it as an async context manager, or call `close` when done:
+
+        async with AsyncDriveClient.from_service_account_file(path) as client:
+            await client.copy_file(file_id, {"parents": [folder_id]})
+
+    Args:
+        credentials: Google credentials, e.g. from `auth.load_credentials`. Refreshed in a
+            worker thread when they expire.
+        max_concurrency: Maximum number of requests in flight at once.
+        executor: The executor whose token bucket and retry policy requests go through.
+            Defaults to the shared one.
+        base_url: The root URL of the API, e.g. a local server in benchmarks.
+    """
+
+    def __init__(
+        self,
+        credentials,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+        executor: Optional[RequestExecutor] = None,
+        base_url: str = DRIVE_API_URL,
+    ):
+        if aiohttp is None:
+            raise ImportError("AsyncDriveClient requires the aiohttp package.")
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.credentials = credentials
+        self.max_concurrency = max_concurrency
+        self.executor = executor
+        self.base_url = base_url.rstrip("/")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._refresh_lock = asyncio.Lock()
+        self._session = None
+
+    @classmethod
+    def from_service_account_file(
+        cls, service_account_json_secrets_path: str, **kwargs
+    ) -> "AsyncDriveClient":
+        """Create a client with the same cached credentials `auth.build_service` uses."""
+        return cls(load_credentials(service_account_json_secrets_path, SCOPES), **kwargs)
+
+    async def __aenter__(self) -> "AsyncDriveClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self) -> "aiohttp.ClientSession":
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        operation: str,
+        params: Optional[dict] = None,
+        body: Optional[dict] = None,
+        data: Optional[bytes] = None,
+        headers: Optional[dict] = None,
+        ok_statuses: Iterable[int] = (),
+    ) -> tuple:
+        """Send a request, throttled and retried like `RequestExecutor.execute`.
+
+        Args:
+            method: The HTTP method.
+            path: The path below the base URL, or an absolute URL, e.g. an upload session URI.
+            operation: The name the call is counted under, e.g. `drive.files.copy`.
+            params: The query parameters.
+            body: A JSON body.
+            data: A raw body, e.g. a chunk of an upload.
+            headers: Extra headers.
+            ok_statuses: Statuses other than 2xx that are not errors, e.g. 308 for uploads.
+
+        Returns:
+            A tuple of (status, case-insensitive response headers, parsed JSON response or None).
+        """
+        executor = self.executor or get_executor()
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        if params:
+            params = {k: _query_value(v) for k, v in params.items() if v is not None}
+        sent_bytes = len(data) if data else 0
+        started_at = time.perf_counter()
+        throttled = 0.0
+        status = 0
+        attempt = 0
+        try:
+            for attempt in range(executor.max_retries + 1):
+                throttled += await executor.throttle_async(operation)
+                try:
+                    async with self._semaphore:
+                        status, response_headers, content = await self._send(
+                            method, url, params, body, data, headers
+                        )
+                        if status == 401 and attempt == 0:
+                            # The token expired early, refresh it and send the request again
+                            await self._refresh(force=True)
+                            status, response_headers, content = await self._send(
+                                method, url, params, body, data, headers
+                            )
+                    if status < 300 or status in ok_statuses:
+                        return status, response_headers, json.loads(content) if content else None
+                    raise HttpError(
+                        httplib2.Response({"status": str(status), **response_headers}),
+                        content,
+                        uri=url,
+                    )
+                except Exception as e:
+                    if isinstance(e, HttpError):
+                        status = e.resp.status
+                    if attempt == executor.max_retries or not _is_retryable(executor, e):
+                        raise
+                    await executor.backoff_async(operation, attempt)
+        finally:
+            get_instrumentation().api_call(
+                ApiEvent(
+                    operation, status, attempt, time.perf_counter() - started_at - throttled, sent_bytes
+                )
+            )
+
+    async def _send(self, method, url, params, body, data, headers) -> tuple:
+        if not self.credentials.valid:
+            await self._refresh()
+        request_headers = {"Authorization": f"Bearer {self.credentials.token}"}
+        if headers:
+            request_headers.update(headers)
+        async with self.session.request(
+            method, url, params=params, json=body, data=data, headers=request_headers
+        ) as response:
+            content = await response.read()
+            # Kept as aiohttp's case-insensitive mapping, servers differ in header casing
+            return response.status, response.headers, content
+
+    async def _refresh(self, force: bool = False):
+        async with self._refresh_lock:
+            # Another request may have refreshed them while this one waited for the lock
+            if force or not self.credentials.valid:
+                from google.auth.transport.requests import Request
+
+                await asyncio.to_thread(self.credentials.refresh, Request())
+
+    async def list_files(
+        self, query: str, fields: str = "id, name", page_size: int = 1000
+    ) -> AsyncIterator[dict]:
+        """List the files matching a query, following all result pages.
+
+        Yields:
+            The file resources, restricted to `fields`.
+        """
+        page_token = None
+        while True:
+            _, _, response = await self.request(
+                "GET",
+                "/drive/v3/files",
+                "drive.files.list",
+                params={
+                    "q": query,
+                    "spaces": "drive",
+                    "fields": f"nextPageToken, files({fields})",
+                    "pageSize": page_size,
+                    "pageToken": page_token,
+                },
+            )
+            for file in response.get("files", []):
+                yield file
+            page_token = response.get("nextPageToken")
+            if page_token is None:
+                break
+
+    async def list_children(
+        self,
+        parent_ids: Iterable[str],
+        fields: str = "id, name, mimeType, parents",
+        query: Optional[str] = None,
+        page_size: int = 1000,
+    ) -> AsyncIterator[dict]:
+        """List the untrashed children of one or more folders. See `utils.list_children`."""
+        parent_ids = list(parent_ids)
+        for start in range(0, len(parent_ids), PARENTS_PER_QUERY):
+            parents = " or ".join(
+                f"'{parent_id}' in parents"
+                for parent_id in parent_ids[start : start + PARENTS_PER_QUERY]
+            )
+            full_query = f"({parents}) and trashed = false"
+            if query:
+                full_query = f"{full_query} and {query}"
+            async for file in self.list_files(full_query, fields, page_size):
+                yield file
+
+    async def list_folder_files(self, parent_id: str) -> dict[str, RemoteFile]:
+        """List the files directly inside a folder. See `utils.list_folder_files`."""
+        files = {}
+        query = f"'{parent_id}' in parents and mimeType != '{FOLDER_MIME_TYPE}' and trashed = false"
+        async for file in self.list_files(query, "id, name, size, md5Checksum, modifiedTime"):
+            if file["name"] not in files:
+                size = file.get("size")
+                files[file["name"]] = RemoteFile(
+                    id=file["id"],
+                    size=int(size) if size is not None else None,
+                    md5_checksum=file.get("md5Checksum"),
+                    modified_time=file.get("modifiedTime"),
+                )
+        return files
+
+    async def get_file(self, file_id: str, fields: str = "id, name, mimeType") -> dict:
+        _, _, response = await self.request(
+            "GET", f"/drive/v3/files/{file_id}", "drive.files.get", params={"fields": fields}
+        )
+        return response
+
+    async def create_folder(self, name: str, parent_id: str) -> str:
+        """Create a folder and return its ID."""
+        _, _, response = await self.request(
+            "POST",
+            "/drive/v3/files",
+            "drive.files.create",
+            params={"fields": "id"},
+            body={"name": name, "mimeType": FOLDER_MIME_TYPE, "parents": [parent_id]},
+        )
+        return response["id"]
+
+    async def copy_file(self, file_id: str, metadata: dict, fields: str = "id") -> dict:
+        _, _, response = await self.request(
+            "POST",
+            f"/drive/v3/files/{file_id}/copy",
+            "drive.files.copy",
+            params={"fields": fields},
+            body=metadata,
+        )
+        return response
+
+    async def create_file(self, metadata: dict, file_path: str, fields: str = "id") -> dict:
+        """Upload a new file with a resumable upload."""
+        session_uri = await self._start_upload(
+            "POST", "/upload/drive/v3/files", "drive.files.create", metadata, file_path, fields
+        )
+        return await self._upload_chunks(session_uri, "drive.files.create", file_path)
+
+    async def update_file(
+        self, file_id: str, file_path: str, metadata: Optional[dict] = None, fields: str = "id"
+    ) -> dict:
+        """Replace the content, and optionally the metadata, of a file with a resumable upload."""
+        session_uri = await self._start_upload(
+            "PATCH",
+            f"/upload/drive/v3/files/{file_id}",
+            "drive.files.update",
+            metadata or {},
+            file_path,
+            fields,
+        )
+        return await self._upload_chunks(session_uri, "drive.files.update", file_path)
+
+    async def _start_upload(
+        self, method: str, path: str, operation: str, metadata: dict, file_path: str, fields: str
+    ) -> str:
+        """Start a resumable upload session and return its URI."""
+        mime_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        _, headers, _ = await self.request(
+            method,
+            path,
+            operation,
+            params={"uploadType": "resumable", "fields": fields},
+            body=metadata,
+            headers={
+                "X-Upload-Content-Type": mime_type,
+                "X-Upload-Content-Length": str(os.path.getsize(file_path)),
+            },
+        )
+        return headers["Location"]
+
+    async def _upload_chunks(self, session_uri: str, operation: str, file_path: str) -> dict:
+        """Send a file to an upload session chunk by chunk, continuing where the server is."""
+        size = os.path.getsize(file_path)
+        offset = 0
+        while True:
+            chunk = await asyncio.to_thread(_read_chunk, file_path, offset, UPLOAD_CHUNK_SIZE)
+            content_range = (
+                f"bytes {offset}-{offset + len(chunk) - 1}/{size}" if chunk else f"bytes */{size}"
+            )
+            status, headers, response = await self.request(
+                "PUT",
+                session_uri,
+                operation,
+                data=chunk,
+                headers={"Content-Range": content_range},
+                ok_statuses=(308,),
+            )
+            if status != 308:
+                return response
+            # The Range header holds the bytes the server has, e.g. "bytes=0-1048575"
+            received = headers.get("Range")
+            offset = int(received.rpartition("-")[2]) + 1 if received else 0
+
+    async def list_permissions(self, file_id: str) -> list:
+        _, _, response = await self.request(
+            "GET",
+            f"/drive/v3/files/{file_id}/permissions",
+            "drive.permissions.list",
+            params={"fields": "permissions(id,emailAddress,role)"},
+        )
+        return response.get("permissions", [])
+
+    async def create_permission(self, file_id: str, permission: dict) -> dict:
+        _, _, response = await self.request(
+            "POST",
+            f"/drive/v3/files/{file_id}/permissions",
+            "drive.permissions.create",
+            body=permission,
+        )
+        return response
+
+    async def update_permission(self, file_id: str, permission_id: str, role: str) -> dict:
+        _, _, response = await self.request(
+            "PATCH",
+            f"/drive/v3/files/{file_id}/permissions/{permission_id}",
+            "drive.permissions.update",
+            body={"role": role},
+        )
+        return response
+
+    async def delete_permission(self, file_id: str, permission_id: str):
+        await self.request(
+            "DELETE",
+            f"/drive/v3/files/{file_id}/permissions/{permission_id}",
+            "drive.permissions.delete",
+        )
+
+
+def _is_retryable(executor: RequestExecutor, error: Exception) -> bool:
+    return isinstance(error, aiohttp.ClientConnectionError) or executor.is_retryable(error)
+
+
+def _query_value(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _read_chunk(file_path: str, offset: int, size: int) -> bytes:
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
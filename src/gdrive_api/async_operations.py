@@ -0,0 +1,384 @@
+"""Async counterparts of the folder upload, clone and permission helpers.
+
+They run on an `AsyncDriveClient`, so hundreds of calls are in flight from a single
+thread, bounded by the client's `max_concurrency`:
+
+    async with AsyncDriveClient.from_service_account_file(path) as client:
+        await clone_drive_folder_async(client, source_url, destination_url)
+"""
+import asyncio
+import os
+from typing import Awaitable, Iterable, Optional
+
+from googleapiclient.errors import HttpError
+
+from src.gdrive_api.async_client import AsyncDriveClient
+from src.gdrive_api.folder_upload import FolderNotFoundError, UploadError
+from src.gdrive_api.instrumentation import progress
+from src.gdrive_api.permission_planner import (
+    CREATE,
+    FAILED,
+    SKIP,
+    UPDATE,
+    PermissionCache,
+    plan_actions,
+    requested_changes,
+    skip_result,
+)
+from src.gdrive_api.update_file_permissions import PermissionOutcome, PermissionResult, Role
+from src.gdrive_api.utils import FOLDER_MIME_TYPE, extract_file_id, extract_folder_id
+
+
+async def _run_all(coroutines: Iterable[Awaitable]) -> list:
+    """Run coroutines concurrently and return their results in order.
+
+    The first failure cancels the coroutines still running and is raised, like the
+    thread pools of the threaded helpers.
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    if not tasks:
+        return []
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    for task in pending:
+        task.cancel()
+    for task in done:
+        if task.exception() is not None:
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise task.exception()
+    return [task.result() for task in tasks]
+
+
+async def ensure_folder_paths(
+    client: AsyncDriveClient, root_id: str, relative_paths: Iterable[str]
+) -> tuple[dict[str, str], set]:
+    """Resolve folder paths relative to a folder, creating the missing ones.
+
+    The tree is handled a level at a time: the existing child folders of a whole level
+    are listed together, then the missing folders of the level are created concurrently.
+    Folders created here are not listed, they are known to be empty.
+
+    Args:
+        client: The async Drive client.
+        root_id: The ID of the folder the paths are relative to.
+        relative_paths: Folder paths like `a/b`. "" and "." are the root itself.
+
+    Returns:
+        A tuple of (relative path -> folder ID, IDs of the folders that were created).
+    """
+    paths = set()
+    for path in relative_paths:
+        path = "" if path == "." else path.strip("/")
+        while path:
+            paths.add(path)
+            path = path.rpartition("/")[0]
+    folder_ids = {"": root_id}
+    created = set()
+    depth = 1
+    while True:
+        level = sorted(path for path in paths if path.count("/") == depth - 1)
+        if not level:
+            return folder_ids, created
+        parent_ids = {
+            folder_ids[path.rpartition("/")[0]]
+            for path in level
+            if folder_ids[path.rpartition("/")[0]] not in created
+        }
+        existing = {}
+        async for folder in client.list_children(
+            parent_ids, fields="id, name, parents", query=f"mimeType = '{FOLDER_MIME_TYPE}'"
+        ):
+            for parent_id in folder.get("parents", []):
+                # As names can be non-unique, the first folder listed for a name wins
+                existing.setdefault((parent_id, folder["name"]), folder["id"])
+        missing = []
+        for path in level:
+            parent_id = folder_ids[path.rpartition("/")[0]]
+            name = path.rpartition("/")[2]
+            folder_id = existing.get((parent_id, name))
+            if folder_id is None:
+                missing.append((path, parent_id, name))
+            else:
+                folder_ids[path] = folder_id
+        new_ids = await _run_all(
+            client.create_folder(name, parent_id) for _, parent_id, name in missing
+        )
+        for (path, _, _), folder_id in zip(missing, new_ids):
+            folder_ids[path] = folder_id
+            created.add(folder_id)
+        depth += 1
+
+
+async def upload_file_async(
+    client: AsyncDriveClient,
+    file_path: str,
+    parent_id: str,
+    force_replace: bool = False,
+    existing_files: Optional[dict] = None,
+) -> Optional[str]:
+    """Upload a file to Google Drive. See `folder_upload.upload_file`.
+
+    Args:
+        client: The async Drive client.
+        file_path: The path to the file to upload.
+        parent_id: The ID of the parent folder in Google Drive.
+        force_replace: If True, replace the file if it already exists.
+        existing_files: The listing of the parent folder from `list_folder_files`. If not
+            given, the parent folder is listed.
+
+    Returns:
+        File url if the file was uploaded, None otherwise.
+    """
+    file_name = os.path.basename(file_path)
+    if existing_files is None:
+        existing_files = await client.list_folder_files(parent_id)
+    existing_file = existing_files.get(file_name)
+    if existing_file and not force_replace:
+        progress("skipped", file_name, parent_id)
+        return None
+    if existing_file:
+        response = await client.update_file(existing_file.id, file_path)
+        progress("replaced", file_name, parent_id)
+    else:
+        response = await client.create_file({"name": file_name, "parents": [parent_id]}, file_path)
+        progress("uploaded", file_name, parent_id)
+    return f"https://drive.google.com/uc?id={response['id']}"
+
+
+async def upload_folder_async(
+    client: AsyncDriveClient,
+    source_folder_path: str,
+    destination_folder: str,
+    force_replace: bool = False,
+    is_url: bool = True,
+) -> dict[str, Optional[str]]:
+    """Recursively upload a local folder to Google Drive. See `folder_upload.upload_folder`.
+
+    The destination folder tree is resolved first, then every file is uploaded
+    concurrently, each destination folder being listed once.
+
+    Args:
+        client: The async Drive client.
+        source_folder_path: The path to the local folder to upload.
+        destination_folder: The ID or URL of the destination folder in Google Drive.
+        force_replace: If True, re-upload files even if they exist.
+        is_url: A flag indicating whether the provided destination is a URL. Default is True.
+
+    Raises:
+        FolderNotFoundError: If the local folder does not exist.
+        UploadError: If an error occurs during file upload.
+
+    Returns:
+        Dict of relative file path -> URL for the file after upload, URL is None if it was skipped.
+    """
+    destination_folder_id = extract_folder_id(destination_folder, is_url)
+    if not os.path.exists(source_folder_path):
+        raise FolderNotFoundError(f"Local folder '{source_folder_path}' does not exist.")
+    tree = [
+        (os.path.relpath(root, source_folder_path), root, files)
+        for root, _, files in os.walk(source_folder_path)
+    ]
+    folder_ids, created = await ensure_folder_paths(
+        client, destination_folder_id, [relative_path for relative_path, _, _ in tree]
+    )
+    folder_ids["."] = destination_folder_id
+
+    listed = [
+        folder_ids[relative_path]
+        for relative_path, _, files in tree
+        if files and folder_ids[relative_path] not in created
+    ]
+    listings = dict(zip(listed, await _run_all(client.list_folder_files(f) for f in listed)))
+
+    async def upload(file_path: str, parent_id: str) -> Optional[str]:
+        try:
+            return await upload_file_async(
+                client, file_path, parent_id, force_replace, listings.get(parent_id, {})
+            )
+        except Exception as e:
+            raise UploadError(
+                f"An error occurred while uploading '{os.path.basename(file_path)}': {e}"
+            )
+
+    jobs = [
+        (os.path.join(root, file_name), folder_ids[relative_path])
+        for relative_path, root, files in tree
+        for file_name in files
+    ]
+    urls = await _run_all(upload(file_path, parent_id) for file_path, parent_id in jobs)
+    uploaded_files = {
+        os.path.relpath(file_path, source_folder_path): url
+        for (file_path, _), url in zip(jobs, urls)
+    }
+
+    uploaded_files_count = sum(url is not None for url in uploaded_files.values())
+    print(f"Successfully uploaded {uploaded_files_count} files out of {len(uploaded_files)}.")
+    print(f"Skipped {len(uploaded_files) - uploaded_files_count} files.")
+    print(f"Successfully processed {len(tree) - 1} directories.")
+    return uploaded_files
+
+
+async def crawl_folder_async(client: AsyncDriveClient, folder_id: str) -> tuple[list, list]:
+    """Crawl a folder tree breadth-first. See `folder_clone.crawl_folder`."""
+    paths = {folder_id: ""}
+    folders = []
+    files = []
+    level = [folder_id]
+    while level:
+        next_level = []
+        async for item in client.list_children(level, fields="id, name, mimeType, parents"):
+            parent_id = next(p for p in item.get("parents", []) if p in paths)
+            parent_path = paths[parent_id]
+            if item["mimeType"] == FOLDER_MIME_TYPE:
+                if item["id"] in paths:
+                    continue
+                path = f"{parent_path}/{item['name']}" if parent_path else item["name"]
+                paths[item["id"]] = path
+                folders.append((path, item))
+                next_level.append(item["id"])
+            else:
+                files.append((parent_path, item))
+        level = next_level
+    return folders, files
+
+
+async def clone_drive_folder_async(
+    client: AsyncDriveClient,
+    source_folder: str,
+    destination_folder: str,
+    is_url: bool = True,
+) -> dict[str, str]:
+    """Clone a Google Drive folder with all its contents to another folder.
+
+    See `folder_clone.clone_drive_folder`. All files are copied concurrently once the
+    destination folder skeleton exists.
+
+    Args:
+        client: The async Drive client.
+        source_folder: The ID or URL of the source folder in Google Drive.
+        destination_folder: The ID or URL of the destination folder in Google Drive.
+        is_url: A flag indicating whether the provided source and destination are URLs. Default is True.
+
+    Returns:
+        Dict of source file ID -> ID of its copy.
+    """
+    source_folder_id = extract_folder_id(source_folder, is_url)
+    destination_folder_id = extract_folder_id(destination_folder, is_url)
+    # Both raise an HttpError if the folder does not exist
+    await _run_all(
+        [client.get_file(source_folder_id), client.get_file(destination_folder_id)]
+    )
+    folders, files = await crawl_folder_async(client, source_folder_id)
+    folder_ids, _ = await ensure_folder_paths(
+        client, destination_folder_id, [path for path, _ in folders]
+    )
+
+    async def copy(item: dict, dest_id: str) -> str:
+        response = await client.copy_file(item["id"], {"parents": [dest_id]})
+        progress("copied", item["name"], dest_id)
+        return response["id"]
+
+    copy_ids = await _run_all(copy(item, folder_ids[parent_path]) for parent_path, item in files)
+    print(f"Copied {len(copy_ids)} files.")
+    print(
+        f"Cloning of folder ID '{source_folder_id}' to folder ID '{destination_folder_id}' completed."
+    )
+    return {item["id"]: copy_id for (_, item), copy_id in zip(files, copy_ids)}
+
+
+async def remove_permissions_async(
+    client: AsyncDriveClient, file: str, user_email: str, is_url: bool = True
+) -> bool:
+    """
+    Remove permissions for a specific user on a specific file. See `update_file_permissions.remove_permissions`.
+
+    :return: True if permissions were found and removed, False otherwise.
+    """
+    file_id = extract_file_id(file, is_url)
+    for p in await client.list_permissions(file_id):
+        if p.get("emailAddress") == user_email:
+            await client.delete_permission(file_id, p["id"])
+            progress("permission_removed", user_email, file_id)
+            return True
+    progress("permission_not_found", user_email, file_id)
+    return False
+
+
+async def update_file_permissions_async(
+    client: AsyncDriveClient, file: str, user_email: str, role: Role, is_url: bool = True
+):
+    """
+    Update permissions for a specific user on a specific file. See `update_file_permissions.update_file_permissions`.
+    """
+    if role not in list(Role):
+        raise ValueError(f"Invalid role. Must be one of {list(Role)}")
+    try:
+        file_id = extract_file_id(file, is_url)
+        await remove_permissions_async(client, file_id, user_email, is_url=False)
+        if role != Role.REMOVE:
+            permission = {"type": "user", "role": role.value, "emailAddress": user_email}
+            await client.create_permission(file_id, permission)
+            progress("permission_updated", user_email, file_id)
+    except HttpError as error:
+        progress("permission_failed", user_email, file)
+        print(f"An error occurred: {error}")
+
+
+async def apply_permissions_async(
+    client: AsyncDriveClient,
+    users_permissions: "dict[str, dict[str, Role]]",
+    is_url: bool = True,
+    cache: Optional[PermissionCache] = None,
+) -> "dict[tuple[str, str], PermissionResult]":
+    """
+    Plan and execute the minimal permission writes for multiple users across multiple files.
+
+    Like `permission_planner.apply_permissions`, but every ACL fetch and every write is its
+    own request, all of them in flight concurrently instead of grouped in batch requests.
+    For large plans, prefer the batched `apply_permissions`, which sends far fewer requests.
+
+    :param client: The async Drive client.
+    :param users_permissions: A dictionary mapping user emails to another dictionary that maps file IDs or URLs to Roles.
+    :param is_url: A flag indicating whether the provided files are URLs. Default is True.
+    :param cache: A PermissionCache to reuse ACLs across calls.
+    :return: A dictionary mapping (file ID, user email) to the PermissionResult of that pair.
+    """
+    if cache is None:
+        cache = PermissionCache()
+    changes = requested_changes(users_permissions, is_url)
+    # Planned from this snapshot, as cache entries may expire while the missing ACLs are fetched
+    acls = {file_id: cache.get(file_id) for file_id, _ in changes}
+    missing = [file_id for file_id, acl in acls.items() if acl is None]
+    errors = {}
+
+    async def fetch(file_id: str):
+        try:
+            acls[file_id] = cache.put(file_id, await client.list_permissions(file_id))
+        except HttpError as error:
+            errors[file_id] = str(error)
+
+    await _run_all(fetch(file_id) for file_id in missing)
+
+    async def write(a) -> PermissionResult:
+        if a.action in (SKIP, FAILED):
+            return skip_result(a)
+        try:
+            if a.action == CREATE:
+                permission = {"type": "user", "role": a.role.value, "emailAddress": a.user_email}
+                await client.create_permission(a.file_id, permission)
+                outcome = PermissionOutcome.CREATED
+            elif a.action == UPDATE:
+                await client.update_permission(a.file_id, a.permission_id, a.role.value)
+                outcome = PermissionOutcome.UPDATED
+            else:
+                await client.delete_permission(a.file_id, a.permission_id)
+                outcome = PermissionOutcome.REMOVED
+        except Exception as e:
+            return PermissionResult(PermissionOutcome.FAILED, str(e))
+        finally:
+            cache.invalidate(a.file_id)
+        progress(f"permission_{outcome.value}", a.user_email, a.file_id)
+        return PermissionResult(outcome)
+
+    actions = plan_actions(changes, acls, errors)
+    results = await _run_all(write(a) for a in actions)
+    return {(a.file_id, a.user_email): result for a, result in zip(actions, results)}
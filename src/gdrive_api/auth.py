@@ -1,12 +1,67 @@
+import functools
+import threading
+from typing import Callable, Sequence
+
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from googleapiclient.discovery import Resource, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+SCOPES = ["https://www.googleapis.com/auth/drive"]
+
+_local = threading.local()
+
+
+@functools.lru_cache(maxsize=None)
+def discovery_document(service_name: str, version: str) -> str:
+    """Return the discovery document bundled with googleapiclient, read from disk once per process.
+
+    Building from it never fetches the document over the network. The JSON is kept
+    unparsed since building a service adds to the parsed document in place.
+    """
+    document = get_static_doc(service_name, version)
+    if document is None:
+        raise ValueError(f"No bundled discovery document for {service_name} {version}.")
+    return document
+
+
+def build_api(service_name: str, version: str, credentials) -> Resource:
+    """Build a service resource from the bundled discovery document."""
+    return build_from_document(discovery_document(service_name, version), credentials=credentials)
 
 
-def build_service(service_account_json_secrets_path):
-    scope = ["https://www.googleapis.com/auth/drive"]
-    service_account_json_key = service_account_json_secrets_path
-    credentials = service_account.Credentials.from_service_account_file(
-        filename=service_account_json_key, scopes=scope
+@functools.lru_cache(maxsize=None)
+def _load_credentials(service_account_json_secrets_path, scopes: tuple):
+    return service_account.Credentials.from_service_account_file(
+        filename=service_account_json_secrets_path, scopes=list(scopes)
     )
-    service = build("drive", "v3", credentials=credentials)
+
+
+def load_credentials(service_account_json_secrets_path, scopes: Sequence[str] = SCOPES):
+    """Return the credentials of a service account key file, read once per (path, scopes)."""
+    return _load_credentials(service_account_json_secrets_path, tuple(scopes))
+
+
+def build_service(service_account_json_secrets_path, scopes: Sequence[str] = SCOPES):
+    """Return a Google Drive service, memoized per (key file path, scopes).
+
+    A service is not thread-safe, so every thread gets its own memoized instance.
+    """
+    services = getattr(_local, "services", None)
+    if services is None:
+        services = _local.services = {}
+    key = (service_account_json_secrets_path, tuple(scopes))
+    service = services.get(key)
+    if service is None:
+        credentials = load_credentials(service_account_json_secrets_path, scopes)
+        service = services[key] = build_api("drive", "v3", credentials)
     return service
+
+
+def build_service_factory(service_account_json_secrets_path) -> Callable[[], Resource]:
+    """Return a callable building Drive services that all share one set of credentials.
+
+    The key file is read once and the access token is refreshed once for all
+    services, instead of once per service.
+    """
+    credentials = load_credentials(service_account_json_secrets_path)
+    return lambda: build_api("drive", "v3", credentials)
@@ -1,7 +1,8 @@
-from typing import List
+from typing import Callable, List, Optional
 
 from googleapiclient.discovery import Resource
 
+from src.gdrive_api.folder_index import DriveFolderIndex
 from src.gdrive_api.utils import create_folder_path, extract_folder_id
 from src.gdrive_api.folder_clone import clone_drive_folder
 
@@ -12,6 +13,10 @@ def backup_folder(
     destination_parent: str,
     subfolder_name: str,
     is_url: bool = True,
+    folder_index: Optional[DriveFolderIndex] = None,
+    max_workers: int = 1,
+    service_factory: Optional[Callable[[], Resource]] = None,
+    resume: Optional[str] = None,
 ):
     """Backup a Google Drive folder to a subfolder in another folder.
 
@@ -21,16 +26,39 @@ def backup_folder(
         destination_parent: The ID or URL of the parent folder in Google Drive where the backup will be created.
         subfolder_name: The name of the subfolder to be created in the destination folder.
         is_url: A flag indicating whether the provided source and destination are URLs. Default is True.
+        folder_index: An index rooted at the destination parent folder, reused to create the
+            subfolder and clone into it. By default the subfolder is created with path lookups
+            and only the new subfolder's tree is indexed.
+        max_workers: Maximum number of concurrent file copies. Default is 1 (serial).
+        service_factory: A callable returning a new authorized service, required when
+            `max_workers` is greater than 1.
+        resume: The path of a JSONL job journal for the clone, created if missing.
     """
     # Extract the folder IDs
     source_folder_id = extract_folder_id(source_folder, is_url)
     destination_parent_id = extract_folder_id(destination_parent, is_url)
 
     # Create a new subfolder in the destination folder
-    subfolder_id = create_folder_path(service, subfolder_name, destination_parent_id)
+    if folder_index is None:
+        subfolder_id = create_folder_path(service, subfolder_name, destination_parent_id)
+        subfolder_index = DriveFolderIndex(service, subfolder_id)
+    elif folder_index.root_id != destination_parent_id:
+        raise ValueError("folder_index must be rooted at the destination parent folder.")
+    else:
+        subfolder_index = folder_index.subtree(subfolder_name)
+        subfolder_id = subfolder_index.root_id
 
     # Clone the source folder to the new subfolder
-    clone_drive_folder(service, source_folder_id, subfolder_id, is_url)
+    clone_drive_folder(
+        service,
+        source_folder_id,
+        subfolder_id,
+        is_url=False,
+        folder_index=subfolder_index,
+        max_workers=max_workers,
+        service_factory=service_factory,
+        resume=resume,
+    )
     print(
         f"Backup of folder '{source_folder}' to subfolder '{subfolder_name}' in folder '{destination_parent}' completed."
     )
@@ -0,0 +1,326 @@
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from googleapiclient.discovery import Resource
+
+from src.gdrive_api import utils
+from src.gdrive_api.request_executor import execute
+from src.gdrive_api.utils import FOLDER_MIME_TYPE, RemoteFile, list_children
+
+FILE_FIELDS = "id, name, mimeType, parents, size, md5Checksum, modifiedTime, webViewLink"
+CHANGE_FIELDS = (
+    f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}, trashed))"
+)
+
+# A file with several parents has one row per mirrored parent
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT NOT NULL,
+    parent_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    size INTEGER,
+    md5_checksum TEXT,
+    modified_time TEXT,
+    web_view_link TEXT,
+    PRIMARY KEY (id, parent_id)
+);
+CREATE INDEX IF NOT EXISTS files_parent_name ON files (parent_id, name);
+CREATE TABLE IF NOT EXISTS roots (id TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+COLUMNS = "id, name, mime_type, size, md5_checksum, modified_time, web_view_link"
+
+
+class DriveMirror:
+    """Persistent SQLite mirror of the metadata of one or more Google Drive folder trees.
+
+    A folder tree is crawled once, when it is added with `add_root`. After that the mirror
+    is kept current from the Drive change feed: a refresh costs one `changes().list` call
+    per page of changes made anywhere in the drive since the last refresh, instead of a
+    listing of every folder. Lookups refresh the mirror first if it is older than
+    `max_staleness` seconds, then answer from the database. Lookups in folders outside
+    the mirrored trees fall through to the API.
+
+    Args:
+        service: The Google Drive service resource.
+        db_path: The SQLite database file, created if missing. ":memory:" keeps the mirror
+            for the lifetime of the object only.
+        max_staleness: Number of seconds lookups trust the mirror without a refresh. 0
+            refreshes before every lookup.
+        page_size: Number of files or changes requested per page.
+    """
+
+    def __init__(
+        self,
+        service: Resource,
+        db_path: str,
+        max_staleness: float = 60.0,
+        page_size: int = 1000,
+    ):
+        self.service = service
+        self.max_staleness = max_staleness
+        self.page_size = page_size
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._refreshed_at = None
+
+    def __enter__(self) -> "DriveMirror":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    @property
+    def roots(self) -> list:
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT id FROM roots")]
+
+    def add_root(self, folder_id: str):
+        """Mirror the folder tree below a folder, crawling it unless it is already mirrored."""
+        with self._lock:
+            if folder_id in self.roots:
+                return
+            if self._page_token() is None:
+                # Taken before the crawl, so changes made during it are replayed afterwards
+                response = execute(self.service.changes().getStartPageToken())
+                self._set_page_token(response["startPageToken"])
+                self._refreshed_at = time.monotonic()
+            self._crawl(folder_id)
+            self._connection.execute("INSERT INTO roots (id) VALUES (?)", (folder_id,))
+            self._connection.commit()
+
+    def refresh(self, force: bool = True) -> int:
+        """Apply the changes made in the drive since the last refresh.
+
+        Args:
+            force: If False, only refresh when the mirror is older than `max_staleness`.
+
+        Returns:
+            The number of changes read from the change feed.
+        """
+        with self._lock:
+            page_token = self._page_token()
+            if page_token is None:
+                return 0
+            if (
+                not force
+                and self._refreshed_at is not None
+                and time.monotonic() - self._refreshed_at < self.max_staleness
+            ):
+                return 0
+            count = 0
+            while True:
+                response = execute(
+                    self.service.changes().list(
+                        pageToken=page_token,
+                        pageSize=self.page_size,
+                        spaces="drive",
+                        fields=CHANGE_FIELDS,
+                    )
+                )
+                for change in response.get("changes", []):
+                    self._apply(change)
+                count += len(response.get("changes", []))
+                page_token = response.get("nextPageToken")
+                if page_token is None:
+                    self._set_page_token(response["newStartPageToken"])
+                    break
+            self._connection.commit()
+            self._refreshed_at = time.monotonic()
+            return count
+
+    def list_children(self, parent_id: str, folders_only: bool = False) -> list:
+        """List the untrashed children of a folder, like `utils.list_children`.
+
+        Returns:
+            The file resources, with the fields of `FILE_FIELDS` except `parents`.
+        """
+        if not self._mirrors(parent_id):
+            query = f"mimeType = '{FOLDER_MIME_TYPE}'" if folders_only else None
+            return list(
+                list_children(self.service, [parent_id], FILE_FIELDS, query, self.page_size)
+            )
+        sql = f"SELECT {COLUMNS} FROM files WHERE parent_id = ?"
+        if folders_only:
+            sql += f" AND mime_type = '{FOLDER_MIME_TYPE}'"
+        with self._lock:
+            rows = self._connection.execute(sql + " ORDER BY rowid", (parent_id,)).fetchall()
+        return [_resource(row) for row in rows]
+
+    def list_folder_files(self, parent_id: str) -> dict[str, RemoteFile]:
+        """List the files directly inside a folder, like `utils.list_folder_files`."""
+        if not self._mirrors(parent_id):
+            return utils.list_folder_files(self.service, parent_id, self.page_size)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT name, id, size, md5_checksum, modified_time FROM files "
+                "WHERE parent_id = ? AND mime_type != ? ORDER BY rowid",
+                (parent_id, FOLDER_MIME_TYPE),
+            ).fetchall()
+        files = {}
+        for name, *fields in rows:
+            files.setdefault(name, RemoteFile(*fields))
+        return files
+
+    def get_file_id(self, file_name: str, parent_id: str) -> Optional[str]:
+        """Retrieve the ID of a file by name, like `utils.get_file_id`."""
+        if not self._mirrors(parent_id):
+            return utils.get_file_id(self.service, file_name, parent_id)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id FROM files WHERE parent_id = ? AND name = ? ORDER BY rowid LIMIT 1",
+                (parent_id, file_name),
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_nested_folder_id(self, folder_path: str, parent_id: str) -> Optional[str]:
+        """Retrieve the ID of a nested folder by path, like `utils.get_nested_folder_id`."""
+        if not self._mirrors(parent_id):
+            return utils.get_nested_folder_id(self.service, folder_path, parent_id)
+        with self._lock:
+            for folder_name in folder_path.strip("/").split("/"):
+                row = self._connection.execute(
+                    "SELECT id FROM files WHERE parent_id = ? AND name = ? AND mime_type = ? "
+                    "ORDER BY rowid LIMIT 1",
+                    (parent_id, folder_name, FOLDER_MIME_TYPE),
+                ).fetchone()
+                if row is None:
+                    return None
+                parent_id = row[0]
+        return parent_id
+
+    def _mirrors(self, folder_id: str) -> bool:
+        """Return True if the folder is in a mirrored tree, refreshing the mirror if stale."""
+        with self._lock:
+            if not self._is_tracked(folder_id):
+                return False
+            self.refresh(force=False)
+            # The folder may have been moved out or trashed since
+            return self._is_tracked(folder_id)
+
+    def _is_tracked(self, folder_id: str) -> bool:
+        row = self._connection.execute(
+            "SELECT 1 FROM roots WHERE id = ? UNION ALL "
+            "SELECT 1 FROM files WHERE id = ? AND mime_type = ? LIMIT 1",
+            (folder_id, folder_id, FOLDER_MIME_TYPE),
+        ).fetchone()
+        return row is not None
+
+    def _crawl(self, folder_id: str):
+        """Insert every file below a folder, listing the tree a level at a time."""
+        level = [folder_id]
+        while level:
+            next_level = []
+            listed = set(level)
+            for item in list_children(self.service, level, FILE_FIELDS, page_size=self.page_size):
+                self._insert(item, [p for p in item.get("parents", []) if p in listed])
+                if item["mimeType"] == FOLDER_MIME_TYPE:
+                    next_level.append(item["id"])
+            level = next_level
+
+    def _apply(self, change: dict):
+        file_id = change["fileId"]
+        file = change.get("file")
+        removed = change.get("removed") or file is None or file.get("trashed")
+        is_root = self._connection.execute(
+            "SELECT 1 FROM roots WHERE id = ?", (file_id,)
+        ).fetchone()
+        if is_root:
+            self._apply_to_root(file_id, file, removed)
+            return
+        if removed:
+            self._remove(file_id)
+            return
+        was_tracked = self._is_tracked(file_id)
+        parents = [p for p in file.get("parents", []) if p != file_id and self._is_tracked(p)]
+        if not parents:
+            # Moved out of the mirrored trees, or never in them
+            self._remove(file_id)
+            return
+        self._connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        self._insert(file, parents)
+        if file["mimeType"] == FOLDER_MIME_TYPE and not was_tracked:
+            # A folder moved in brings contents the change feed says nothing about
+            self._crawl(file_id)
+
+    def _apply_to_root(self, root_id: str, file: Optional[dict], removed: bool):
+        """Apply a change of a mirrored root, whose own parents are not mirrored.
+
+        Renames, moves and sharing changes leave the mirrored tree as it is. Only a root
+        trashed or deleted is dropped, with everything below it.
+        """
+        if removed:
+            self._remove(root_id)
+            self._connection.execute("DELETE FROM roots WHERE id = ?", (root_id,))
+            return
+        # Rows of the root as a child of another mirrored tree, its own contents are kept
+        self._connection.execute("DELETE FROM files WHERE id = ?", (root_id,))
+        parents = [p for p in file.get("parents", []) if p != root_id and self._is_tracked(p)]
+        if parents:
+            self._insert(file, parents)
+
+    def _insert(self, file: dict, parent_ids: list):
+        size = file.get("size")
+        self._connection.executemany(
+            f"INSERT OR REPLACE INTO files (parent_id, {COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    parent_id,
+                    file["id"],
+                    file["name"],
+                    file["mimeType"],
+                    int(size) if size is not None else None,
+                    file.get("md5Checksum"),
+                    file.get("modifiedTime"),
+                    file.get("webViewLink"),
+                )
+                for parent_id in parent_ids
+            ],
+        )
+
+    def _remove(self, file_id: str):
+        """Delete a file and, for a folder, everything below it."""
+        pending = [file_id]
+        while pending:
+            current = pending.pop()
+            pending.extend(
+                row[0]
+                for row in self._connection.execute(
+                    "SELECT id FROM files WHERE parent_id = ?", (current,)
+                )
+            )
+            self._connection.execute("DELETE FROM files WHERE id = ?", (current,))
+            self._connection.execute("DELETE FROM files WHERE parent_id = ?", (current,))
+
+    def _page_token(self) -> Optional[str]:
+        row = self._connection.execute(
+            "SELECT value FROM state WHERE key = 'page_token'"
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_page_token(self, page_token: str):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES ('page_token', ?)", (page_token,)
+        )
+
+
+def _resource(row: tuple) -> dict:
+    file_id, name, mime_type, size, md5_checksum, modified_time, web_view_link = row
+    resource = {"id": file_id, "name": name, "mimeType": mime_type}
+    for key, value in (
+        ("size", str(size) if size is not None else None),
+        ("md5Checksum", md5_checksum),
+        ("modifiedTime", modified_time),
+        ("webViewLink", web_view_link),
+    ):
+        if value is not None:
+            resource[key] = value
+    return resource
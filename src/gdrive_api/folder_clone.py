@@ -1,34 +1,208 @@
-from typing import List
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
 
 from googleapiclient.discovery import Resource
 
-from src.gdrive_api.utils import create_folder_path, extract_folder_id
+from src.gdrive_api.folder_index import DriveFolderIndex
+from src.gdrive_api.instrumentation import progress as report_progress
+from src.gdrive_api.job_journal import JobJournal
+from src.gdrive_api.request_executor import execute
+from src.gdrive_api.utils import FOLDER_MIME_TYPE, extract_folder_id, list_children
+from src.gdrive_api.workers import ServicePool
 
 
-def clone_contents(service: Resource, source_id: str, dest_id: str):
+class CloneProgress:
+    """Thread-safe progress counters of a clone.
+
+    Args:
+        report_every: Print a progress line every `report_every` copied files. 0 disables it.
+    """
+
+    def __init__(self, report_every: int = 100):
+        self.report_every = report_every
+        self.total_folders = 0
+        self.total_files = 0
+        self.copied_files = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def remaining_files(self) -> int:
+        return self.total_files - self.copied_files
+
+    @property
+    def files_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.copied_files / elapsed if elapsed > 0 else 0.0
+
+    def record_copied(self):
+        with self._lock:
+            self.copied_files += 1
+            copied_files = self.copied_files
+        if self.report_every and copied_files % self.report_every == 0:
+            print(self.summary())
+
+    def summary(self) -> str:
+        return (
+            f"Copied {self.copied_files} of {self.total_files} files "
+            f"({self.files_per_second:.1f} files/s), {self.remaining_files} remaining."
+        )
+
+
+def crawl_folder(
+    service: Resource, folder_id: str, fields: str = "id, name, mimeType, parents"
+) -> tuple[list, list]:
+    """Crawl a Google Drive folder tree breadth-first, following all result pages.
+
+    Every tree level is listed with as few queries as possible, see `list_children`.
+
+    Args:
+        service: The Google Drive service resource.
+        folder_id: The ID of the folder to crawl.
+        fields: The file fields to request, at least `id, name, mimeType, parents`.
+
+    Returns:
+        A tuple of (folders, files). Folders are (relative path, folder) pairs in
+        breadth-first order, so a folder always comes after its parent. Files are
+        (relative path of the parent folder, file) pairs.
+    """
+    paths = {folder_id: ""}
+    folders = []
+    files = []
+    level = [folder_id]
+    while level:
+        next_level = []
+        for item in list_children(service, level, fields=fields):
+            # A folder listed twice through several parents is only kept once
+            parent_id = next(p for p in item.get("parents", []) if p in paths)
+            parent_path = paths[parent_id]
+            if item["mimeType"] == FOLDER_MIME_TYPE:
+                if item["id"] in paths:
+                    continue
+                path = f"{parent_path}/{item['name']}" if parent_path else item["name"]
+                paths[item["id"]] = path
+                folders.append((path, item))
+                next_level.append(item["id"])
+            else:
+                files.append((parent_path, item))
+        level = next_level
+    return folders, files
+
+
+def clone_contents(
+    service: Resource,
+    source_id: str,
+    dest_id: str,
+    folder_index: Optional[DriveFolderIndex] = None,
+    max_workers: int = 1,
+    service_factory: Optional[Callable[[], Resource]] = None,
+    progress: Optional[CloneProgress] = None,
+    journal: Optional[JobJournal] = None,
+):
     """Clone the contents of a Google Drive folder to another folder.
 
+    The source tree is crawled first, then the destination folder skeleton is created,
+    then the files are copied server-side, optionally over a pool of workers.
+    With a journal, the crawl, created folders and copied files are recorded as they
+    happen and whatever is already recorded is reused without any API calls.
+
     Args:
         service: The Google Drive service resource.
         source_id: The ID of the source folder in Google Drive.
         dest_id: The ID of the destination folder in Google Drive.
+        folder_index: An index rooted at the destination folder, used to find or create
+            subfolders without a lookup query per folder.
+        max_workers: Maximum number of concurrent file copies. Default is 1 (serial).
+        service_factory: A callable returning a new authorized service, required when
+            `max_workers` is greater than 1 since a service must not be shared between threads.
+        progress: A `CloneProgress` to report the copy progress into.
+        journal: A `JobJournal` to record completed work into and resume from.
     """
-    query = f"'{source_id}' in parents and trashed = false"
-    response = (
-        service.files()
-        .list(q=query, spaces="drive", fields="files(id, name, mimeType)")
-        .execute()
-    )
-    for item in response.get("files", []):
-        if item["mimeType"] == "application/vnd.google-apps.folder":
-            # It's a folder, create it and clone its contents
-            new_folder_id = create_folder_path(service, item["name"], dest_id)
-            clone_contents(service, item["id"], new_folder_id)
-        else:
-            # It's a file, copy it to the destination folder
-            file_metadata = {"parents": [dest_id]}
-            service.files().copy(fileId=item["id"], body=file_metadata).execute()
-            print(f"Copied file '{item['name']}' to folder ID '{dest_id}'.")
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1.")
+    if max_workers > 1 and service_factory is None:
+        raise ValueError("A service_factory is required when max_workers is greater than 1.")
+    if folder_index is None:
+        folder_index = DriveFolderIndex(service, dest_id)
+    elif folder_index.root_id != dest_id:
+        raise ValueError("folder_index must be rooted at the destination folder.")
+    if progress is None:
+        progress = CloneProgress()
+
+    crawl = journal.crawl() if journal is not None else None
+    if crawl is None:
+        crawl = crawl_folder(service, source_id)
+        if journal is not None:
+            journal.record_crawl(*crawl)
+    folders, files = crawl
+    if journal is not None:
+        files = [(path, item) for path, item in files if not journal.is_done(item["id"])]
+    progress.total_folders = len(folders)
+    progress.total_files = len(files)
+
+    # Create the destination skeleton, parents first
+    dest_folder_ids = {"": dest_id}
+    for path, folder in folders:
+        folder_id = journal.folder_id(path) if journal is not None else None
+        if folder_id is None:
+            parent_path = path.rpartition("/")[0]
+            folder_id = folder_index.ensure_child(dest_folder_ids[parent_path], folder["name"])
+            if journal is not None:
+                journal.record_folder(path, folder_id)
+        dest_folder_ids[path] = folder_id
+
+    if max_workers == 1:
+        for parent_path, item in files:
+            _copy_file(service, item, dest_folder_ids[parent_path], progress, journal)
+        return
+
+    service_pool = ServicePool(service_factory)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _copy_in_worker,
+                service_pool,
+                item,
+                dest_folder_ids[parent_path],
+                progress,
+                journal,
+            )
+            for parent_path, item in files
+        ]
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in not_done:
+            future.cancel()
+        for future in done:
+            # Re-raises the error of the first failed copy, if any
+            future.result()
+
+
+def _copy_file(
+    service: Resource,
+    item: dict,
+    dest_id: str,
+    progress: CloneProgress,
+    journal: Optional[JobJournal] = None,
+):
+    file_metadata = {"parents": [dest_id]}
+    copy = execute(service.files().copy(fileId=item["id"], body=file_metadata, fields="id"))
+    if journal is not None:
+        journal.record_done(item["id"], copy["id"])
+    report_progress("copied", item["name"], dest_id)
+    progress.record_copied()
+
+
+def _copy_in_worker(
+    service_pool: ServicePool,
+    item: dict,
+    dest_id: str,
+    progress: CloneProgress,
+    journal: Optional[JobJournal] = None,
+):
+    """Copy a single file from a pool worker using that worker's own service."""
+    _copy_file(service_pool.get(), item, dest_id, progress, journal)
 
 
 def clone_drive_folder(
@@ -36,6 +210,11 @@ def clone_drive_folder(
     source_folder: str,
     destination_folder: str,
     is_url: bool = True,
+    folder_index: Optional[DriveFolderIndex] = None,
+    max_workers: int = 1,
+    service_factory: Optional[Callable[[], Resource]] = None,
+    progress: Optional[CloneProgress] = None,
+    resume: Optional[str] = None,
 ):
     """Clone a Google Drive folder with all its contents to another folder.
 
@@ -44,22 +223,51 @@ def clone_drive_folder(
         source_folder: The ID or URL of the source folder in Google Drive.
         destination_folder: The ID or URL of the destination folder in Google Drive.
         is_url: A flag indicating whether the provided source and destination are URLs. Default is True.
+        folder_index: An index rooted at the destination folder. By default a new one is built,
+            listing the destination folder tree once.
+        max_workers: Maximum number of concurrent file copies. Default is 1 (serial).
+        service_factory: A callable returning a new authorized service, required when
+            `max_workers` is greater than 1.
+        progress: A `CloneProgress` to report the copy progress into.
+        resume: The path of a JSONL job journal, created if missing. The crawl, folders and
+            copies recorded in it by an earlier run are reused without any API calls.
     """
     source_folder_id = extract_folder_id(source_folder, is_url)
     destination_folder_id = extract_folder_id(destination_folder, is_url)
     # Check if source folder exists
-    source_folder = service.files().get(fileId=source_folder_id).execute()
+    source_folder = execute(service.files().get(fileId=source_folder_id))
     if not source_folder:
         raise ValueError(f"Source folder with ID '{source_folder_id}' does not exist.")
 
     # Check if destination folder exists
-    destination_folder = service.files().get(fileId=destination_folder_id).execute()
+    destination_folder = execute(service.files().get(fileId=destination_folder_id))
     if not destination_folder:
         raise ValueError(
             f"Destination folder with ID '{destination_folder_id}' does not exist."
         )
+    if folder_index is None:
+        folder_index = DriveFolderIndex(service, destination_folder_id)
+    elif folder_index.root_id != destination_folder_id:
+        raise ValueError("folder_index must be rooted at the destination folder.")
+    if progress is None:
+        progress = CloneProgress()
     # Start the cloning process from the source folder to the destination
-    clone_contents(service, source_folder_id, destination_folder_id)
+    journal = JobJournal(resume) if resume is not None else None
+    try:
+        clone_contents(
+            service,
+            source_folder_id,
+            destination_folder_id,
+            folder_index,
+            max_workers,
+            service_factory,
+            progress,
+            journal,
+        )
+    finally:
+        if journal is not None:
+            journal.close()
+    print(progress.summary())
     print(
         f"Cloning of folder ID '{source_folder_id}' to folder ID '{destination_folder_id}' completed."
     )
@@ -0,0 +1,326 @@
+import hashlib
+import os
+import tempfile
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, Optional
+
+from googleapiclient.discovery import Resource
+from googleapiclient.errors import HttpError
+
+from src.gdrive_api.folder_clone import crawl_folder
+from src.gdrive_api.folder_sync import HashManifest
+from src.gdrive_api.instrumentation import progress
+from src.gdrive_api.request_executor import execute
+from src.gdrive_api.utils import extract_folder_id
+from src.gdrive_api.workers import ServicePool
+
+# Size of the byte ranges files are downloaded in, so at most one is held in memory per worker
+DOWNLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+
+GOOGLE_APPS_MIME_PREFIX = "application/vnd.google-apps."
+
+# Google-native MIME type -> (MIME type it is exported as, extension of the local file)
+EXPORT_FORMATS = {
+    "application/vnd.google-apps.document": (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        ".docx",
+    ),
+    "application/vnd.google-apps.spreadsheet": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        ".xlsx",
+    ),
+    "application/vnd.google-apps.presentation": (
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+        ".pptx",
+    ),
+    "application/vnd.google-apps.drawing": ("image/png", ".png"),
+    "application/vnd.google-apps.script": ("application/vnd.google-apps.script+json", ".json"),
+}
+
+DOWNLOAD_FIELDS = "id, name, mimeType, parents, size, md5Checksum, modifiedTime"
+
+
+class DownloadError(Exception):
+    """Exception raised for errors that occur during file download."""
+    pass
+
+
+def download_file(
+    service: Resource,
+    file: dict,
+    file_path: str,
+    export_format: Optional[tuple[str, str]] = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> int:
+    """Download a file from Google Drive to a local path, replacing it atomically.
+
+    Binary files are streamed to a temporary file next to `file_path` in `chunk_size`
+    byte ranges and checked against Drive's `md5Checksum`. Google-native files are
+    exported instead. The temporary file is renamed over `file_path` only once it is
+    complete, so an interrupted download never leaves a partial file behind.
+
+    Args:
+        service: The Google Drive service resource.
+        file: The file resource, with at least `id`, `name` and `mimeType`. `size`,
+            `md5Checksum` and `modifiedTime` are used if present.
+        file_path: The local path to write the file to.
+        export_format: For Google-native files, the (MIME type, extension) to export as.
+        chunk_size: Number of bytes requested per range.
+
+    Raises:
+        DownloadError: If the content does not match `md5Checksum`.
+
+    Returns:
+        The number of bytes written.
+    """
+    directory, name = os.path.split(file_path)
+    fd, temp_path = tempfile.mkstemp(dir=directory or ".", prefix=f".{name}.", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if export_format is not None:
+                content = execute(
+                    service.files().export(fileId=file["id"], mimeType=export_format[0]),
+                    "drive.files.export",
+                )
+                f.write(content)
+                size = len(content)
+            else:
+                size = _download_ranges(service, file, f, chunk_size)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    if file.get("modifiedTime"):
+        # Lets later runs tell unchanged exports apart without a checksum
+        mtime = _parse_time(file["modifiedTime"])
+        os.utime(file_path, (mtime, mtime))
+    return size
+
+
+def _download_ranges(service: Resource, file: dict, f, chunk_size: int) -> int:
+    """Write a binary file's content to `f` a range at a time and return its size."""
+    expected_size = int(file["size"]) if file.get("size") is not None else None
+    md5 = hashlib.md5()
+    offset = 0
+    while True:
+        request = service.files().get_media(fileId=file["id"])
+        if expected_size is not None:
+            # Without a size there is no telling a last range from a whole file sent instead
+            request.headers["Range"] = f"bytes={offset}-{offset + chunk_size - 1}"
+        try:
+            chunk = execute(request, "drive.files.get_media")
+        except HttpError as e:
+            if e.resp.status != 416:
+                raise
+            # The previous range ended exactly at the end of the file
+            chunk = b""
+        f.write(chunk)
+        md5.update(chunk)
+        offset += len(chunk)
+        # Reaching the size also ends a download whose range was ignored and the whole file sent
+        if expected_size is None or offset >= expected_size or len(chunk) < chunk_size:
+            break
+    if expected_size is not None and offset != expected_size:
+        raise DownloadError(
+            f"Received {offset} bytes of '{file['name']}' instead of its size, {expected_size}."
+        )
+    if file.get("md5Checksum") and md5.hexdigest() != file["md5Checksum"]:
+        raise DownloadError(
+            f"The content of '{file['name']}' does not match its MD5 checksum in Google Drive."
+        )
+    return offset
+
+
+def _parse_time(rfc3339: str) -> float:
+    return datetime.fromisoformat(rfc3339.replace("Z", "+00:00")).timestamp()
+
+
+def _local_name(name: str) -> str:
+    """Return a Drive file name usable as a single local path component."""
+    for separator in ("/", os.sep, os.altsep, "\0"):
+        if separator:
+            name = name.replace(separator, "_")
+    return "_" if name in ("", ".", "..") else name
+
+
+def download_folder(
+    service: Resource,
+    source_folder: str,
+    destination_path: str,
+    is_url: bool = True,
+    max_workers: int = 1,
+    service_factory: Optional[Callable[[], Resource]] = None,
+    export_formats: Optional[dict[str, tuple[str, str]]] = None,
+    manifest_path: Optional[str] = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> dict[str, str]:
+    """Recursively download a Google Drive folder to a local folder.
+
+    The folder tree is crawled first with field-restricted listings, one query per page
+    per tree level, and the local folders are created. Then the files are downloaded,
+    optionally over a pool of workers, each file streamed to disk and renamed into place
+    once complete, see `download_file`.
+
+    A binary file is skipped when a local file of the same size and MD5 digest already
+    exists. A Google-native file is exported in its `export_formats` format and skipped
+    when the local file's modification time is the file's `modifiedTime`, which the
+    export sets. Google-native types without an export format, e.g. forms, are skipped.
+
+    Per-file progress is not printed but emitted as events to the installed
+    instrumentation, see `src.gdrive_api.instrumentation`.
+
+    Args:
+        service: The Google Drive service resource.
+        source_folder: The ID or URL of the source folder in Google Drive.
+        destination_path: The path of the local folder, created if missing.
+        is_url: A flag indicating whether the provided source is a URL. Default is True.
+        max_workers: Maximum number of concurrent file downloads. Default is 1 (serial).
+        service_factory: A callable returning a new authorized service, required when
+            `max_workers` is greater than 1 since a service must not be shared between threads.
+        export_formats: Google-native MIME type -> (export MIME type, local file extension).
+            Defaults to `EXPORT_FORMATS`.
+        manifest_path: A JSON file caching local MD5 digests by path, mtime and size so
+            unchanged files are not re-hashed between runs.
+        chunk_size: Number of bytes requested per range of a binary file.
+
+    Raises:
+        DownloadError: If an error occurs during file download.
+
+    Returns:
+        Dict of file ID -> local path of every file now present locally, whether downloaded
+        or unchanged. As names can be non-unique, the first file listed for a local path wins.
+    """
+    source_folder_id = extract_folder_id(source_folder, is_url)
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1.")
+    if max_workers > 1 and service_factory is None:
+        raise ValueError("A service_factory is required when max_workers is greater than 1.")
+    if export_formats is None:
+        export_formats = EXPORT_FORMATS
+
+    folders, files = crawl_folder(service, source_folder_id, fields=DOWNLOAD_FIELDS)
+    local_dirs = {"": destination_path}
+    os.makedirs(destination_path, exist_ok=True)
+    for path, folder in folders:
+        parent_path = path.rpartition("/")[0]
+        local_dirs[path] = os.path.join(local_dirs[parent_path], _local_name(folder["name"]))
+        os.makedirs(local_dirs[path], exist_ok=True)
+
+    downloader = _FileDownloader(HashManifest(manifest_path), chunk_size, destination_path)
+    local_paths = {}
+    claimed = set()
+    jobs = []
+    unsupported_count = 0
+    for parent_path, item in files:
+        export_format = None
+        name = _local_name(item["name"])
+        if item["mimeType"].startswith(GOOGLE_APPS_MIME_PREFIX):
+            export_format = export_formats.get(item["mimeType"])
+            if export_format is None:
+                progress("unsupported", item["name"], local_dirs[parent_path])
+                unsupported_count += 1
+                continue
+            if not name.endswith(export_format[1]):
+                name += export_format[1]
+        file_path = os.path.join(local_dirs[parent_path], name)
+        if file_path in claimed:
+            progress("duplicate", item["name"], local_dirs[parent_path])
+            continue
+        claimed.add(file_path)
+        local_paths[item["id"]] = file_path
+        jobs.append((item, file_path, export_format))
+
+    outcomes = []
+    try:
+        if max_workers == 1:
+            outcomes = [downloader.download(service, *job) for job in jobs]
+        else:
+            service_pool = ServicePool(service_factory)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(downloader.download_in_worker, service_pool, *job)
+                    for job in jobs
+                ]
+                done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+                for future in not_done:
+                    future.cancel()
+                # Re-raises the DownloadError of the first failed download, if any
+                outcomes = [future.result() for future in done]
+    finally:
+        downloader.close()
+
+    downloaded = [size for kind, size in outcomes if kind != "unchanged"]
+    print("=" * 60)
+    print(
+        f"Downloaded {len(downloaded)} files ({sum(downloaded)} bytes) out of {len(files)}, "
+        f"skipped {len(outcomes) - len(downloaded)} unchanged files."
+    )
+    if unsupported_count:
+        print(f"Skipped {unsupported_count} Google-native files without an export format.")
+    print(f"Successfully processed {len(folders)} directories.")
+    print("=" * 60)
+    return local_paths
+
+
+class _FileDownloader:
+    """Downloads the files of `download_folder`, wrapping any failure in a `DownloadError`."""
+
+    def __init__(self, manifest: HashManifest, chunk_size: int, root_path: str):
+        self.manifest = manifest
+        self.chunk_size = chunk_size
+        self.root_path = root_path
+
+    def download(
+        self,
+        service: Resource,
+        item: dict,
+        file_path: str,
+        export_format: Optional[tuple[str, str]],
+    ) -> tuple[str, int]:
+        """Download a file unless it is unchanged locally.
+
+        Returns:
+            A tuple of (what happened, bytes written): `unchanged`, `downloaded` or `exported`.
+        """
+        try:
+            if self._is_unchanged(item, file_path, export_format):
+                progress("unchanged", item["name"], file_path)
+                return "unchanged", 0
+            size = download_file(service, item, file_path, export_format, self.chunk_size)
+        except DownloadError:
+            raise
+        except Exception as e:
+            raise DownloadError(f"An error occurred while downloading '{item['name']}': {e}")
+        kind = "exported" if export_format is not None else "downloaded"
+        progress(kind, item["name"], file_path)
+        return kind, size
+
+    def download_in_worker(
+        self,
+        service_pool: ServicePool,
+        item: dict,
+        file_path: str,
+        export_format: Optional[tuple[str, str]],
+    ) -> tuple[str, int]:
+        """Download a single file from a pool worker using that worker's own service."""
+        return self.download(service_pool.get(), item, file_path, export_format)
+
+    def close(self):
+        self.manifest.save()
+
+    def _is_unchanged(
+        self, item: dict, file_path: str, export_format: Optional[tuple[str, str]]
+    ) -> bool:
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return False
+        if export_format is not None or item.get("md5Checksum") is None:
+            return bool(item.get("modifiedTime")) and int(stat.st_mtime) == int(
+                _parse_time(item["modifiedTime"])
+            )
+        if stat.st_size != int(item.get("size", -1)):
+            return False
+        relative_path = os.path.relpath(file_path, self.root_path)
+        return self.manifest.md5(relative_path, file_path) == item["md5Checksum"]
@@ -0,0 +1,143 @@
+import os
+from typing import Optional
+
+from googleapiclient.discovery import Resource
+
+from src.gdrive_api.request_executor import execute
+from src.gdrive_api.utils import FOLDER_MIME_TYPE, list_children
+
+
+class DriveFolderIndex:
+    """In-memory index of the folder tree below a Google Drive folder.
+
+    The first lookup lists the whole folder subtree with paginated, field-restricted
+    `files().list` queries, batching every folder of a tree level into as few queries
+    as possible. After that, `relative/path -> folder ID` lookups are answered from
+    memory and folders created through the index are inserted as they are created.
+
+    Indexes returned by `subtree` share their state with the index they came from.
+    """
+
+    def __init__(self, service: Resource, root_id: str, page_size: int = 1000):
+        """
+        Args:
+            service: The Google Drive service resource.
+            root_id: The ID of the folder the relative paths are resolved against.
+            page_size: Number of folders requested per `files().list` page.
+        """
+        self.service = service
+        self.root_id = root_id
+        self.page_size = page_size
+        # Folder ID -> {child folder name -> child folder ID}. A folder is only present
+        # once all of its child folders are known.
+        self._children = {}
+        # IDs of the folders created through this index, known to be empty when created
+        self._created = set()
+
+    def load(self, folder_id: Optional[str] = None) -> "DriveFolderIndex":
+        """List the folder subtree below `folder_id` (default: the root) into the index.
+
+        Folders that are already indexed are not listed again.
+
+        Returns:
+            The index itself.
+        """
+        level = [folder_id or self.root_id]
+        while level:
+            level = [f for f in dict.fromkeys(level) if f not in self._children]
+            for f in level:
+                self._children[f] = {}
+            next_level = []
+            for folder in list_children(
+                self.service,
+                level,
+                fields="id, name, parents",
+                query=f"mimeType = '{FOLDER_MIME_TYPE}'",
+                page_size=self.page_size,
+            ):
+                for parent_id in folder.get("parents", []):
+                    siblings = self._children.get(parent_id)
+                    # Assuming the first match is the correct one, as folder names can be non-unique
+                    if siblings is not None and folder["name"] not in siblings:
+                        siblings[folder["name"]] = folder["id"]
+                next_level.append(folder["id"])
+            level = next_level
+        return self
+
+    def child_id(self, parent_id: str, name: str) -> Optional[str]:
+        """Return the ID of the folder `name` directly inside `parent_id`, or None."""
+        if parent_id not in self._children:
+            self.load(parent_id)
+        return self._children[parent_id].get(name)
+
+    def ensure_child(self, parent_id: str, name: str) -> str:
+        """Return the ID of the folder `name` inside `parent_id`, creating it if needed."""
+        folder_id = self.child_id(parent_id, name)
+        if folder_id is None:
+            file_metadata = {
+                "name": name,
+                "mimeType": FOLDER_MIME_TYPE,
+                "parents": [parent_id],
+            }
+            folder = execute(self.service.files().create(body=file_metadata, fields="id"))
+            folder_id = folder.get("id")
+            self._children[parent_id][name] = folder_id
+            self._children[folder_id] = {}
+            self._created.add(folder_id)
+        return folder_id
+
+    def children(self, folder_id: str) -> dict[str, str]:
+        """Return a copy of the child folder name -> ID map of an indexed folder."""
+        if folder_id not in self._children:
+            self.load(folder_id)
+        return dict(self._children[folder_id])
+
+    def remove_child(self, parent_id: str, name: str):
+        """Drop a child folder from the index, e.g. after it was trashed."""
+        self._children.get(parent_id, {}).pop(name, None)
+
+    def created(self, folder_id: str) -> bool:
+        """Return True if the folder was created through this index."""
+        return folder_id in self._created
+
+    def get(self, folder_path: str) -> Optional[str]:
+        """Resolve a folder path relative to the root to a folder ID.
+
+        Args:
+            folder_path: The relative path of the folder, "." or "" for the root.
+
+        Returns:
+            The ID of the folder or None if it does not exist.
+        """
+        folder_id = self.root_id
+        for folder_name in _split_path(folder_path):
+            folder_id = self.child_id(folder_id, folder_name)
+            if folder_id is None:
+                return None
+        return folder_id
+
+    def ensure(self, folder_path: str) -> str:
+        """Resolve a folder path relative to the root, creating missing folders.
+
+        Args:
+            folder_path: The relative path of the folder, "." or "" for the root.
+
+        Returns:
+            The ID of the last folder in the path.
+        """
+        folder_id = self.root_id
+        for folder_name in _split_path(folder_path):
+            folder_id = self.ensure_child(folder_id, folder_name)
+        return folder_id
+
+    def subtree(self, folder_path: str) -> "DriveFolderIndex":
+        """Return an index rooted at `folder_path`, creating it if needed, sharing this index's state."""
+        index = DriveFolderIndex(self.service, self.ensure(folder_path), self.page_size)
+        index._children = self._children
+        index._created = self._created
+        return index
+
+
+def _split_path(folder_path: str) -> list:
+    folder_path = folder_path.replace(os.sep, "/").strip("/")
+    return [name for name in folder_path.split("/") if name not in ("", ".")]
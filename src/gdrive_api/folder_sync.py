@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+# Bytes read at a time when hashing a local file
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_md5(file_path: str) -> str:
+    """Compute the hex MD5 digest of a local file, as reported by Drive's `md5Checksum`."""
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class HashManifest:
+    """Local cache of file MD5 digests keyed by relative path, modification time and size.
+
+    A file is only re-hashed when its mtime or size changed since it was last hashed.
+    The manifest is a JSON file of relative path -> {"mtime_ns", "size", "md5"}.
+    """
+
+    def __init__(self, manifest_path: Optional[str] = None):
+        """
+        Args:
+            manifest_path: The JSON file to load from and save to. If None, the cache only
+                lives in memory.
+        """
+        self.manifest_path = manifest_path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if manifest_path is not None and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self._entries = json.load(f)
+
+    def md5(self, relative_path: str, file_path: str) -> str:
+        """Return the MD5 digest of `file_path`, hashing it only if it changed.
+
+        Args:
+            relative_path: The key of the file in the manifest.
+            file_path: The path of the file on disk.
+        """
+        stat = os.stat(file_path)
+        with self._lock:
+            entry = self._entries.get(relative_path)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["md5"]
+        digest = file_md5(file_path)
+        with self._lock:
+            self._entries[relative_path] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "md5": digest,
+            }
+        return digest
+
+    def save(self):
+        """Write the manifest to disk, atomically replacing the previous version."""
+        if self.manifest_path is None:
+            return
+        temp_path = f"{self.manifest_path}.tmp"
+        with self._lock:
+            with open(temp_path, "w") as f:
+                json.dump(self._entries, f)
+        os.replace(temp_path, self.manifest_path)
+
+
+class SyncStats:
+    """Thread-safe counters of what a sync uploaded and what it avoided."""
+
+    def __init__(self):
+        self.uploaded_files = 0
+        self.uploaded_bytes = 0
+        self.unchanged_files = 0
+        self.bytes_avoided = 0
+        self.calls_avoided = 0
+        self.trashed_files = 0
+        self._lock = threading.Lock()
+
+    def record_uploaded(self, size: int):
+        with self._lock:
+            self.uploaded_files += 1
+            self.uploaded_bytes += size
+
+    def record_unchanged(self, size: int):
+        with self._lock:
+            self.unchanged_files += 1
+            self.bytes_avoided += size
+            # The create/update request that was not sent
+            self.calls_avoided += 1
+
+    def record_trashed(self):
+        with self._lock:
+            self.trashed_files += 1
+
+    def summary(self) -> str:
+        return (
+            f"Sync uploaded {self.uploaded_files} new or changed files ({self.uploaded_bytes} bytes), "
+            f"skipped {self.unchanged_files} unchanged files, avoiding {self.bytes_avoided} bytes "
+            f"and {self.calls_avoided} upload calls. Trashed {self.trashed_files} remote items."
+        )
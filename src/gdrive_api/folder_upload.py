@@ -1,15 +1,32 @@
+import json
 import os
-from typing import Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, NamedTuple, Optional
 
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 from googleapiclient.discovery import Resource
 
+from src.gdrive_api.folder_index import DriveFolderIndex
+from src.gdrive_api.folder_sync import HashManifest, SyncStats
+from src.gdrive_api.instrumentation import progress
+from src.gdrive_api.job_journal import JobJournal
+from src.gdrive_api.request_executor import execute, execute_resumable
 from src.gdrive_api.utils import (
-    get_nested_folder_id,
+    RemoteFile,
     get_file_id,
-    create_folder_path,
     extract_folder_id,
+    list_folder_files,
+    trash_file,
 )
+from src.gdrive_api.workers import ServicePool
+
+
+# Size of the chunks resumable uploads are sent in, a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+
+# Uploads queued per worker before the scan waits for one to finish
+PENDING_UPLOADS_PER_WORKER = 4
 
 
 class FolderNotFoundError(Exception):
@@ -22,8 +39,71 @@ class UploadError(Exception):
     pass
 
 
+class ScannedFolder(NamedTuple):
+    """A local folder found by `scan_folder`.
+
+    Attributes:
+        relative_path: The path relative to the scanned root, "." for the root itself.
+        path: The path of the folder.
+        dir_names: The names of its subfolders.
+        file_names: The names of its files.
+    """
+
+    relative_path: str
+    path: str
+    dir_names: list[str]
+    file_names: list[str]
+
+
+def scan_folder(source_folder_path: str) -> Iterator[ScannedFolder]:
+    """Walk a local folder tree top-down with a single `os.scandir` per folder.
+
+    Folders come in the order of `os.walk`, a folder always before its subfolders.
+    Symlinks to folders are listed as subfolders but not followed, and folders that
+    can't be read are skipped, as `os.walk` does by default. Only the folders still
+    to be scanned are held in memory, so the tree can be consumed as it is scanned.
+
+    Args:
+        source_folder_path: The path of the local folder to scan.
+
+    Returns:
+        An iterator of `ScannedFolder`.
+    """
+    stack = [(".", source_folder_path)]
+    while stack:
+        relative_path, path = stack.pop()
+        dir_names = []
+        file_names = []
+        followed = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir:
+                        file_names.append(entry.name)
+                        continue
+                    dir_names.append(entry.name)
+                    if not entry.is_symlink():
+                        followed.append(entry.name)
+        except OSError:
+            continue
+        yield ScannedFolder(relative_path, path, dir_names, file_names)
+        for name in reversed(followed):
+            child_path = name if relative_path == "." else os.path.join(relative_path, name)
+            stack.append((child_path, os.path.join(path, name)))
+
+
 def upload_file(
-    service: Resource, file_path: str, parent_id: str, force_replace: bool = False
+    service: Resource,
+    file_path: str,
+    parent_id: str,
+    force_replace: bool = False,
+    existing_files: Optional[dict[str, RemoteFile]] = None,
+    session_uri: Optional[str] = None,
+    on_session: Optional[Callable[[str], None]] = None,
 ) -> Optional[str]:
     """Upload a file to Google Drive, optionally forcing replacement of existing files.
 
@@ -32,124 +112,431 @@ def upload_file(
         file_path: The path to the file to upload.
         parent_id: The ID of the parent folder in Google Drive.
         force_replace: If True, replace the file if it already exists.
+        existing_files: The listing of the parent folder from `list_folder_files`. If given,
+            it is consulted instead of querying Drive for the file.
+        session_uri: The URI of a resumable upload session started earlier for this file. The
+            upload continues from the last chunk the server received, or starts over if the
+            session expired.
+        on_session: Called with the URI of the resumable upload session once it is known.
 
     Returns:
         File url if the file was uploaded, None otherwise.
     """
     file_name = os.path.basename(file_path)
     file_metadata = {"name": file_name, "parents": [parent_id]}
-    media = MediaFileUpload(file_path, resumable=True)
-    file_id = get_file_id(service, file_name, parent_id)
+    media = MediaFileUpload(file_path, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+    if existing_files is None:
+        file_id = get_file_id(service, file_name, parent_id)
+    else:
+        existing_file = existing_files.get(file_name)
+        file_id = existing_file.id if existing_file else None
 
     if file_id and not force_replace:
-        print(f"File '{file_name}' already exists and won't be replaced.")
+        progress("skipped", file_name, parent_id)
         return None
 
     file_url = None
     response = None
 
     if file_id and force_replace:
-        print(f"Replacing existing file '{file_name}' with the new version.")
-        response = service.files().update(fileId=file_id, media_body=media).execute()
-        print(f"File '{file_name}' has been replaced.")
+        response = _execute_upload(
+            service.files().update(fileId=file_id, media_body=media),
+            file_name,
+            parent_id,
+            session_uri,
+            on_session,
+        )
+        progress("replaced", file_name, parent_id)
     else:
-        print(f"Uploading new file '{file_name}'.")
-        response = (
-            service.files()
-            .create(body=file_metadata, media_body=media, fields="id")
-            .execute()
+        response = _execute_upload(
+            service.files().create(body=file_metadata, media_body=media, fields="id"),
+            file_name,
+            parent_id,
+            session_uri,
+            on_session,
         )
-        print(f"File '{file_name}' has been uploaded.")
+        progress("uploaded", file_name, parent_id)
 
     if response:
         file_url = f"https://drive.google.com/uc?id={response['id']}"
-        print(f"Uploaded '{file_name}' to folder ID '{parent_id}'.")
 
     return file_url
 
 
+def _execute_upload(
+    request,
+    file_name: str,
+    parent_id: str,
+    session_uri: Optional[str],
+    on_session: Optional[Callable[[str], None]],
+):
+    """Execute a media upload, chunk by chunk if its session has to be tracked or resumed."""
+    if session_uri is None and on_session is None:
+        return execute(request)
+    if session_uri is not None:
+        request.resumable_uri = session_uri
+        try:
+            return execute_resumable(request, on_session=on_session)
+        except HttpError as e:
+            if e.resp.status not in (404, 410):
+                raise
+            # The session expired, start a new one from the first chunk
+            progress("session_expired", file_name, parent_id)
+            request.resumable_uri = None
+            request.resumable_progress = 0
+    return execute_resumable(request, on_session=on_session)
+
+
 def upload_folder(
     service: Resource,
     source_folder_path: str,
     destination_folder: str,
     force_replace: bool = False,
     is_url: bool = True,
+    max_workers: int = 1,
+    service_factory: Optional[Callable[[], Resource]] = None,
+    folder_index: Optional[DriveFolderIndex] = None,
+    sync: bool = False,
+    delete_remote: bool = False,
+    manifest_path: Optional[str] = None,
+    sync_stats: Optional[SyncStats] = None,
+    resume: Optional[str] = None,
+    on_result: Optional[Callable[[str, Optional[str]], None]] = None,
+    results_path: Optional[str] = None,
 ) -> dict[str, str]:
     """Recursively upload a local folder to Google Drive.
 
+    The local tree is scanned once, see `scan_folder`, and uploads start with the
+    first folder scanned. Folders are always resolved or created on the calling thread,
+    in walk order, before any of their files are uploaded. Each destination folder is
+    listed once and that listing decides between skipping, replacing and creating its
+    files. With `max_workers` greater than 1 the file uploads themselves are spread over
+    a thread pool, each worker using its own service built by `service_factory`, and the
+    scan pauses while `PENDING_UPLOADS_PER_WORKER` uploads per worker are queued.
+
+    Results can be streamed to `on_result` or `results_path` as uploads complete instead
+    of being collected, so memory use does not grow with the size of the tree.
+
+    In `sync` mode only new files and files whose size or MD5 differ from Drive's
+    `size`/`md5Checksum` are uploaded, replacing the remote version in place.
+
+    With `resume`, every created folder, completed file and resumable upload session
+    is recorded in a job journal. Rerunning with the same journal skips the recorded
+    work without any API calls and continues interrupted uploads from their last chunk.
+
+    Per-file progress is not printed but emitted as events to the installed
+    instrumentation, see `src.gdrive_api.instrumentation`.
+
     Args:
         service: The Google Drive service resource.
         source_folder_path: The path to the local folder to upload.
         destination_folder: The ID or URL of the destination folder in Google Drive.
         force_replace: If True, re-upload files even if they exist.
         is_url: A flag indicating whether the provided destination is a URL. Default is True.
+        max_workers: Maximum number of concurrent file uploads. Default is 1 (serial).
+        service_factory: A callable returning a new authorized service, required when
+            `max_workers` is greater than 1 since a service must not be shared between threads.
+        folder_index: An index rooted at the destination folder to resolve and create subfolders
+            with. By default a new one is built, listing the destination folder tree once.
+        sync: If True, upload only new or changed files. Cannot be combined with `force_replace`.
+        delete_remote: If True, in `sync` mode, trash remote files and folders that no longer
+            exist locally.
+        manifest_path: In `sync` mode, a JSON file caching local MD5 digests by path, mtime and
+            size so unchanged files are not re-hashed between runs.
+        sync_stats: In `sync` mode, a `SyncStats` to collect the uploaded and avoided bytes and
+            calls into.
+        resume: The path of a JSONL job journal, created if missing. Work recorded in it by an
+            earlier run is skipped.
+        on_result: Called with the relative file path and URL of every file once it is done,
+            in completion order, instead of collecting the results.
+        results_path: A JSONL file to write {"path": ..., "url": ...} lines to, one per file
+            once it is done, instead of collecting the results. Overwritten.
 
     Raises:
         FolderNotFoundError: If the local folder does not exist.
         UploadError: If an error occurs during file upload.
 
     Returns:
-        Dict of relative file path -> URL for the file after upload, URL is None if it was skipped due to force replace.
+        Dict of relative file path -> URL for the file after upload, URL is None if it was skipped
+        due to force replace or, in `sync` mode, because it is unchanged. Empty if the results
+        are streamed to `on_result` or `results_path`.
     """
     destination_folder_id = extract_folder_id(destination_folder, is_url)
     if not os.path.exists(source_folder_path):
         raise FolderNotFoundError(
             f"Local folder '{source_folder_path}' does not exist."
         )
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1.")
+    if max_workers > 1 and service_factory is None:
+        raise ValueError("A service_factory is required when max_workers is greater than 1.")
+    if sync and force_replace:
+        raise ValueError("sync and force_replace cannot be combined.")
+    if delete_remote and not sync:
+        raise ValueError("delete_remote is only supported in sync mode.")
+    if folder_index is None:
+        folder_index = DriveFolderIndex(service, destination_folder_id)
+    elif folder_index.root_id != destination_folder_id:
+        raise ValueError("folder_index must be rooted at the destination folder.")
 
-    total_dirs = sum([len(dirs) for _, dirs, _ in os.walk(source_folder_path)])
-    total_files = sum([len(files) for _, _, files in os.walk(source_folder_path)])
-    dir_counter = 0
-    file_counter = 0
+    journal = JobJournal(resume) if resume is not None else None
+    uploader = _FileUploader(force_replace, journal)
+    if sync:
+        uploader = _SyncUploader(
+            HashManifest(manifest_path),
+            sync_stats if sync_stats is not None else SyncStats(),
+            journal,
+        )
 
-    uploaded_files_count = 0
-    skipped_files_count = 0
     uploaded_files = {}
-    for root, dirs, files in os.walk(source_folder_path):
-        dir_counter += 1
-        relative_path = os.path.relpath(root, source_folder_path)
-        current_folder_id = (
-            destination_folder_id
-            if relative_path == "."
-            else get_nested_folder_id(service, relative_path, destination_folder_id)
-        )
+    counts = {"uploaded": 0, "skipped": 0}
+    results_file = open(results_path, "w") if results_path is not None else None
+    stream = on_result is not None or results_file is not None
 
-        if current_folder_id is None:
-            current_folder_id = create_folder_path(
-                service, relative_path, destination_folder_id
-            )
+    def record(relative_file_path: str, file_url: Optional[str]):
+        counts["uploaded" if file_url is not None else "skipped"] += 1
+        if not stream:
+            uploaded_files[relative_file_path] = file_url
+            return
+        if on_result is not None:
+            on_result(relative_file_path, file_url)
+        if results_file is not None:
+            results_file.write(json.dumps({"path": relative_file_path, "url": file_url}) + "\n")
 
-        print("-" * 60)
-        print(
-            f"Processing directory {relative_path}: {dir_counter} of {total_dirs} in total."
-        )
-        for index, file_name in enumerate(files, start=1):
-            file_counter += 1
-            file_path = os.path.join(root, file_name)
-            print(
-                f"Uploading file {index} of {len(files)} in '{relative_path}', {file_counter} of {total_files} in total."
+    executor = None
+    service_pool = None
+    pending = {}
+    if max_workers > 1:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        service_pool = ServicePool(service_factory)
+
+    def record_next_done():
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            # Re-raises the UploadError of the first failed upload, if any
+            record(pending.pop(future), future.result())
+
+    total_dirs = 0
+    total_files = 0
+    try:
+        for folder in scan_folder(source_folder_path):
+            relative_path = folder.relative_path
+            total_dirs += len(folder.dir_names)
+            total_files += len(folder.file_names)
+            current_folder_id = journal.folder_id(relative_path) if journal else None
+            if current_folder_id is None:
+                current_folder_id = folder_index.ensure(relative_path)
+                if journal is not None:
+                    journal.record_folder(relative_path, current_folder_id)
+            relative_file_paths = [
+                os.path.normpath(os.path.join(relative_path, file_name))
+                for file_name in folder.file_names
+            ]
+            pending_files = [
+                relative_file_path
+                for relative_file_path in relative_file_paths
+                if journal is None or not journal.is_done(relative_file_path)
+            ]
+            existing_files = (
+                {}
+                if folder_index.created(current_folder_id) or not (pending_files or delete_remote)
+                else list_folder_files(service, current_folder_id)
             )
-            try:
-                file_url = upload_file(
-                    service, file_path, current_folder_id, force_replace
+
+            progress("directory", relative_path, current_folder_id)
+            if delete_remote:
+                uploader.trash_missing(
+                    service,
+                    folder_index,
+                    current_folder_id,
+                    folder.dir_names,
+                    folder.file_names,
+                    existing_files,
                 )
-                relative_file_path = os.path.relpath(file_path, source_folder_path)
-                print(relative_file_path)
-                print("=" * 90)
-                if file_url is not None:
-                    uploaded_files_count += 1
-                    uploaded_files[relative_file_path] = file_url
-                else:
-                    skipped_files_count += 1
+            for file_name, relative_file_path in zip(folder.file_names, relative_file_paths):
+                file_path = os.path.join(folder.path, file_name)
+                if journal is not None and journal.is_done(relative_file_path):
+                    record(relative_file_path, journal.result(relative_file_path))
+                    continue
+                if executor is None:
+                    record(
+                        relative_file_path,
+                        uploader.upload(
+                            service, file_path, relative_file_path, current_folder_id, existing_files
+                        ),
+                    )
+                    continue
+                if not stream:
+                    # Reserve the slot so the result keeps walk order
                     uploaded_files[relative_file_path] = None
-            except Exception as e:
-                raise UploadError(
-                    f"An error occurred while uploading '{file_name}': {e}"
+                future = executor.submit(
+                    uploader.upload_in_worker,
+                    service_pool,
+                    file_path,
+                    relative_file_path,
+                    current_folder_id,
+                    existing_files,
                 )
+                pending[future] = relative_file_path
+                if len(pending) >= max_workers * PENDING_UPLOADS_PER_WORKER:
+                    record_next_done()
+
+        while pending:
+            record_next_done()
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        uploader.close()
+        if journal is not None:
+            journal.close()
+        if results_file is not None:
+            results_file.close()
 
     print("=" * 60)
-    print(f"Successfully uploaded {uploaded_files_count} files out of {total_files}.")
-    print(f"Skipped {skipped_files_count} files.")
+    print(f"Successfully uploaded {counts['uploaded']} files out of {total_files}.")
+    print(f"Skipped {counts['skipped']} files.")
     print(f"Successfully processed {total_dirs} directories.")
+    if sync:
+        print(uploader.sync_stats.summary())
     print("=" * 60)
     return uploaded_files
+
+
+class _FileUploader:
+    """Uploads the files of `upload_folder`, wrapping any failure in an `UploadError`."""
+
+    def __init__(self, force_replace: bool = False, journal: Optional[JobJournal] = None):
+        self.force_replace = force_replace
+        self.journal = journal
+
+    def upload(
+        self,
+        service: Resource,
+        file_path: str,
+        relative_file_path: str,
+        parent_id: str,
+        existing_files: dict[str, RemoteFile],
+    ) -> Optional[str]:
+        try:
+            file_url = self._upload(
+                service, file_path, relative_file_path, parent_id, existing_files
+            )
+        except Exception as e:
+            raise UploadError(
+                f"An error occurred while uploading '{os.path.basename(file_path)}': {e}"
+            )
+        if self.journal is not None:
+            self.journal.record_done(relative_file_path, file_url)
+        return file_url
+
+    def upload_in_worker(
+        self,
+        service_pool: ServicePool,
+        file_path: str,
+        relative_file_path: str,
+        parent_id: str,
+        existing_files: dict[str, RemoteFile],
+    ) -> Optional[str]:
+        """Upload a single file from a pool worker using that worker's own service."""
+        return self.upload(
+            service_pool.get(), file_path, relative_file_path, parent_id, existing_files
+        )
+
+    def close(self):
+        pass
+
+    def _upload(
+        self,
+        service: Resource,
+        file_path: str,
+        relative_file_path: str,
+        parent_id: str,
+        existing_files: dict[str, RemoteFile],
+    ) -> Optional[str]:
+        session_uri = None
+        on_session = None
+        stat = os.stat(file_path)
+        # Files sent in a single chunk have nothing to resume
+        if self.journal is not None and stat.st_size > UPLOAD_CHUNK_SIZE:
+            session_uri = self.journal.session(
+                relative_file_path, stat.st_size, stat.st_mtime_ns
+            )
+
+            def on_session(uri: str):
+                self.journal.record_session(
+                    relative_file_path, uri, stat.st_size, stat.st_mtime_ns
+                )
+
+        return upload_file(
+            service,
+            file_path,
+            parent_id,
+            self.force_replace,
+            existing_files,
+            session_uri,
+            on_session,
+        )
+
+
+class _SyncUploader(_FileUploader):
+    """Uploads only new files and files whose size or MD5 differ from the remote copy."""
+
+    def __init__(
+        self,
+        manifest: HashManifest,
+        sync_stats: SyncStats,
+        journal: Optional[JobJournal] = None,
+    ):
+        super().__init__(force_replace=True, journal=journal)
+        self.manifest = manifest
+        self.sync_stats = sync_stats
+
+    def close(self):
+        self.manifest.save()
+
+    def _upload(
+        self,
+        service: Resource,
+        file_path: str,
+        relative_file_path: str,
+        parent_id: str,
+        existing_files: dict[str, RemoteFile],
+    ) -> Optional[str]:
+        file_name = os.path.basename(file_path)
+        size = os.path.getsize(file_path)
+        remote_file = existing_files.get(file_name)
+        # Compare sizes first so changed files of a different size are never hashed
+        if (
+            remote_file is not None
+            and remote_file.size == size
+            and remote_file.md5_checksum == self.manifest.md5(relative_file_path, file_path)
+        ):
+            progress("unchanged", file_name, parent_id)
+            self.sync_stats.record_unchanged(size)
+            return None
+        file_url = super()._upload(
+            service, file_path, relative_file_path, parent_id, existing_files
+        )
+        self.sync_stats.record_uploaded(size)
+        return file_url
+
+    def trash_missing(
+        self,
+        service: Resource,
+        folder_index: DriveFolderIndex,
+        folder_id: str,
+        local_dirs: list,
+        local_files: list,
+        existing_files: dict[str, RemoteFile],
+    ):
+        """Trash the remote files and subfolders of a folder that no longer exist locally."""
+        for file_name in set(existing_files).difference(local_files):
+            trash_file(service, existing_files[file_name].id)
+            progress("trashed", file_name, folder_id)
+            self.sync_stats.record_trashed()
+        for folder_name, subfolder_id in folder_index.children(folder_id).items():
+            if folder_name not in local_dirs:
+                trash_file(service, subfolder_id)
+                folder_index.remove_child(folder_id, folder_name)
+                progress("trashed", folder_name, folder_id)
+                self.sync_stats.record_trashed()
@@ -0,0 +1,155 @@
+import math
+import threading
+from collections import Counter, defaultdict
+from typing import Callable, NamedTuple, Optional
+
+
+class ApiEvent(NamedTuple):
+    """One API call, emitted by the request executor once the call completed or failed.
+
+    Attributes:
+        operation: The name the call is counted under, e.g. `drive.files.copy`.
+        status: The HTTP status of the last attempt, 200 on success and 0 for errors
+            without one, e.g. connection errors.
+        retries: The number of times the call was retried.
+        duration: Seconds from the first attempt to the end of the last one, including
+            retry backoff but not client-side throttling.
+        bytes: Bytes of request body sent and of media received, if known.
+    """
+
+    operation: str
+    status: int
+    retries: int
+    duration: float
+    bytes: int
+
+
+class ProgressEvent(NamedTuple):
+    """A unit of work done, e.g. a file uploaded, skipped or copied.
+
+    Attributes:
+        kind: What happened, e.g. `uploaded`, `replaced`, `skipped`, `unchanged`, `copied`.
+        name: The file, folder or user the event is about.
+        target: Where it happened, e.g. the ID of the destination folder or file.
+    """
+
+    kind: str
+    name: str
+    target: str = ""
+
+    @property
+    def message(self) -> str:
+        return f"{self.kind} '{self.name}'" + (f" in '{self.target}'" if self.target else "")
+
+
+class Instrumentation:
+    """Receiver of the events `src.gdrive_api` emits. This base class ignores them.
+
+    Subclass it, or use `Recorder`, and install it with `set_instrumentation`.
+    """
+
+    def api_call(self, event: ApiEvent):
+        pass
+
+    def progress(self, event: ProgressEvent):
+        pass
+
+
+class Recorder(Instrumentation):
+    """Thread-safe recorder of API call latencies and progress counts.
+
+    Args:
+        on_progress: Called with every progress event, e.g. to drive a progress bar.
+        verbose: If True, print a line per progress event.
+    """
+
+    def __init__(
+        self,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        verbose: bool = False,
+    ):
+        self.on_progress = on_progress
+        self.verbose = verbose
+        self.progress_counts = Counter()
+        self.durations = defaultdict(list)
+        self.bytes = Counter()
+        self.retries = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def api_call(self, event: ApiEvent):
+        with self._lock:
+            self.durations[event.operation].append(event.duration)
+            self.bytes[event.operation] += event.bytes
+            self.retries[event.operation] += event.retries
+            if event.status == 0 or event.status >= 400:
+                self.errors[event.operation] += 1
+
+    def progress(self, event: ProgressEvent):
+        with self._lock:
+            self.progress_counts[event.kind] += 1
+        if self.on_progress is not None:
+            self.on_progress(event)
+        if self.verbose:
+            print(event.message)
+
+    def percentile(self, operation: str, fraction: float) -> float:
+        """Return the nearest-rank percentile of an operation's call durations, in seconds."""
+        with self._lock:
+            durations = sorted(self.durations[operation])
+        if not durations:
+            return 0.0
+        return durations[max(0, math.ceil(fraction * len(durations)) - 1)]
+
+    def reset(self):
+        with self._lock:
+            self.progress_counts.clear()
+            self.durations.clear()
+            self.bytes.clear()
+            self.retries.clear()
+            self.errors.clear()
+
+    def summary(self) -> str:
+        """Return a table of calls, errors, retries, bytes and p50/p95 latency per operation."""
+        lines = [
+            f"{'operation':<36} {'calls':>7} {'errors':>6} {'retries':>7} "
+            f"{'MiB':>8} {'p50 ms':>8} {'p95 ms':>8} {'total s':>8}"
+        ]
+        with self._lock:
+            operations = sorted(self.durations)
+        for operation in operations:
+            with self._lock:
+                durations = list(self.durations[operation])
+            lines.append(
+                f"{operation:<36} {len(durations):>7} {self.errors[operation]:>6} "
+                f"{self.retries[operation]:>7} {self.bytes[operation] / 2**20:>8.2f} "
+                f"{self.percentile(operation, 0.5) * 1000:>8.1f} "
+                f"{self.percentile(operation, 0.95) * 1000:>8.1f} {sum(durations):>8.2f}"
+            )
+        if self.progress_counts:
+            lines.append(
+                ", ".join(f"{count} {kind}" for kind, count in sorted(self.progress_counts.items()))
+            )
+        return "\n".join(lines)
+
+
+_instrumentation = Instrumentation()
+
+
+def get_instrumentation() -> Instrumentation:
+    """Return the instrumentation receiving the events of all `src.gdrive_api` calls."""
+    return _instrumentation
+
+
+def set_instrumentation(instrumentation: Optional[Instrumentation]):
+    """Replace the instrumentation receiving the events of all `src.gdrive_api` calls.
+
+    None restores the default, which ignores every event.
+    """
+    global _instrumentation
+    _instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+
+
+def progress(kind: str, name: str, target: str = ""):
+    """Emit a progress event to the installed instrumentation."""
+    _instrumentation.progress(ProgressEvent(kind, name, target))
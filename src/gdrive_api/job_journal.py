@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+from typing import Optional
+
+# Bytes read at a time when looking back for the end of the last complete line
+_TAIL_CHUNK_SIZE = 64 * 1024
+
+
+def open_jsonl_for_append(path: str):
+    """Open a JSONL file for appending, cutting off a truncated last line first.
+
+    A crash mid-write leaves a last line without its newline, and the next record
+    appended would be glued onto it and lost along with it on load.
+
+    Args:
+        path: The JSONL file. Created if missing.
+
+    Returns:
+        The file, opened in text append mode.
+    """
+    if os.path.exists(path):
+        with open(path, "r+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - _TAIL_CHUNK_SIZE)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b"\n")
+                if newline != -1:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position != end:
+                f.truncate(position)
+    return open(path, "a")
+
+
+class JobJournal:
+    """Append-only JSONL journal of the work an upload or clone job has completed.
+
+    Every created folder, completed file and started resumable upload session is
+    appended as one JSON line and flushed as it happens, so a job that dies can be
+    resumed from the journal without re-querying Drive for the recorded work. A
+    truncated last line, left by a crash mid-write, is ignored on load and cut off
+    before appending.
+
+    Record kinds:
+        {"kind": "folder", "path": ..., "id": ...}
+        {"kind": "file", "key": ..., "result": ...}
+        {"kind": "session", "key": ..., "uri": ..., "size": ..., "mtime_ns": ...}
+        {"kind": "crawl", "folders": [...], "files": [...]}
+    """
+
+    def __init__(self, journal_path: str):
+        """
+        Args:
+            journal_path: The JSONL file to load from and append to. Created if missing.
+        """
+        self.journal_path = journal_path
+        self._folders = {}
+        self._files = {}
+        self._sessions = {}
+        self._crawl = None
+        self._lock = threading.Lock()
+        if os.path.exists(journal_path):
+            with open(journal_path) as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except ValueError:
+                        continue
+        self._file = open_jsonl_for_append(journal_path)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> "JobJournal":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def folder_id(self, path: str) -> Optional[str]:
+        """Return the recorded Drive ID of a folder path, or None."""
+        return self._folders.get(path)
+
+    def record_folder(self, path: str, folder_id: str):
+        if self._folders.get(path) != folder_id:
+            self._append({"kind": "folder", "path": path, "id": folder_id})
+
+    def is_done(self, key: str) -> bool:
+        """Return True if the file identified by `key` was recorded as completed."""
+        return key in self._files
+
+    def result(self, key: str):
+        """Return the recorded result of a completed file, e.g. its URL."""
+        return self._files.get(key)
+
+    def record_done(self, key: str, result=None):
+        self._append({"kind": "file", "key": key, "result": result})
+
+    def session(self, key: str, size: int, mtime_ns: int) -> Optional[str]:
+        """Return the resumable upload session URI of an unfinished file.
+
+        Sessions are only returned for the exact local file version they were started with.
+        """
+        session = self._sessions.get(key)
+        if session and session["size"] == size and session["mtime_ns"] == mtime_ns:
+            return session["uri"]
+        return None
+
+    def record_session(self, key: str, uri: str, size: int, mtime_ns: int):
+        self._append(
+            {"kind": "session", "key": key, "uri": uri, "size": size, "mtime_ns": mtime_ns}
+        )
+
+    def crawl(self) -> Optional[tuple[list, list]]:
+        """Return the recorded (folders, files) crawl of a clone source, or None."""
+        return self._crawl
+
+    def record_crawl(self, folders: list, files: list):
+        self._append({"kind": "crawl", "folders": folders, "files": files})
+
+    def _append(self, record: dict):
+        with self._lock:
+            self._apply(record)
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def _apply(self, record: dict):
+        kind = record.get("kind")
+        if kind == "folder":
+            self._folders[record["path"]] = record["id"]
+        elif kind == "file":
+            self._files[record["key"]] = record["result"]
+            self._sessions.pop(record["key"], None)
+        elif kind == "session":
+            self._sessions[record["key"]] = record
+        elif kind == "crawl":
+            self._crawl = (
+                [tuple(folder) for folder in record["folders"]],
+                [tuple(file) for file in record["files"]],
+            )
@@ -0,0 +1,321 @@
+import math
+import time
+from typing import NamedTuple, Optional
+
+from src.gdrive_api.update_file_permissions import (
+    PermissionOutcome,
+    PermissionResult,
+    Role,
+)
+from src.gdrive_api.utils import MAX_BATCH_SIZE, execute_in_batches, extract_file_id
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+SKIP = "skip"
+# The file's permissions could not be listed, so nothing is written for the pair
+FAILED = "failed"
+
+
+class PermissionCache:
+    """
+    Per-file cache of user permissions, each entry expiring `ttl` seconds after it was fetched.
+
+    Entries map a lowercased email address to the permission resource (id, emailAddress, role).
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        """
+        :param ttl: Number of seconds a file's permissions are trusted after being fetched.
+        """
+        self.ttl = ttl
+        self._entries = {}
+
+    def get(self, file_id: str) -> "Optional[dict[str, dict]]":
+        """
+        Return the cached permissions of a file, or None if missing or expired.
+        """
+        entry = self._entries.get(file_id)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, file_id: str, permissions: list) -> "dict[str, dict]":
+        """
+        Cache the permission resources of a file, replacing any previous entry.
+
+        :return: The cached permissions, as `get` would return them.
+        """
+        by_email = {p["emailAddress"].lower(): p for p in permissions if p.get("emailAddress")}
+        self._entries[file_id] = (time.monotonic(), by_email)
+        return by_email
+
+    def invalidate(self, file_id: Optional[str] = None):
+        """
+        Drop a file's entry, or every entry if no file is given.
+        """
+        if file_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(file_id, None)
+
+
+class PlannedAction(NamedTuple):
+    action: str
+    file_id: str
+    user_email: str
+    role: Role
+    permission_id: Optional[str] = None
+    current_role: Optional[str] = None
+    error: Optional[str] = None
+
+
+class PermissionPlan:
+    """
+    The minimal set of permission writes turning the current ACLs into the requested ones.
+    """
+
+    def __init__(self, actions: list, acl_fetches: int, acl_http_requests: int):
+        """
+        :param actions: One PlannedAction per (file, user) pair.
+        :param acl_fetches: Number of `permissions().list` calls made to build the plan.
+        :param acl_http_requests: Number of HTTP requests those calls took.
+        """
+        self.actions = actions
+        self.acl_fetches = acl_fetches
+        self.acl_http_requests = acl_http_requests
+
+    @property
+    def writes(self) -> list:
+        return [a for a in self.actions if a.action not in (SKIP, FAILED)]
+
+    @property
+    def legacy_calls(self) -> int:
+        """
+        Number of calls `update_file_permissions` makes for the same pairs: a list, a delete
+        if the user already has a permission and a create unless the role is REMOVE.
+        """
+        return sum(
+            1 + (a.permission_id is not None) + (a.role != Role.REMOVE)
+            for a in self.actions
+        )
+
+    @property
+    def planned_calls(self) -> int:
+        return self.acl_fetches + len(self.writes)
+
+    def print_plan(self):
+        """
+        Print every planned action and the call counts before and after planning.
+        """
+        for a in self.actions:
+            if a.action == FAILED:
+                print(f"{a.action:>6} {a.file_id} {a.user_email}: {a.error}")
+                continue
+            current = a.current_role or "none"
+            print(f"{a.action:>6} {a.file_id} {a.user_email}: {current} -> {a.role.value}")
+        counts = {action: 0 for action in (CREATE, UPDATE, DELETE, SKIP, FAILED)}
+        for a in self.actions:
+            counts[a.action] += 1
+        print(
+            f"{counts[CREATE]} creates, {counts[UPDATE]} updates, {counts[DELETE]} deletes, "
+            f"{counts[SKIP]} unchanged, {counts[FAILED]} failed."
+        )
+        print(
+            f"Calls: {self.legacy_calls} with update_file_permissions, {self.planned_calls} planned "
+            f"({self.acl_fetches} ACL fetches in {self.acl_http_requests} HTTP requests, "
+            f"{len(self.writes)} writes)."
+        )
+
+
+def plan_permissions(
+    service,
+    users_permissions: "dict[str, dict[str, Role]]",
+    is_url: bool = True,
+    cache: Optional[PermissionCache] = None,
+    batch_size: int = MAX_BATCH_SIZE,
+) -> PermissionPlan:
+    """
+    Plan the minimal permission writes for multiple users across multiple files.
+
+    The current ACL of each file is fetched once, in batches, unless it is in the cache.
+    Pairs whose user already has the role are skipped, differing roles are updated in
+    place and missing permissions are created. The pairs of a file whose permissions
+    could not be listed are planned as FAILED, with the error, and the rest is still planned.
+
+    :param service: Authorized Google Drive service instance.
+    :param users_permissions: A dictionary mapping user emails to another dictionary that maps file IDs or URLs to Roles.
+    :param is_url: A flag indicating whether the provided files are URLs. Default is True.
+    :param cache: A PermissionCache to read ACLs from and store fetched ACLs into.
+    :param batch_size: Maximum number of calls per batch request, at most 100.
+    :return: The PermissionPlan.
+    """
+    if cache is None:
+        cache = PermissionCache()
+    changes = requested_changes(users_permissions, is_url)
+    # Planned from this snapshot, as cache entries may expire while the missing ACLs are fetched
+    acls = {file_id: cache.get(file_id) for file_id, _ in changes}
+    missing = [file_id for file_id, acl in acls.items() if acl is None]
+    responses = execute_in_batches(
+        service,
+        [
+            (
+                file_id,
+                service.permissions().list(
+                    fileId=file_id, fields="permissions(id,emailAddress,role)"
+                ),
+            )
+            for file_id in missing
+        ],
+        batch_size,
+    )
+    errors = {}
+    for file_id, (response, error) in responses.items():
+        if error is not None:
+            errors[file_id] = error
+            continue
+        acls[file_id] = cache.put(file_id, response.get("permissions", []))
+    return PermissionPlan(
+        plan_actions(changes, acls, errors), len(missing), math.ceil(len(missing) / batch_size)
+    )
+
+
+def requested_changes(
+    users_permissions: "dict[str, dict[str, Role]]", is_url: bool
+) -> "dict[tuple[str, str], Role]":
+    """
+    Flatten the requested roles into a dictionary mapping (file ID, user email) to a Role.
+    """
+    changes = {}
+    for user_email, files_permissions in users_permissions.items():
+        for file_id_or_url, role in files_permissions.items():
+            if role not in list(Role):
+                raise ValueError(f"Invalid role. Must be one of {list(Role)}")
+            changes[(extract_file_id(file_id_or_url, is_url), user_email)] = role
+    return changes
+
+
+def plan_actions(
+    changes: "dict[tuple[str, str], Role]",
+    acls: "dict[str, dict[str, dict]]",
+    errors: "Optional[dict[str, str]]" = None,
+) -> list:
+    """
+    Compare the requested roles to the ACLs of every file, as `PermissionCache.get` returns them, and return the PlannedActions.
+
+    :param errors: A dictionary mapping the IDs of the files whose ACL could not be fetched to the error. Their pairs are planned as FAILED.
+    """
+    errors = errors or {}
+    actions = []
+    for (file_id, user_email), role in changes.items():
+        if file_id in errors:
+            actions.append(
+                PlannedAction(FAILED, file_id, user_email, role, error=errors[file_id])
+            )
+            continue
+        current = acls[file_id].get(user_email.lower())
+        permission_id = current["id"] if current else None
+        current_role = current["role"] if current else None
+        if role == Role.REMOVE:
+            # Drive rejects deleting the owner's permission, ownership must be transferred first
+            action = DELETE if current and current_role != "owner" else SKIP
+        elif current is None:
+            action = CREATE
+        elif current_role in (role.value, "owner"):
+            # Owners already have full access and can't be changed through an update
+            action = SKIP
+        else:
+            action = UPDATE
+        actions.append(
+            PlannedAction(action, file_id, user_email, role, permission_id, current_role)
+        )
+    return actions
+
+
+def skip_result(a: PlannedAction) -> PermissionResult:
+    """
+    Return the result of a skipped or failed action, a failure for removing an owner.
+    """
+    if a.action == FAILED:
+        return PermissionResult(PermissionOutcome.FAILED, a.error)
+    if a.role != Role.REMOVE:
+        return PermissionResult(PermissionOutcome.UNCHANGED)
+    if a.current_role == "owner":
+        return PermissionResult(PermissionOutcome.FAILED, "The owner's permission can't be removed.")
+    return PermissionResult(PermissionOutcome.NOT_FOUND)
+
+
+def execute_plan(
+    service,
+    plan: PermissionPlan,
+    cache: Optional[PermissionCache] = None,
+    batch_size: int = MAX_BATCH_SIZE,
+) -> "dict[tuple[str, str], PermissionResult]":
+    """
+    Execute the writes of a PermissionPlan in batches.
+
+    :param service: Authorized Google Drive service instance.
+    :param plan: The plan from `plan_permissions`.
+    :param cache: The PermissionCache used for planning. Files that were written to are invalidated.
+    :param batch_size: Maximum number of calls per batch request, at most 100.
+    :return: A dictionary mapping (file ID, user email) to the PermissionResult of that pair.
+    """
+    results = {}
+    requests = []
+    for a in plan.actions:
+        key = (a.file_id, a.user_email)
+        if a.action in (SKIP, FAILED):
+            results[key] = skip_result(a)
+            continue
+        if a.action == CREATE:
+            permission = {"type": "user", "role": a.role.value, "emailAddress": a.user_email}
+            request = service.permissions().create(fileId=a.file_id, body=permission)
+            outcome = PermissionOutcome.CREATED
+        elif a.action == UPDATE:
+            request = service.permissions().update(
+                fileId=a.file_id, permissionId=a.permission_id, body={"role": a.role.value}
+            )
+            outcome = PermissionOutcome.UPDATED
+        else:
+            request = service.permissions().delete(
+                fileId=a.file_id, permissionId=a.permission_id
+            )
+            outcome = PermissionOutcome.REMOVED
+        results[key] = PermissionResult(outcome)
+        requests.append((key, request))
+
+    for key, (_, error) in execute_in_batches(service, requests, batch_size).items():
+        if error is not None:
+            results[key] = PermissionResult(PermissionOutcome.FAILED, error)
+    if cache is not None:
+        for file_id, _ in dict(requests):
+            cache.invalidate(file_id)
+    return results
+
+
+def apply_permissions(
+    service,
+    users_permissions: "dict[str, dict[str, Role]]",
+    is_url: bool = True,
+    cache: Optional[PermissionCache] = None,
+    dry_run: bool = False,
+    batch_size: int = MAX_BATCH_SIZE,
+) -> "Optional[dict[tuple[str, str], PermissionResult]]":
+    """
+    Plan and execute the minimal permission writes for multiple users across multiple files.
+
+    :param service: Authorized Google Drive service instance.
+    :param users_permissions: A dictionary mapping user emails to another dictionary that maps file IDs or URLs to Roles.
+    :param is_url: A flag indicating whether the provided files are URLs. Default is True.
+    :param cache: A PermissionCache to reuse ACLs across calls.
+    :param dry_run: If True, print the plan and its call counts without writing anything.
+    :param batch_size: Maximum number of calls per batch request, at most 100.
+    :return: A dictionary mapping (file ID, user email) to the PermissionResult of that pair, None on a dry run.
+    """
+    if cache is None:
+        cache = PermissionCache()
+    plan = plan_permissions(service, users_permissions, is_url, cache, batch_size)
+    if dry_run:
+        plan.print_plan()
+        return None
+    return execute_plan(service, plan, cache, batch_size)
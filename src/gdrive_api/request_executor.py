@@ -0,0 +1,346 @@
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Optional
+
+from googleapiclient.errors import HttpError
+
+from src.gdrive_api.instrumentation import ApiEvent, get_instrumentation
+
+# Drive's default per-user quota is 12,000 queries per minute
+DEFAULT_QUERIES_PER_SECOND = 12000 / 60
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RETRYABLE_403_REASONS = {"userRateLimitExceeded", "rateLimitExceeded"}
+
+
+class TokenBucket:
+    """Thread-safe token bucket, refilled continuously at `rate` tokens per second.
+
+    Args:
+        rate: Tokens added per second, i.e. the sustained request rate.
+        capacity: Maximum number of tokens, i.e. the largest burst. Defaults to one second of `rate`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Take `tokens` from the bucket, blocking until they are available.
+
+        Returns:
+            The number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(tokens)
+            if delay == 0.0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """Like `acquire`, but waits with `asyncio.sleep` instead of blocking the thread."""
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(tokens)
+            if delay == 0.0:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take `tokens` from the bucket if they are available, without waiting.
+
+        Returns:
+            0.0 if the tokens were taken, otherwise the number of seconds until they can be.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            # Requests bigger than the bucket are let through once it is full
+            needed = min(tokens, self.capacity)
+            if self._tokens >= needed:
+                self._tokens -= needed
+                return 0.0
+            return (needed - self._tokens) / self.rate
+
+
+class OperationStats:
+    """Counters of one operation type, e.g. `drive.files.list`."""
+
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.throttle_wait = 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"OperationStats(calls={self.calls}, retries={self.retries}, "
+            f"throttle_wait={self.throttle_wait:.3f})"
+        )
+
+
+class RequestExecutor:
+    """Executes Google API requests with client-side rate limiting and retries.
+
+    Retryable errors (429, 5xx, 403 rate limit errors and connection errors) are retried
+    with exponential backoff and full jitter. Every call first takes a token from a shared
+    token bucket, so any number of worker threads together stay under the quota. Each
+    completed or failed call is reported to the installed instrumentation as an `ApiEvent`.
+
+    Args:
+        max_retries: Maximum number of retries of a single request.
+        base_delay: Backoff ceiling in seconds for the first retry, doubled on every retry.
+        max_delay: Upper bound of the backoff ceiling in seconds.
+        queries_per_second: Sustained request rate of the token bucket. None disables it.
+        burst: Capacity of the token bucket. Defaults to one second of `queries_per_second`.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 64.0,
+        queries_per_second: Optional[float] = DEFAULT_QUERIES_PER_SECOND,
+        burst: Optional[float] = None,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.bucket = (
+            TokenBucket(queries_per_second, burst) if queries_per_second else None
+        )
+        self.stats = defaultdict(OperationStats)
+        self._lock = threading.Lock()
+
+    def execute(self, request, operation: Optional[str] = None, tokens: int = 1):
+        """Execute a request, throttling it and retrying retryable errors.
+
+        Args:
+            request: An `HttpRequest` (or `BatchHttpRequest`) built from a service.
+            operation: The name the call is counted under. Defaults to the request's method ID.
+            tokens: Number of quota units the request consumes, e.g. the size of a batch.
+
+        Returns:
+            The response of the request.
+        """
+        operation = operation or getattr(request, "methodId", None) or "unknown"
+        return self._with_retries(request.execute, operation, tokens, _request_bytes(request))
+
+    def execute_resumable(
+        self,
+        request,
+        operation: Optional[str] = None,
+        on_session: Optional[Callable[[str], None]] = None,
+    ):
+        """Execute a resumable media upload chunk by chunk, retrying each chunk.
+
+        After a retryable error the upload continues from the last byte the server
+        acknowledged instead of starting over.
+
+        Args:
+            request: An `HttpRequest` with a resumable `media_body`. Setting its `resumable_uri`
+                beforehand continues an upload session started earlier.
+            operation: The name the chunks are counted under. Defaults to the request's method ID.
+            on_session: Called with the session URI once the upload session is known.
+
+        Returns:
+            The response of the request once the upload is complete.
+        """
+        operation = operation or getattr(request, "methodId", None) or "unknown"
+        session_uri = request.resumable_uri
+        response = None
+        if session_uri is not None:
+            # Ask the server how much of the session it already has before sending more
+            response = self._with_retries(lambda: _query_upload_session(request), operation, 1)
+        while response is None:
+            _, response = self._with_retries(
+                request.next_chunk, operation, 1, _chunk_bytes(request)
+            )
+            if on_session is not None and request.resumable_uri != session_uri:
+                session_uri = request.resumable_uri
+                on_session(session_uri)
+        return response
+
+    def _with_retries(self, call: Callable, operation: str, tokens: int, sent_bytes: int = 0):
+        started_at = time.perf_counter()
+        throttled = 0.0
+        status = 0
+        response = None
+        attempt = 0
+        try:
+            for attempt in range(self.max_retries + 1):
+                throttled += self.throttle(operation, tokens)
+                try:
+                    response = call()
+                    status = 200
+                    return response
+                except Exception as e:
+                    status = e.resp.status if isinstance(e, HttpError) else 0
+                    if attempt == self.max_retries or not self.is_retryable(e):
+                        raise
+                    self.backoff(operation, attempt)
+        finally:
+            received_bytes = len(response) if isinstance(response, bytes) else 0
+            get_instrumentation().api_call(
+                ApiEvent(
+                    operation,
+                    status,
+                    attempt,
+                    time.perf_counter() - started_at - throttled,
+                    sent_bytes + received_bytes,
+                )
+            )
+
+    def throttle(self, operation: str, tokens: int = 1) -> float:
+        """Count a call of `operation` and wait for its quota tokens.
+
+        Returns:
+            The number of seconds spent waiting.
+        """
+        waited = self.bucket.acquire(tokens) if self.bucket is not None else 0.0
+        self._record_call(operation, tokens, waited)
+        return waited
+
+    async def throttle_async(self, operation: str, tokens: int = 1) -> float:
+        """Like `throttle`, for coroutines. Shares the token bucket with the threaded calls."""
+        waited = await self.bucket.acquire_async(tokens) if self.bucket is not None else 0.0
+        self._record_call(operation, tokens, waited)
+        return waited
+
+    def backoff(self, operation: str, attempt: int):
+        """Count a retry of `operation` and sleep before it."""
+        time.sleep(self._record_retry(operation, attempt))
+
+    async def backoff_async(self, operation: str, attempt: int):
+        """Like `backoff`, for coroutines."""
+        await asyncio.sleep(self._record_retry(operation, attempt))
+
+    def _record_call(self, operation: str, tokens: int, waited: float):
+        with self._lock:
+            stats = self.stats[operation]
+            stats.calls += tokens
+            stats.throttle_wait += waited
+
+    def _record_retry(self, operation: str, attempt: int) -> float:
+        """Count a retry of `operation` and return the jittered delay before it."""
+        with self._lock:
+            self.stats[operation].retries += 1
+        ceiling = min(self.max_delay, self.base_delay * 2**attempt)
+        return random.uniform(0, ceiling)
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """Return True if the error is transient and the request can be sent again."""
+        if isinstance(error, HttpError):
+            status = error.resp.status
+            if status in RETRYABLE_STATUSES:
+                return True
+            return status == 403 and bool(RETRYABLE_403_REASONS & _error_reasons(error))
+        return isinstance(error, (ConnectionError, TimeoutError, socket.timeout))
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats.clear()
+
+    def summary(self) -> str:
+        with self._lock:
+            return "\n".join(
+                f"{operation}: {stats.calls} calls, {stats.retries} retries, "
+                f"{stats.throttle_wait:.2f}s throttled"
+                for operation, stats in sorted(self.stats.items())
+            )
+
+
+def _request_bytes(request) -> int:
+    """Return the size of the body a request sends, 0 if unknown."""
+    media = getattr(request, "resumable", None)
+    if media is not None:
+        return max(media.size() or 0, 0)
+    body = getattr(request, "body", None)
+    return len(body) if isinstance(body, (str, bytes)) else 0
+
+
+def _chunk_bytes(request) -> int:
+    """Return the size of the next chunk a resumable upload sends, 0 if unknown."""
+    media = getattr(request, "resumable", None)
+    if media is None:
+        return 0
+    size = media.size()
+    if size is None or size < 0:
+        return media.chunksize()
+    return min(media.chunksize(), size - request.resumable_progress)
+
+
+def _query_upload_session(request):
+    """Ask the server how many bytes of a resumable upload session it has.
+
+    Sets the request's `resumable_progress` so its next chunk continues from there.
+
+    Raises:
+        HttpError: If the session can't be queried, e.g. 404 or 410 once it expired.
+
+    Returns:
+        The response of the request if the upload is already complete, otherwise None.
+    """
+    size = request.resumable.size()
+    headers = {
+        "Content-Range": f"bytes */{size if size is not None and size >= 0 else '*'}",
+        "Content-Length": "0",
+    }
+    resp, content = request.http.request(request.resumable_uri, method="PUT", headers=headers)
+    if resp.status in (200, 201):
+        return request.postproc(resp, content)
+    if resp.status != 308:
+        raise HttpError(resp, content, uri=request.resumable_uri)
+    # The Range header holds the bytes the server has, e.g. "bytes=0-1048575", none if missing
+    received = resp.get("range")
+    request.resumable_progress = int(received.rpartition("-")[2]) + 1 if received else 0
+    return None
+
+
+def _error_reasons(error: HttpError) -> set:
+    try:
+        content = json.loads(error.content.decode("utf-8"))
+    except (AttributeError, ValueError):
+        return set()
+    details = content.get("error", {}).get("errors", [])
+    return {detail.get("reason") for detail in details if isinstance(detail, dict)}
+
+
+_executor = RequestExecutor()
+
+
+def get_executor() -> RequestExecutor:
+    """Return the executor shared by all `src.gdrive_api` calls."""
+    return _executor
+
+
+def set_executor(executor: RequestExecutor):
+    """Replace the executor shared by all `src.gdrive_api` calls, e.g. to change the quota."""
+    global _executor
+    _executor = executor
+
+
+def execute(request, operation: Optional[str] = None, tokens: int = 1):
+    """Execute a request through the shared executor. See `RequestExecutor.execute`."""
+    return _executor.execute(request, operation, tokens)
+
+
+def execute_resumable(
+    request,
+    operation: Optional[str] = None,
+    on_session: Optional[Callable[[str], None]] = None,
+):
+    """Execute a resumable upload through the shared executor. See `RequestExecutor.execute_resumable`."""
+    return _executor.execute_resumable(request, operation, on_session)
@@ -1,9 +1,11 @@
 from enum import Enum
-from typing import List
+from typing import List, NamedTuple, Optional
 
 from googleapiclient.errors import HttpError
 
-from src.gdrive_api.utils import extract_file_id
+from src.gdrive_api.instrumentation import progress
+from src.gdrive_api.request_executor import execute
+from src.gdrive_api.utils import MAX_BATCH_SIZE, execute_in_batches, extract_file_id
 
 
 class Role(Enum):
@@ -12,6 +14,21 @@ class Role(Enum):
     REMOVE = "remove"
 
 
+class PermissionOutcome(Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    UNCHANGED = "unchanged"
+    REPLACED = "replaced"
+    REMOVED = "removed"
+    NOT_FOUND = "not_found"
+    FAILED = "failed"
+
+
+class PermissionResult(NamedTuple):
+    outcome: PermissionOutcome
+    error: Optional[str] = None
+
+
 def remove_permissions(
     service, file: str, user_email: str, is_url: bool = True
 ) -> bool:
@@ -25,17 +42,15 @@ def remove_permissions(
     :return: True if permissions were found and removed, False otherwise.
     """
     file_id = extract_file_id(file, is_url)
-    permissions = (
-        service.permissions()
-        .list(fileId=file_id, fields="permissions(id,emailAddress)")
-        .execute()
+    permissions = execute(
+        service.permissions().list(fileId=file_id, fields="permissions(id,emailAddress)")
     )
     for p in permissions["permissions"]:
         if p["emailAddress"] == user_email:
-            service.permissions().delete(fileId=file_id, permissionId=p["id"]).execute()
-            print(f"Removed {user_email}'s permissions.")
+            execute(service.permissions().delete(fileId=file_id, permissionId=p["id"]))
+            progress("permission_removed", user_email, file_id)
             return True
-    print(f"No permissions found for {user_email}.")
+    progress("permission_not_found", user_email, file_id)
     return False
 
 
@@ -56,11 +71,12 @@ def update_file_permissions(
     try:
         file_id = extract_file_id(file, is_url)
         permission = {"type": "user", "role": role.value, "emailAddress": user_email}
-        remove_permissions(service, file_id, user_email)
+        remove_permissions(service, file_id, user_email, is_url=False)
         if role != Role.REMOVE:
-            service.permissions().create(fileId=file_id, body=permission).execute()
-            print(f"Updated {user_email}'s permissions to {role.value}.")
+            execute(service.permissions().create(fileId=file_id, body=permission))
+            progress("permission_updated", user_email, file_id)
     except HttpError as error:
+        progress("permission_failed", user_email, file)
         print(f"An error occurred: {error}")
 
 
@@ -74,16 +90,8 @@ def update_permissions_for_multiple_users(
     :param users_permissions: A dictionary mapping user emails to another dictionary that maps file IDs or URLs to Roles.
     :param is_url: A flag indicating whether the provided file is a URL. Default is True.
     """
-    total_users = len(users_permissions)
-    for user_index, (user_email, files_permissions) in enumerate(
-        users_permissions.items(), start=1
-    ):
-        print(f"Updating user {user_index} of {total_users}: {user_email}")
-        total_files = len(files_permissions)
-        for file_index, (file_id_or_url, role) in enumerate(
-            files_permissions.items(), start=1
-        ):
-            print(f"Updating file {file_index} of {total_files} for user {user_email}")
+    for user_email, files_permissions in users_permissions.items():
+        for file_id_or_url, role in files_permissions.items():
             update_file_permissions(service, file_id_or_url, user_email, role, is_url)
 
 
@@ -119,3 +127,91 @@ def update_permissions_for_user(
     update_permissions_for_multiple_files(
         service, user_email, files_permissions, is_url
     )
+
+
+def update_permissions_in_batches(
+    service,
+    users_permissions: "dict[str, dict[str, Role]]",
+    is_url: bool = True,
+    batch_size: int = MAX_BATCH_SIZE,
+) -> "dict[tuple[str, str], PermissionResult]":
+    """
+    Update permissions for multiple users across multiple files using batch requests.
+
+    Each file's permissions are listed once for all users, then the deletes and the
+    creates are sent in batches of up to `batch_size` calls, deletes first. Like
+    `update_file_permissions`, an existing permission is deleted before the new one
+    is created.
+
+    :param service: Authorized Google Drive service instance.
+    :param users_permissions: A dictionary mapping user emails to another dictionary that maps file IDs or URLs to Roles.
+    :param is_url: A flag indicating whether the provided files are URLs. Default is True.
+    :param batch_size: Maximum number of calls per batch request, at most 100.
+    :return: A dictionary mapping (file ID, user email) to the PermissionResult of that pair.
+    """
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}.")
+    changes = {}
+    for user_email, files_permissions in users_permissions.items():
+        for file_id_or_url, role in files_permissions.items():
+            if role not in list(Role):
+                raise ValueError(f"Invalid role. Must be one of {list(Role)}")
+            changes[(extract_file_id(file_id_or_url, is_url), user_email)] = role
+
+    results = {}
+    file_ids = list(dict.fromkeys(file_id for file_id, _ in changes))
+    current_permissions = execute_in_batches(
+        service,
+        [
+            (
+                file_id,
+                service.permissions().list(
+                    fileId=file_id, fields="permissions(id,emailAddress)"
+                ),
+            )
+            for file_id in file_ids
+        ],
+        batch_size,
+    )
+
+    deletes = []
+    creates = []
+    for (file_id, user_email), role in changes.items():
+        response, error = current_permissions[file_id]
+        if error is not None:
+            results[(file_id, user_email)] = PermissionResult(PermissionOutcome.FAILED, error)
+            continue
+        existing = [
+            p
+            for p in response.get("permissions", [])
+            if p.get("emailAddress", "").lower() == user_email.lower()
+        ]
+        for p in existing:
+            deletes.append(
+                (
+                    (file_id, user_email),
+                    service.permissions().delete(fileId=file_id, permissionId=p["id"]),
+                )
+            )
+        if role == Role.REMOVE:
+            outcome = PermissionOutcome.REMOVED if existing else PermissionOutcome.NOT_FOUND
+        else:
+            permission = {"type": "user", "role": role.value, "emailAddress": user_email}
+            creates.append(
+                (
+                    (file_id, user_email),
+                    service.permissions().create(fileId=file_id, body=permission),
+                )
+            )
+            outcome = PermissionOutcome.REPLACED if existing else PermissionOutcome.CREATED
+        results[(file_id, user_email)] = PermissionResult(outcome)
+
+    for key, (_, error) in execute_in_batches(service, deletes, batch_size).items():
+        if error is not None:
+            results[key] = PermissionResult(PermissionOutcome.FAILED, error)
+    # A pair whose delete failed keeps its old permission, don't add a second one
+    creates = [(key, request) for key, request in creates if results[key].error is None]
+    for key, (_, error) in execute_in_batches(service, creates, batch_size).items():
+        if error is not None:
+            results[key] = PermissionResult(PermissionOutcome.FAILED, error)
+    return results
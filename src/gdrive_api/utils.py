@@ -1,7 +1,26 @@
 import re
-from typing import Optional
+from typing import Iterable, Iterator, NamedTuple, Optional
 from googleapiclient.discovery import Resource
 
+from src.gdrive_api.request_executor import execute, get_executor
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+# Number of parent IDs OR-ed together in a single `files().list` query
+PARENTS_PER_QUERY = 50
+
+# Maximum number of calls Drive accepts in one batch request
+MAX_BATCH_SIZE = 100
+
+
+class RemoteFile(NamedTuple):
+    """Metadata of a file in Google Drive, as returned by `files().list`."""
+
+    id: str
+    size: Optional[int]
+    md5_checksum: Optional[str]
+    modified_time: Optional[str]
+
 
 def extract_file_id(file: str, is_url: bool = True) -> str:
     """Extract the file ID from a Google Drive file URL or ID.
@@ -63,6 +82,18 @@ def extract_folder_id(folder: str, is_url: bool = True) -> str:
     return folder_id
 
 
+def escape_query_value(value: str) -> str:
+    """Escape a string for use inside single quotes in a Drive `files().list` query.
+
+    Args:
+        value: The raw value, e.g. a file name that may contain apostrophes.
+
+    Returns:
+        The value with backslashes and single quotes escaped.
+    """
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
 def get_nested_folder_id(
     service: Resource, folder_path: str, parent_id: str
 ) -> Optional[str]:
@@ -78,11 +109,10 @@ def get_nested_folder_id(
     """
     folder_names = folder_path.strip("/").split("/")
     for folder_name in folder_names:
-        query = f"name = '{folder_name}' and '{parent_id}' in parents and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-        response = (
+        query = f"name = '{escape_query_value(folder_name)}' and '{parent_id}' in parents and mimeType = '{FOLDER_MIME_TYPE}' and trashed = false"
+        response = execute(
             service.files()
             .list(q=query, spaces="drive", fields="files(id, name)")
-            .execute()
         )
         folders = response.get("files", [])
         if not folders:
@@ -109,10 +139,10 @@ def create_folder_path(service: Resource, folder_path: str, parent_id: str) -> s
         if folder_id is None:
             file_metadata = {
                 "name": folder_name,
-                "mimeType": "application/vnd.google-apps.folder",
+                "mimeType": FOLDER_MIME_TYPE,
                 "parents": [parent_id],
             }
-            folder = service.files().create(body=file_metadata, fields="id").execute()
+            folder = execute(service.files().create(body=file_metadata, fields="id"))
             folder_id = folder.get("id")
         parent_id = folder_id
     return parent_id
@@ -129,13 +159,166 @@ def get_file_id(service: Resource, file_name: str, parent_id: str) -> Optional[s
     Returns:
         The ID of the file or None if not found.
     """
-    query = f"name = '{file_name}' and '{parent_id}' in parents and trashed = false"
-    response = (
+    query = f"name = '{escape_query_value(file_name)}' and '{parent_id}' in parents and trashed = false"
+    response = execute(
         service.files()
         .list(q=query, spaces="drive", fields="files(id, name)")
-        .execute()
     )
     for file in response.get("files", []):
         if file.get("name") == file_name:
             return file.get("id")
     return None
+
+
+def list_children(
+    service: Resource,
+    parent_ids: Iterable[str],
+    fields: str = "id, name, mimeType, parents",
+    query: Optional[str] = None,
+    page_size: int = 1000,
+) -> Iterator[dict]:
+    """List the untrashed children of one or more Google Drive folders, following all pages.
+
+    Parents are OR-ed together, `PARENTS_PER_QUERY` at a time, so listing a whole tree
+    level costs one query per page rather than one per folder.
+
+    Args:
+        service: The Google Drive service resource.
+        parent_ids: The IDs of the parent folders.
+        fields: The file fields to request, `parents` is needed to tell the parents apart.
+        query: An extra condition AND-ed to the query, e.g. a mimeType filter.
+        page_size: Number of files requested per `files().list` page.
+
+    Yields:
+        The file resources, restricted to `fields`.
+    """
+    parent_ids = list(parent_ids)
+    for start in range(0, len(parent_ids), PARENTS_PER_QUERY):
+        parents = " or ".join(
+            f"'{parent_id}' in parents" for parent_id in parent_ids[start : start + PARENTS_PER_QUERY]
+        )
+        full_query = f"({parents}) and trashed = false"
+        if query:
+            full_query = f"{full_query} and {query}"
+        page_token = None
+        while True:
+            response = execute(
+                service.files()
+                .list(
+                    q=full_query,
+                    spaces="drive",
+                    fields=f"nextPageToken, files({fields})",
+                    pageSize=page_size,
+                    pageToken=page_token,
+                )
+            )
+            yield from response.get("files", [])
+            page_token = response.get("nextPageToken")
+            if page_token is None:
+                break
+
+
+def list_folder_files(
+    service: Resource, parent_id: str, page_size: int = 1000
+) -> dict[str, RemoteFile]:
+    """List the files directly inside a Google Drive folder, following all result pages.
+
+    Args:
+        service: The Google Drive service resource.
+        parent_id: The ID of the parent folder.
+        page_size: Number of files requested per `files().list` page.
+
+    Returns:
+        Dict of file name -> RemoteFile. Subfolders are not included and, as names can be
+        non-unique, the first file listed for a name wins.
+    """
+    query = f"'{parent_id}' in parents and mimeType != '{FOLDER_MIME_TYPE}' and trashed = false"
+    files = {}
+    page_token = None
+    while True:
+        response = execute(
+            service.files()
+            .list(
+                q=query,
+                spaces="drive",
+                fields="nextPageToken, files(id, name, size, md5Checksum, modifiedTime)",
+                pageSize=page_size,
+                pageToken=page_token,
+            )
+        )
+        for file in response.get("files", []):
+            if file["name"] not in files:
+                size = file.get("size")
+                files[file["name"]] = RemoteFile(
+                    id=file["id"],
+                    size=int(size) if size is not None else None,
+                    md5_checksum=file.get("md5Checksum"),
+                    modified_time=file.get("modifiedTime"),
+                )
+        page_token = response.get("nextPageToken")
+        if page_token is None:
+            break
+    return files
+
+
+def trash_file(service: Resource, file_id: str):
+    """Move a file or folder in Google Drive to the trash.
+
+    Args:
+        service: The Google Drive service resource.
+        file_id: The ID of the file or folder to trash.
+    """
+    execute(service.files().update(fileId=file_id, body={"trashed": True}, fields="id"))
+
+
+def execute_in_batches(
+    service: Resource, keyed_requests: list, batch_size: int = MAX_BATCH_SIZE
+) -> dict:
+    """Execute requests through batch HTTP requests of up to `batch_size` calls.
+
+    Calls failing with a retryable error are sent again in a new batch, with the
+    backoff and retry limit of the shared request executor.
+
+    Args:
+        service: The Google Drive service resource.
+        keyed_requests: A list of (key, request) pairs. Requests sharing a key are all executed.
+        batch_size: Maximum number of calls per batch request.
+
+    Returns:
+        Dict of key -> (response, error message or None). With several requests for a key,
+        the first error wins.
+    """
+    executor = get_executor()
+    responses = {}
+
+    for start in range(0, len(keyed_requests), batch_size):
+        chunk = keyed_requests[start : start + batch_size]
+        method_ids = {getattr(request, "methodId", None) for _, request in chunk}
+        operation = f"{method_ids.pop()} (batch)" if len(method_ids) == 1 else "batch"
+        pending = list(range(len(chunk)))
+        for attempt in range(executor.max_retries + 1):
+            retry = []
+
+            def callback(request_id, response, exception):
+                index = int(request_id)
+                if (
+                    exception is not None
+                    and attempt < executor.max_retries
+                    and executor.is_retryable(exception)
+                ):
+                    retry.append(index)
+                    return
+                key = chunk[index][0]
+                error = str(exception) if exception is not None else None
+                if key not in responses or responses[key][1] is None:
+                    responses[key] = (response, error)
+
+            batch = service.new_batch_http_request(callback=callback)
+            for index in pending:
+                batch.add(chunk[index][1], request_id=str(index))
+            execute(batch, operation, tokens=len(pending))
+            if not retry:
+                break
+            executor.backoff(operation, attempt)
+            pending = retry
+    return responses
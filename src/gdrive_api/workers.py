@@ -0,0 +1,31 @@
+import threading
+from typing import Callable
+
+from googleapiclient.discovery import Resource
+
+
+class ServicePool:
+    """Hand out one Google Drive service per worker thread.
+
+    The `Resource` returned by `build_service` wraps a single `httplib2.Http`
+    connection and is not thread-safe, so every worker needs its own instance.
+    Services are built lazily the first time a thread asks for one and reused
+    for the rest of that thread's lifetime.
+    """
+
+    def __init__(self, service_factory: Callable[[], Resource]):
+        """
+        Args:
+            service_factory: A callable returning a new authorized service, e.g.
+                `lambda: build_service(service_account_json_secrets_path)`.
+        """
+        self._service_factory = service_factory
+        self._local = threading.local()
+
+    def get(self) -> Resource:
+        """Return the service bound to the calling thread, building it if needed."""
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = self._service_factory()
+            self._local.service = service
+        return service
@@ -0,0 +1,232 @@
+import glob
+import gzip
+import json
+import os
+from typing import Iterable, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Shards are closed once they reach this many bytes on disk
+DEFAULT_SHARD_BYTES = 64 * 1024 * 1024
+# Records are compressed together in blocks of about this many uncompressed bytes
+DEFAULT_BLOCK_BYTES = 128 * 1024
+
+EXTENSIONS = {None: ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+INDEX_SUFFIX = ".index.json"
+
+
+def _compressor(compression: Optional[str]):
+    if compression is None:
+        return lambda data: data
+    if compression == "gzip":
+        # A fixed mtime keeps shards byte-identical across exports, so syncs skip them
+        return lambda data: gzip.compress(data, mtime=0)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd compression requires the zstandard package.")
+        return zstandard.ZstdCompressor().compress
+    raise ValueError(f"Invalid compression. Must be one of {list(EXTENSIONS)}")
+
+
+def _decompressor(compression: Optional[str]):
+    if compression is None:
+        return lambda data: data
+    if compression == "gzip":
+        return gzip.decompress
+    if zstandard is None:
+        raise ImportError("zstd compression requires the zstandard package.")
+    return zstandard.ZstdDecompressor().decompress
+
+
+class ShardedJsonlWriter:
+    """Stream records into size-bounded, optionally compressed JSONL shards.
+
+    Every record is one JSON line. Lines are grouped into blocks of about
+    `block_bytes`, and with compression every block is compressed on its own into a
+    separate gzip member or zstd frame. A shard is then still one valid `.gz`/`.zst`
+    file, compressing nearly as well as a single stream, and a single record can be
+    read by decompressing only its own block.
+
+    Next to each shard, a sidecar `<shard>.index.json` maps every record ID to
+    [shard name, block offset, block length, offset within the block, record length],
+    the block's in compressed bytes within the shard and the record's in uncompressed
+    bytes within the block.
+
+    The output directory only holds a handful of files, so it can be pushed with
+    `upload_folder` as is. Gzip shards of unchanged records are byte-identical
+    across exports, which lets `upload_folder(..., sync=True)` skip them.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        prefix: str = "conversations",
+        max_shard_bytes: int = DEFAULT_SHARD_BYTES,
+        compression: Optional[str] = None,
+        block_bytes: int = DEFAULT_BLOCK_BYTES,
+    ):
+        """
+        Args:
+            output_dir: The directory to write the shards and their indexes to. Created if
+                missing. Shards and indexes left there by an earlier export with the same
+                prefix are removed.
+            prefix: The file name prefix of the shards, followed by the shard number.
+            max_shard_bytes: A new shard is started once the current one would grow past this.
+            compression: None, "gzip" or "zstd".
+            block_bytes: A block is compressed and written once its records add up to
+                this many bytes. Larger blocks compress better, smaller ones make a
+                random read decompress less.
+        """
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Invalid compression. Must be one of {list(EXTENSIONS)}")
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_shard_bytes = max_shard_bytes
+        self.compression = compression
+        self.block_bytes = block_bytes
+        self.shard_paths = []
+        self._compress = _compressor(compression)
+        self._file = None
+        self._index = {}
+        self._offset = 0
+        # (record ID, offset within the block, length) of the records of the unwritten block
+        self._block = []
+        self._block_data = bytearray()
+        os.makedirs(output_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(output_dir, f"{glob.escape(prefix)}-[0-9]*.jsonl*")):
+            os.remove(path)
+
+    def write(self, record_id: str, record: dict):
+        """Append a record to the current block, writing the block out once it is full."""
+        data = (json.dumps(record) + "\n").encode("utf-8")
+        self._block.append((record_id, len(self._block_data), len(data)))
+        self._block_data += data
+        if len(self._block_data) >= self.block_bytes:
+            self._write_block()
+
+    def write_all(self, records: Iterable[dict], id_key: str = "id") -> list[str]:
+        """Write a stream of records keyed by their `id_key` field and close the writer.
+
+        Returns:
+            The paths of the written shards.
+        """
+        for record in records:
+            self.write(record[id_key], record)
+        self.close()
+        return self.shard_paths
+
+    def close(self):
+        if self._block:
+            self._write_block()
+        if self._file is not None:
+            self._close_shard()
+
+    def __enter__(self) -> "ShardedJsonlWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_block(self):
+        """Compress the current block into the current shard, starting a new shard if it is full."""
+        data = self._compress(bytes(self._block_data))
+        if self._file is not None and self._offset + len(data) > self.max_shard_bytes:
+            self._close_shard()
+        if self._file is None:
+            self._open_shard()
+        self._file.write(data)
+        for record_id, offset, length in self._block:
+            self._index[record_id] = [self._shard_name, self._offset, len(data), offset, length]
+        self._offset += len(data)
+        self._block = []
+        self._block_data = bytearray()
+
+    def _open_shard(self):
+        self._shard_name = (
+            f"{self.prefix}-{len(self.shard_paths):05d}{EXTENSIONS[self.compression]}"
+        )
+        path = os.path.join(self.output_dir, self._shard_name)
+        self.shard_paths.append(path)
+        self._file = open(path, "wb")
+        self._index = {}
+        self._offset = 0
+
+    def _close_shard(self):
+        self._file.close()
+        self._file = None
+        index_path = os.path.join(self.output_dir, self._shard_name + INDEX_SUFFIX)
+        with open(index_path, "w") as f:
+            json.dump(self._index, f)
+
+
+class ShardedJsonlReader:
+    """Random and sequential access to the shards written by `ShardedJsonlWriter`."""
+
+    def __init__(self, shard_dir: str):
+        """
+        Args:
+            shard_dir: The directory holding the shards and their sidecar indexes.
+        """
+        self.shard_dir = shard_dir
+        self._index = {}
+        for index_path in sorted(glob.glob(os.path.join(shard_dir, "*" + INDEX_SUFFIX))):
+            with open(index_path) as f:
+                self._index.update(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, record_id: str) -> bool:
+        return record_id in self._index
+
+    def ids(self) -> list[str]:
+        return list(self._index)
+
+    def shard_name(self, record_id: str) -> str:
+        """Return the file name of the shard holding a record.
+
+        Raises:
+            KeyError: If no shard holds the record.
+        """
+        return self._index[record_id][0]
+
+    def get(self, record_id: str) -> dict:
+        """Read a single record, decompressing only the block holding it.
+
+        Raises:
+            KeyError: If no shard holds the record.
+        """
+        shard_name, block_offset, block_length, offset, length = self._index[record_id]
+        compression = _compression_of(shard_name)
+        with open(os.path.join(self.shard_dir, shard_name), "rb") as f:
+            if compression is None:
+                f.seek(block_offset + offset)
+                return json.loads(f.read(length))
+            f.seek(block_offset)
+            block = _decompressor(compression)(f.read(block_length))
+        return json.loads(block[offset : offset + length])
+
+    def __iter__(self) -> Iterator[dict]:
+        """Yield every record, shard by shard, in the order they were written."""
+        shards = {}
+        for shard_name, block_offset, block_length, offset, length in self._index.values():
+            blocks = shards.setdefault(shard_name, {})
+            blocks.setdefault((block_offset, block_length), []).append((offset, length))
+        for shard_name in sorted(shards):
+            decompress = _decompressor(_compression_of(shard_name))
+            with open(os.path.join(self.shard_dir, shard_name), "rb") as f:
+                for block_offset, block_length in sorted(shards[shard_name]):
+                    f.seek(block_offset)
+                    block = decompress(f.read(block_length))
+                    for offset, length in sorted(shards[shard_name][block_offset, block_length]):
+                        yield json.loads(block[offset : offset + length])
+
+
+def _compression_of(shard_name: str) -> Optional[str]:
+    for compression, extension in EXTENSIONS.items():
+        if compression is not None and shard_name.endswith(extension):
+            return compression
+    return None
@@ -0,0 +1,297 @@
+import json
+import os
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Optional
+
+from googleapiclient.discovery import Resource
+from googleapiclient.errors import HttpError
+
+from src.gdrive_api.request_executor import execute
+from src.gdrive_api.utils import FOLDER_MIME_TYPE, list_children
+from src.gdrive_api.workers import ServicePool
+
+# Bytes requested by the first range download of a notebook, doubled while cell 0 is incomplete
+INITIAL_RANGE_SIZE = 16 * 1024
+
+METADATA_LINES = {
+    "**Python Topics**": "topic",
+    "**Type**": "type",
+    "**Target Number of Turns (User + Assistant)**": "target_turns",
+}
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+class _Truncated(Exception):
+    """The downloaded prefix ends before the first cell is complete."""
+
+
+def parse_task_metadata(source: str) -> dict[str, str]:
+    """Parse the "**Python Topics** - ..." style lines of a notebook's metadata cell.
+
+    Lines without a " - " separator are skipped.
+
+    Returns:
+        A dictionary with the "topic", "type" and "target_turns" keys that were found.
+    """
+    metadata = {}
+    for line in source.split("\n"):
+        for marker, key in METADATA_LINES.items():
+            if marker in line:
+                _, separator, value = line.partition(" - ")
+                if separator:
+                    metadata[key] = value.strip()
+    return metadata
+
+
+def read_first_cell(data: bytes, complete: bool = False) -> Optional[dict]:
+    """Parse the first cell out of the beginning of a notebook's JSON.
+
+    Only the top-level keys before "cells" and the first cell itself are decoded,
+    the rest of the notebook is never looked at.
+
+    Args:
+        data: A prefix of the notebook file.
+        complete: Whether `data` is the whole file.
+
+    Returns:
+        The first cell, an empty dict if the notebook has no cells, or None if
+        `data` ends before the first cell does and more bytes are needed.
+
+    Raises:
+        ValueError: If the notebook is not valid JSON.
+    """
+    # A multi-byte character cut off by the range is dropped, it can't be part of a complete cell
+    text = data.decode("utf-8", errors="ignore")
+    try:
+        pos = _expect(text, 0, "{")
+        while True:
+            pos = _skip_whitespace(text, pos)
+            if text[pos] == "}":
+                return {}
+            key, pos = _decode(text, pos)
+            pos = _expect(text, pos, ":")
+            if key == "cells":
+                pos = _expect(text, pos, "[")
+                pos = _skip_whitespace(text, pos)
+                if text[pos] == "]":
+                    return {}
+                cell, _ = _decode(text, pos)
+                return cell
+            # Colab saves "metadata" and "nbformat" before "cells", skip over them
+            _, pos = _decode(text, _skip_whitespace(text, pos))
+            pos = _skip_whitespace(text, pos)
+            if text[pos] == ",":
+                pos += 1
+    except (_Truncated, IndexError):
+        if complete:
+            raise ValueError("The notebook is not valid JSON.")
+        return None
+
+
+def _skip_whitespace(text: str, pos: int) -> int:
+    while text[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def _expect(text: str, pos: int, char: str) -> int:
+    pos = _skip_whitespace(text, pos)
+    if text[pos] != char:
+        raise ValueError(f"Expected '{char}' at position {pos} of the notebook.")
+    return pos + 1
+
+
+def _decode(text: str, pos: int):
+    try:
+        return _decoder.raw_decode(text, pos)
+    except json.JSONDecodeError:
+        # A prefix can't tell a value cut off by the range from an invalid one,
+        # invalid notebooks are reported once the whole file was read
+        raise _Truncated()
+
+
+def download_first_cell(
+    service: Resource, file_id: str, initial_size: int = INITIAL_RANGE_SIZE
+) -> dict:
+    """Download a notebook only as far as its first cell, using HTTP range requests.
+
+    Each range continues where the previous one ended and is twice as large, so a
+    notebook is never downloaded past the end of its first cell by more than that.
+
+    Args:
+        service: The Google Drive service resource.
+        file_id: The ID of the notebook in Google Drive.
+        initial_size: Number of bytes requested by the first range.
+
+    Returns:
+        The first cell, or an empty dict if the notebook has no cells.
+    """
+    data = b""
+    size = initial_size
+    while True:
+        request = service.files().get_media(fileId=file_id)
+        request.headers["Range"] = f"bytes={len(data)}-{len(data) + size - 1}"
+        try:
+            chunk = execute(request, "drive.files.get_media")
+        except HttpError as e:
+            if e.resp.status != 416:
+                raise
+            # The previous range ended exactly at the end of the file
+            chunk = b""
+        if len(chunk) > size:
+            # The range was ignored and the whole file was sent
+            data, complete = chunk, True
+        else:
+            data, complete = data + chunk, len(chunk) < size
+        cell = read_first_cell(data, complete)
+        if cell is not None:
+            return cell
+        size *= 2
+
+
+def download_task_metadata(
+    service: Resource, file_id: str, initial_size: int = INITIAL_RANGE_SIZE
+) -> dict[str, str]:
+    """Download the task metadata of a notebook from its first cell.
+
+    Returns:
+        A dictionary with the "topic", "type" and "target_turns" keys that were found.
+    """
+    cell = download_first_cell(service, file_id, initial_size)
+    source = cell.get("source", "")
+    if isinstance(source, list):
+        source = "".join(source)
+    return parse_task_metadata(source)
+
+
+class MetadataCache:
+    """On-disk cache of notebook task metadata keyed by file ID and modification time.
+
+    An entry is only used while the notebook's `modifiedTime` is the one it was read at.
+    The cache is a JSON file of file ID -> {"modifiedTime", "metadata"}.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None):
+        """
+        Args:
+            cache_path: The JSON file to load from and save to. If None, the cache only
+                lives in memory.
+        """
+        self.cache_path = cache_path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                self._entries = json.load(f)
+
+    def get(self, file_id: str, modified_time: str) -> Optional[dict[str, str]]:
+        """Return the cached metadata of a notebook version, or None."""
+        with self._lock:
+            entry = self._entries.get(file_id)
+        if entry and entry["modifiedTime"] == modified_time:
+            return entry["metadata"]
+        return None
+
+    def put(self, file_id: str, modified_time: str, metadata: dict[str, str]):
+        with self._lock:
+            self._entries[file_id] = {"modifiedTime": modified_time, "metadata": metadata}
+
+    def save(self):
+        """Write the cache to disk, atomically replacing the previous version."""
+        if self.cache_path is None:
+            return
+        temp_path = f"{self.cache_path}.tmp"
+        with self._lock:
+            with open(temp_path, "w") as f:
+                json.dump(self._entries, f)
+        os.replace(temp_path, self.cache_path)
+
+
+def list_notebooks(service: Resource, folder_id: str) -> list[dict]:
+    """List the notebooks of a Google Drive folder with the fields needed for caching.
+
+    Returns:
+        The file resources with "id", "name", "modifiedTime" and "webViewLink".
+    """
+    return list(
+        list_children(
+            service,
+            [folder_id],
+            fields="id, name, modifiedTime, webViewLink",
+            query=f"mimeType != '{FOLDER_MIME_TYPE}'",
+        )
+    )
+
+
+def extract_task_metadata(
+    service_factory: Callable[[], Resource],
+    files: Iterable[dict],
+    max_workers: int = 8,
+    cache_path: Optional[str] = None,
+) -> dict[str, dict[str, str]]:
+    """Extract the task metadata of many notebooks over a bounded pool of workers.
+
+    Notebooks whose ID and `modifiedTime` are in the cache are not downloaded at all.
+
+    Args:
+        service_factory: A callable returning a new authorized service, e.g. from
+            `build_service_factory` so all workers share one set of credentials.
+        files: File resources with "id" and "modifiedTime", e.g. from `list_notebooks`.
+            Files without "modifiedTime" have it fetched first.
+        max_workers: Maximum number of concurrent downloads.
+        cache_path: The JSON cache file, created if missing. If None, nothing is cached
+            across calls.
+
+    Returns:
+        A dictionary mapping file IDs to their metadata, in the order of `files`.
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1.")
+    cache = MetadataCache(cache_path)
+    service_pool = ServicePool(service_factory)
+    results = {}
+    pending = []
+    for file in files:
+        results[file["id"]] = None
+        modified_time = file.get("modifiedTime")
+        metadata = cache.get(file["id"], modified_time) if modified_time else None
+        if metadata is None:
+            pending.append(file)
+        else:
+            results[file["id"]] = metadata
+    print(f"{len(results) - len(pending)} notebooks cached, {len(pending)} to download.")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_extract_in_worker, service_pool, cache, file): file["id"]
+                for file in pending
+            }
+            done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in not_done:
+                future.cancel()
+            for future in done:
+                # Re-raises the error of the first failed download, if any
+                results[futures[future]] = future.result()
+    finally:
+        cache.save()
+    return results
+
+
+def _extract_in_worker(service_pool: ServicePool, cache: MetadataCache, file: dict) -> dict:
+    """Extract the metadata of a single notebook using the worker's own service."""
+    service = service_pool.get()
+    modified_time = file.get("modifiedTime")
+    if modified_time is None:
+        modified_time = execute(
+            service.files().get(fileId=file["id"], fields="modifiedTime")
+        )["modifiedTime"]
+        metadata = cache.get(file["id"], modified_time)
+        if metadata is not None:
+            return metadata
+    metadata = download_task_metadata(service, file["id"])
+    cache.put(file["id"], modified_time, metadata)
+    return metadata
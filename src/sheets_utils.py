@@ -1,72 +1,362 @@
+import functools
+import math
+import threading
+from typing import NamedTuple
+
 import pandas as pd
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 
+from src.gdrive_api.auth import build_api, load_credentials
 
 
-def download_sheet_as_df(service_account_path, sheet_id, sheet_name):
-    # Authenticate with the service account
-    scopes = ['https://www.googleapis.com/auth/spreadsheets.readonly']
-    creds = service_account.Credentials.from_service_account_file(
-        service_account_path, scopes=scopes)
-    service = build('sheets', 'v4', credentials=creds)
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    # Only used to read the spreadsheet's revision for the read cache
+    'https://www.googleapis.com/auth/drive.metadata.readonly',
+]
+
+
+def _column_letter(column_number):
+    """
+    Converts a 1-based column number to its A1 letters, e.g. 27 -> 'AA'.
+    """
+    letters = ''
+    while column_number > 0:
+        column_number, remainder = divmod(column_number - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
 
-    # Construct the range to read
-    sheet_range = f"{sheet_name}!A:Z"  # Adjust the range A:Z as needed
+def _quote_sheet_name(sheet_name):
+    return "'" + sheet_name.replace("'", "''") + "'"
 
-    # Make the API request
-    result = service.spreadsheets().values().get(
-        spreadsheetId=sheet_id, range=sheet_range).execute()
-    values = result.get('values', [])
 
-    # Convert to a DataFrame
+def _cell_text(value):
+    """
+    Returns a value the way the Sheets API reads it back, so unchanged cells compare equal.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _values_to_df(values):
     if not values:
-        print("No data found.")
         return pd.DataFrame()
-    else:
-        return pd.DataFrame(values[1:], columns=values[0])
-    
+    return pd.DataFrame(values[1:], columns=values[0])
+
+
+class SheetWriteReport(NamedTuple):
+    cells_written: int
+    rows_updated: int
+    rows_appended: int
+    requests: int
 
 
-def upload_df_to_sheet(service_account_path, sheet_id, sheet_name, df):
+class SheetsClient:
     """
-    Uploads headers and data from a DataFrame to a Google Sheet.
+    Google Sheets client holding one set of credentials and one service.
+
+    Tab reads are cached per spreadsheet revision: as long as the spreadsheet
+    is unchanged, reading a tab again costs a single revision lookup instead of
+    downloading its values.
+    """
+
+    def __init__(self, service_account_path, num_retries=3):
+        """
+        :param service_account_path: Path to the service account JSON key file.
+        :param num_retries: Number of retries of a request failing with a retryable error.
+        """
+        self.credentials = load_credentials(service_account_path, SCOPES)
+        self.service = build_api('sheets', 'v4', self.credentials)
+        self.drive_service = build_api('drive', 'v3', self.credentials)
+        self.num_retries = num_retries
+        # (spreadsheet ID, sheet name) -> (revision, values)
+        self._values = {}
+        # spreadsheet ID -> (revision, {sheet name: (row count, column count)})
+        self._grids = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_services(cls, service, drive_service, num_retries=3):
+        """
+        Creates a client around already built Sheets and Drive services.
+        """
+        client = cls.__new__(cls)
+        client.credentials = None
+        client.service = service
+        client.drive_service = drive_service
+        client.num_retries = num_retries
+        client._values = {}
+        client._grids = {}
+        client._lock = threading.Lock()
+        return client
+
+    def revision(self, sheet_id):
+        """
+        Returns the current revision of a spreadsheet, which changes on every edit.
+        """
+        response = self.drive_service.files().get(
+            fileId=sheet_id, fields='version').execute(num_retries=self.num_retries)
+        return response['version']
+
+    def grid_sizes(self, sheet_id, revision=None):
+        """
+        Returns a dictionary mapping the sheet names of a spreadsheet to their (row count, column count).
+        """
+        with self._lock:
+            cached = self._grids.get(sheet_id)
+        if cached is not None and revision is not None and cached[0] == revision:
+            return cached[1]
+        response = self.service.spreadsheets().get(
+            spreadsheetId=sheet_id,
+            fields='sheets.properties(title,gridProperties(rowCount,columnCount))',
+        ).execute(num_retries=self.num_retries)
+        sizes = {
+            sheet['properties']['title']: (
+                sheet['properties']['gridProperties']['rowCount'],
+                sheet['properties']['gridProperties']['columnCount'],
+            )
+            for sheet in response.get('sheets', [])
+        }
+        with self._lock:
+            self._grids[sheet_id] = (revision, sizes)
+        return sizes
+
+    def sheet_range(self, sheet_id, sheet_name, revision=None):
+        """
+        Returns the A1 range covering every row and column of a sheet.
+        """
+        sizes = self.grid_sizes(sheet_id, revision)
+        if sheet_name not in sizes:
+            raise ValueError(f"Sheet '{sheet_name}' not found in spreadsheet '{sheet_id}'.")
+        row_count, column_count = sizes[sheet_name]
+        return f"{_quote_sheet_name(sheet_name)}!A1:{_column_letter(column_count)}{row_count}"
+
+    def read_values(self, sheet_id, sheet_names):
+        """
+        Reads the values of several tabs of a spreadsheet with a single batchGet request.
+        Tabs unchanged since they were last read are served from the cache.
+
+        :param sheet_id: The ID of the spreadsheet.
+        :param sheet_names: The names of the tabs to read.
+        :return: A dictionary mapping each sheet name to its rows of values.
+        """
+        revision = self.revision(sheet_id)
+        results = {}
+        missing = []
+        with self._lock:
+            for sheet_name in sheet_names:
+                cached = self._values.get((sheet_id, sheet_name))
+                if cached is not None and cached[0] == revision:
+                    results[sheet_name] = cached[1]
+                else:
+                    missing.append(sheet_name)
+        if missing:
+            ranges = [self.sheet_range(sheet_id, name, revision) for name in missing]
+            response = self.service.spreadsheets().values().batchGet(
+                spreadsheetId=sheet_id, ranges=ranges, fields='valueRanges(values)',
+            ).execute(num_retries=self.num_retries)
+            with self._lock:
+                for sheet_name, value_range in zip(missing, response.get('valueRanges', [])):
+                    values = value_range.get('values', [])
+                    self._values[(sheet_id, sheet_name)] = (revision, values)
+                    results[sheet_name] = values
+        return {sheet_name: results[sheet_name] for sheet_name in sheet_names}
+
+    def read_dfs(self, sheet_id, sheet_names):
+        """
+        Reads several tabs of a spreadsheet into DataFrames, using their first row as headers.
+
+        :return: A dictionary mapping each sheet name to its DataFrame.
+        """
+        return {
+            sheet_name: _values_to_df(values)
+            for sheet_name, values in self.read_values(sheet_id, sheet_names).items()
+        }
+
+    def read_df(self, sheet_id, sheet_name):
+        return self.read_dfs(sheet_id, [sheet_name])[sheet_name]
+
+    def invalidate(self, sheet_id=None):
+        """
+        Drops the cached values of a spreadsheet, or of every spreadsheet if none is given.
+        """
+        with self._lock:
+            if sheet_id is None:
+                self._values.clear()
+                self._grids.clear()
+            else:
+                self._values = {k: v for k, v in self._values.items() if k[0] != sheet_id}
+                self._grids.pop(sheet_id, None)
+
+    def add_sheets(self, sheet_id, sheet_names):
+        """
+        Adds the tabs that a spreadsheet does not have yet, with a single batchUpdate request.
+
+        :return: The names of the tabs that were added.
+        """
+        existing = self.grid_sizes(sheet_id, self.revision(sheet_id))
+        missing = [name for name in dict.fromkeys(sheet_names) if name not in existing]
+        if missing:
+            self.service.spreadsheets().batchUpdate(
+                spreadsheetId=sheet_id,
+                body={'requests': [{'addSheet': {'properties': {'title': name}}} for name in missing]},
+            ).execute(num_retries=self.num_retries)
+            with self._lock:
+                self._grids.pop(sheet_id, None)
+        return missing
+
+    def update_values(self, sheet_id, sheet_name, values):
+        self.service.spreadsheets().values().update(
+            spreadsheetId=sheet_id, range=_quote_sheet_name(sheet_name),
+            valueInputOption='USER_ENTERED', body={'values': values},
+        ).execute(num_retries=self.num_retries)
+
+    def append_values(self, sheet_id, sheet_name, values):
+        self.service.spreadsheets().values().append(
+            spreadsheetId=sheet_id, range=_quote_sheet_name(sheet_name),
+            valueInputOption='USER_ENTERED', body={'values': values},
+        ).execute(num_retries=self.num_retries)
+
+    def write_df_incremental(self, sheet_id, sheet_name, df, key_column='task_link',
+                             append_chunk_rows=500, ranges_per_request=1000):
+        """
+        Writes only the cells of a DataFrame that differ from a sheet, matching rows by a key column.
+
+        Rows whose key is already in the sheet get their changed cells rewritten with
+        values().batchUpdate, one range per run of adjacent changed cells. Rows with a
+        new key are appended in chunks. Sheet rows and columns missing from the
+        DataFrame are left untouched, so edits made by others to them are kept.
+
+        :param sheet_id: The ID of the spreadsheet.
+        :param sheet_name: The name of the tab to write to.
+        :param df: The DataFrame to write, with a `key_column` column of unique keys.
+        :param key_column: The column identifying a row, e.g. 'task_link'.
+        :param append_chunk_rows: Maximum number of new rows per append request.
+        :param ranges_per_request: Maximum number of ranges per batchUpdate request.
+        :return: A SheetWriteReport with the number of cells written and requests made.
+        """
+        if key_column not in df.columns:
+            raise ValueError(f"Key column '{key_column}' not in the DataFrame.")
+        current = self.read_values(sheet_id, [sheet_name])[sheet_name]
+        columns = df.columns.tolist()
+        rows = df.astype(object).where(pd.notna(df), '').values.tolist()
+        if not current:
+            values = [columns] + rows
+            self.update_values(sheet_id, sheet_name, values)
+            report = SheetWriteReport(sum(len(row) for row in values), 0, len(rows), 1)
+            print(f"Wrote {report.cells_written} cells to empty sheet '{sheet_name}'.")
+            return report
+
+        header = list(current[0])
+        data = []
+        new_columns = [column for column in columns if column not in header]
+        if new_columns:
+            data.append(self._row_range(sheet_name, 1, len(header), new_columns))
+            header += new_columns
+        positions = [header.index(column) for column in columns]
+        key_position = header.index(key_column)
+        key_index = columns.index(key_column)
+        sheet_rows = {}
+        for row_number, row in enumerate(current[1:], start=2):
+            if key_position < len(row):
+                sheet_rows.setdefault(row[key_position], (row_number, row))
+
+        rows_updated = 0
+        appended = []
+        for row in rows:
+            match = sheet_rows.get(_cell_text(row[key_index]))
+            if match is None:
+                new_row = [''] * len(header)
+                for position, value in zip(positions, row):
+                    new_row[position] = value
+                appended.append(new_row)
+                continue
+            row_number, sheet_row = match
+            changed = {
+                position: value
+                for position, value in zip(positions, row)
+                if _cell_text(value) != (sheet_row[position] if position < len(sheet_row) else '')
+            }
+            if not changed:
+                continue
+            rows_updated += 1
+            # One range per run of adjacent changed columns
+            run = []
+            for position in sorted(changed):
+                if run and position != run[-1] + 1:
+                    data.append(self._row_range(sheet_name, row_number, run[0],
+                                                [changed[p] for p in run]))
+                    run = []
+                run.append(position)
+            data.append(self._row_range(sheet_name, row_number, run[0], [changed[p] for p in run]))
+
+        requests = 0
+        for start in range(0, len(data), ranges_per_request):
+            self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=sheet_id,
+                body={'valueInputOption': 'USER_ENTERED', 'data': data[start:start + ranges_per_request]},
+            ).execute(num_retries=self.num_retries)
+            requests += 1
+        for start in range(0, len(appended), append_chunk_rows):
+            self.append_values(sheet_id, sheet_name, appended[start:start + append_chunk_rows])
+            requests += 1
+
+        cells_written = sum(len(d['values'][0]) for d in data) + sum(len(r) for r in appended)
+        report = SheetWriteReport(cells_written, rows_updated, len(appended), requests)
+        print(
+            f"Wrote {report.cells_written} cells to sheet '{sheet_name}': {report.rows_updated} rows "
+            f"updated, {report.rows_appended} rows appended in {report.requests} requests."
+        )
+        return report
+
+    @staticmethod
+    def _row_range(sheet_name, row_number, first_position, values):
+        first = _column_letter(first_position + 1)
+        last = _column_letter(first_position + len(values))
+        return {
+            'range': f"{_quote_sheet_name(sheet_name)}!{first}{row_number}:{last}{row_number}",
+            'values': [values],
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def get_client(service_account_path):
+    """
+    Returns the SheetsClient of a service account, created on first use and shared afterwards.
     """
-    # Authenticate with the service account
-    scopes = ['https://www.googleapis.com/auth/spreadsheets']
-    creds = service_account.Credentials.from_service_account_file(
-        service_account_path, scopes=scopes)
-    service = build('sheets', 'v4', credentials=creds)
+    return SheetsClient(service_account_path)
 
-    # Construct the range to write
-    sheet_range = f"{sheet_name}!A:Z"  # Adjust the range A:Z as needed
 
+def download_sheet_as_df(service_account_path, sheet_id, sheet_name):
+    df = get_client(service_account_path).read_df(sheet_id, sheet_name)
+    if df.empty:
+        print("No data found.")
+    return df
+
+
+def upload_df_to_sheet(service_account_path, sheet_id, sheet_name, df, key_column=None):
+    """
+    Uploads headers and data from a DataFrame to a Google Sheet.
+
+    With a key column, only the cells that changed are written, see `SheetsClient.write_df_incremental`.
+    """
+    if key_column is not None:
+        return get_client(service_account_path).write_df_incremental(
+            sheet_id, sheet_name, df, key_column)
     # Convert the DataFrame to a 2D list of values
     values = [df.columns.tolist()] + df.values.tolist()
-
-    # Make the API request
-    body = {'values': values}
-    service.spreadsheets().values().update(
-        spreadsheetId=sheet_id, range=sheet_range,
-        valueInputOption='USER_ENTERED', body=body).execute()
-    
+    get_client(service_account_path).update_values(sheet_id, sheet_name, values)
 
 
 def create_new_sheet_from_df(service_account_path, sheet_id, sheet_name, df):
     """
     Creates a new sheet and populates it with headers and data from a DataFrame.
     """
-    # Authenticate with the service account
-    scopes = ['https://www.googleapis.com/auth/spreadsheets']
-    creds = service_account.Credentials.from_service_account_file(
-        service_account_path, scopes=scopes)
-    service = build('sheets', 'v4', credentials=creds)
-
     # Convert the DataFrame to a 2D list of values
     values = [df.columns.tolist()] + df.values.tolist()
-
-    # Make the API request
-    body = {'values': values}
-    service.spreadsheets().values().append(
-        spreadsheetId=sheet_id, range=sheet_name,
-        valueInputOption='USER_ENTERED', body=body).execute()
\ No newline at end of file
+    get_client(service_account_path).append_values(sheet_id, sheet_name, values)
@@ -0,0 +1,346 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, NamedTuple, Optional
+
+from src.gdrive_api.instrumentation import progress
+from src.gdrive_api.job_journal import open_jsonl_for_append
+from src.gdrive_api.request_executor import RETRYABLE_STATUSES, RequestExecutor
+
+try:
+    import openai
+except ImportError:
+    openai = None
+
+DEFAULT_MODEL = "gpt-4-1106-preview"
+
+# OpenAI's requests-per-minute limit of the lowest paid tier for GPT-4 Turbo
+DEFAULT_REQUESTS_PER_MINUTE = 500
+
+QUERY_SYSTEM_PROMPT = """IDENTITY:
+You are a world class Python developer. And you're concise and precise.
+
+CONTEXT:
+We are trying to generate human-like queries that a user would send to an ai assistant through a chat interface.
+The user's query tone & structure should be diversified as much as possible making sure to include some realistic examples.
+
+CONSTRAINTS:
+1. Python Related
+2. Easy (Solvable by a median developer in 15 minutes)
+3. Questions should elicit a response that includes code.
+
+INSTRUCTION:
+You will be given a topic and an ask for number of questions to generate.
+Act accordingly.
+
+RESPONSE FORMAT:
+A JSON-valid list of questions(strings) like {"questions": ["question1", "question2", ...]}
+"""
+
+MODIFICATION_SYSTEM_PROMPT = """IDENTITY:
+You are a world class Python developer. And you're concise and precise.
+
+CONTEXT:
+We are trying to generate human-like code modification requests that a user would send to an ai assistant through a chat interface.
+The user's query tone & structure should be diversified as much as possible making sure to include some realistic examples.
+
+CONSTRAINTS:
+1. Python Related
+2. Easy (Solvable by a median developer in 15 minutes)
+3. Questions should include code along with a request to modify it.
+
+INSTRUCTION:
+You will be given a topic and an ask for number of questions to generate.
+Act accordingly.
+
+RESPONSE FORMAT:
+A JSON-valid list of questions(strings) like {"questions": ["question1", "question2", ...]}
+    """
+
+
+class TaskPrompt(NamedTuple):
+    """A kind of task to generate for every topic.
+
+    Attributes:
+        type: The task type written to the metadata, e.g. `query` or `modification`.
+        system_prompt: The system message, asking for a {"questions": [...]} JSON object.
+        user_prompt: The user message, formatted with `topic` and `n`.
+        n: Number of tasks to ask for per topic.
+    """
+
+    type: str
+    system_prompt: str
+    user_prompt: str
+    n: int
+
+
+QUERY_PROMPT = TaskPrompt("query", QUERY_SYSTEM_PROMPT, "Topic: {topic} \nNumber of questions: {n}", 5)
+MODIFICATION_PROMPT = TaskPrompt(
+    "modification",
+    MODIFICATION_SYSTEM_PROMPT,
+    "Topic: {topic} \nNumber of code modification requests: {n}",
+    3,
+)
+
+
+class GenerationReport(NamedTuple):
+    tasks_written: int
+    requests_sent: int
+    cache_hits: int
+    # (topic, task type) -> error message, for the topics left to a rerun
+    failed: dict
+
+
+class ChatRequestExecutor(RequestExecutor):
+    """A `RequestExecutor` for chat-completion calls, retrying the OpenAI client's transient errors.
+
+    Rate limit (429), server (5xx), connection and timeout errors are retried. Use a
+    separate instance from the Drive one, the two APIs have unrelated quotas.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE, **kwargs):
+        """
+        Args:
+            requests_per_minute: Sustained request rate. None disables the rate limit.
+            **kwargs: Passed on to `RequestExecutor`, e.g. `max_retries`.
+        """
+        super().__init__(
+            queries_per_second=requests_per_minute / 60 if requests_per_minute else None, **kwargs
+        )
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        status = getattr(error, "status_code", None)
+        if status is not None:
+            return status in RETRYABLE_STATUSES
+        if openai is not None and isinstance(error, openai.APIConnectionError):
+            return True
+        return RequestExecutor.is_retryable(error)
+
+
+class _ChatRequest:
+    """A chat-completions call in the shape `RequestExecutor.execute` expects."""
+
+    methodId = "openai.chat.completions.create"
+
+    def __init__(self, client, **params):
+        self.client = client
+        self.params = params
+
+    def execute(self):
+        return self.client.chat.completions.create(**self.params)
+
+
+class ResponseCache:
+    """Append-only JSONL cache of chat-completion responses.
+
+    A response is keyed by a hash of the model, messages, temperature and seed of its
+    request and appended as soon as it arrives, so a run that dies or fails on some
+    topics keeps every response it got. A truncated last line, left by a crash
+    mid-write, is ignored on load and cut off before appending.
+    """
+
+    def __init__(self, cache_path: str):
+        """
+        Args:
+            cache_path: The JSONL file to load from and append to. Created if missing.
+        """
+        self.cache_path = cache_path
+        self._responses = {}
+        self._lock = threading.Lock()
+        if os.path.exists(cache_path):
+            with open(cache_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self._responses[record["key"]] = record["content"]
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        self._file = open_jsonl_for_append(cache_path)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> "ResponseCache":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    @staticmethod
+    def key(model: str, messages: list[dict], temperature: float, seed: Optional[int]) -> str:
+        request = json.dumps([model, messages, temperature, seed], sort_keys=True)
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._responses.get(key)
+
+    def put(self, key: str, content: str):
+        with self._lock:
+            self._responses[key] = content
+            self._file.write(json.dumps({"key": key, "content": content}) + "\n")
+            self._file.flush()
+
+
+def generate_tasks(
+    client,
+    topics: Iterable[str],
+    output_path: str,
+    cache_path: Optional[str] = "generation_cache.jsonl",
+    prompts: Iterable[TaskPrompt] = (QUERY_PROMPT, MODIFICATION_PROMPT),
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.0,
+    seed: Optional[int] = 42,
+    max_tokens: int = 4096,
+    max_workers: int = 8,
+    executor: Optional[ChatRequestExecutor] = None,
+    difficulty: str = "Easy",
+    target_length: int = 1,
+) -> GenerationReport:
+    """Generate seed tasks for every topic and prompt, concurrently, and stream them to JSONL.
+
+    One chat-completions request is sent per topic and prompt, up to `max_workers` at a
+    time, under the rate limit of `executor` and retrying its transient errors. Responses
+    found in the cache are used without a request, and new ones are added to it as they
+    arrive, so a rerun only pays for what is missing. A topic whose request still fails,
+    or whose response isn't a {"questions": [...]} object, is reported and skipped while
+    the other topics go on.
+
+    Every task is written to `output_path` as soon as its response is in, one line per
+    task in the problem format the notebooks use:
+    {"metadata": {"topic", "type", "difficulty", "target_length"}, "messages": [...]}.
+    Lines come in completion order, so sort them if the order matters.
+
+    Per-topic progress is not printed but emitted as events to the installed
+    instrumentation, see `src.gdrive_api.instrumentation`.
+
+    Args:
+        client: An `openai.OpenAI` client, or any client with the same
+            `chat.completions.create`. Point its `base_url` at a local stub to test.
+        topics: The topics, e.g. from `src.batch_planner.load_topic_hierarchy`.
+        output_path: The JSONL file to write the tasks to, overwritten.
+        cache_path: The JSONL response cache, created if missing. None disables caching.
+        prompts: The kinds of task to generate for every topic.
+        model: The chat model.
+        temperature: Sampling temperature.
+        seed: Sampling seed, for responses as reproducible as the API allows.
+        max_tokens: Maximum number of tokens per response.
+        max_workers: Maximum number of requests in flight.
+        executor: Rate limit and retry policy. Defaults to a `ChatRequestExecutor` with
+            its default requests per minute.
+        difficulty: The difficulty written to the metadata.
+        target_length: The target length written to the metadata.
+
+    Returns:
+        A `GenerationReport`.
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1.")
+    if executor is None:
+        executor = ChatRequestExecutor()
+    if hasattr(client, "with_options"):
+        # Retries go through the executor, so they are counted and spaced out by its backoff
+        client = client.with_options(max_retries=0)
+
+    # Looped over once per prompt, so a generator must not be used up by the first one
+    topics = list(topics)
+    jobs = []
+    for prompt in prompts:
+        for topic in topics:
+            messages = [
+                {"role": "system", "content": prompt.system_prompt},
+                {"role": "user", "content": prompt.user_prompt.format(topic=topic, n=prompt.n)},
+            ]
+            jobs.append((topic, prompt, messages, ResponseCache.key(model, messages, temperature, seed)))
+
+    def request(messages: list[dict]) -> str:
+        response = executor.execute(
+            _ChatRequest(
+                client,
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                seed=seed,
+                response_format={"type": "json_object"},
+            )
+        )
+        return response.choices[0].message.content
+
+    cache = ResponseCache(cache_path) if cache_path is not None else None
+    tasks_written = 0
+    requests_sent = 0
+    cache_hits = 0
+    failed = {}
+    try:
+        with open(output_path, "w") as output, ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {}
+            completed = []
+            for job in jobs:
+                content = cache.get(job[3]) if cache is not None else None
+                if content is None:
+                    futures[pool.submit(request, job[2])] = job
+                else:
+                    completed.append((job, content, None))
+            cache_hits = len(completed)
+            requests_sent = len(futures)
+
+            def results():
+                yield from completed
+                for future in as_completed(futures):
+                    error = future.exception()
+                    yield futures[future], None if error else future.result(), error
+
+            for (topic, prompt, _, key), content, error in results():
+                try:
+                    if error is not None:
+                        raise error
+                    questions = _parse_questions(content)
+                except Exception as e:
+                    failed[(topic, prompt.type)] = str(e)
+                    progress("failed", topic, prompt.type)
+                    continue
+                if cache is not None and cache.get(key) is None:
+                    cache.put(key, content)
+                for question in questions:
+                    problem = {
+                        "metadata": {
+                            "topic": topic,
+                            "type": prompt.type,
+                            "difficulty": difficulty,
+                            "target_length": target_length,
+                        },
+                        "messages": [{"role": "user", "content": question}],
+                    }
+                    output.write(json.dumps(problem, ensure_ascii=False) + "\n")
+                output.flush()
+                tasks_written += len(questions)
+                progress("generated", topic, prompt.type)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    print("=" * 60)
+    print(
+        f"Generated {tasks_written} tasks for {len(jobs) - len(failed)} out of {len(jobs)} "
+        f"topic prompts, {requests_sent} requests sent, {cache_hits} answered from the cache."
+    )
+    if failed:
+        print(f"Failed {len(failed)} topic prompts, rerun to retry them:")
+        for (topic, task_type), message in failed.items():
+            print(f"  {topic} ({task_type}): {message}")
+    print("=" * 60)
+    return GenerationReport(tasks_written, requests_sent, cache_hits, failed)
+
+
+def _parse_questions(content: str) -> list[str]:
+    questions = json.loads(content)["questions"]
+    if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+        raise ValueError("The response's 'questions' is not a list of strings.")
+    return questions
@@ -0,0 +1,268 @@
+import hashlib
+import json
+import os
+from typing import Callable, NamedTuple, Optional
+
+import pandas as pd
+
+from src.sheets_utils import SheetsClient
+
+COMPLETED_STATUS = "Completed"
+REVIEW_AUTHOR_COLUMN = "Author Email"
+
+TASK_CATEGORY_COLUMNS = [
+    "assigned_to_email",
+    "completion_status",
+    "metadata__type",
+    "metadata__topic",
+    "metadata__target_length",
+]
+
+SNAPSHOT_FORMATS = ("parquet", "feather")
+
+
+def _normalize_emails(emails: pd.Series) -> pd.Series:
+    emails = emails.astype("string").str.strip().str.lower()
+    return emails.mask(emails == "").astype("category")
+
+
+def type_tasks(tasks: pd.DataFrame) -> pd.DataFrame:
+    """Convert the all-string task tab to proper dtypes.
+
+    `completion_date` becomes a datetime and `duration_mins` a number, unparseable
+    values becoming NaT/NaN. Emails are lowercased, emails, status and metadata
+    columns become categoricals and empty cells become missing values.
+    """
+    tasks = tasks.copy()
+    if "completion_date" in tasks:
+        tasks["completion_date"] = pd.to_datetime(
+            tasks["completion_date"], errors="coerce", format="mixed"
+        )
+    if "duration_mins" in tasks:
+        tasks["duration_mins"] = pd.to_numeric(tasks["duration_mins"], errors="coerce")
+    if "assigned_to_email" in tasks:
+        tasks["assigned_to_email"] = _normalize_emails(tasks["assigned_to_email"])
+    for column in TASK_CATEGORY_COLUMNS[1:]:
+        if column in tasks:
+            values = tasks[column].astype("string").str.strip()
+            tasks[column] = values.mask(values == "").astype("category")
+    return tasks
+
+
+def type_reviews(reviews: pd.DataFrame, author_column: str = REVIEW_AUTHOR_COLUMN) -> pd.DataFrame:
+    """Convert the all-string review tab to proper dtypes, with the author emails as a categorical."""
+    reviews = reviews.copy()
+    if author_column in reviews:
+        reviews[author_column] = _normalize_emails(reviews[author_column])
+    return reviews
+
+
+def _completed(tasks: pd.DataFrame) -> pd.DataFrame:
+    return tasks[tasks["completion_status"] == COMPLETED_STATUS]
+
+
+def annotator_throughput(tasks: pd.DataFrame) -> pd.DataFrame:
+    """Per-annotator completed tasks, time spent and throughput.
+
+    Returns:
+        A frame indexed by annotator email with the columns completed, total_mins,
+        mean_mins, tasks_per_hour, active_days and tasks_per_active_day.
+    """
+    completed = _completed(tasks)
+    completed = completed.assign(completion_day=completed["completion_date"].dt.normalize())
+    grouped = completed.groupby("assigned_to_email", observed=True)
+    throughput = grouped.agg(
+        completed=("task_link", "size"),
+        # NaN rather than 0 when no duration is known, so tasks_per_hour isn't infinite
+        total_mins=("duration_mins", lambda durations: durations.sum(min_count=1)),
+        mean_mins=("duration_mins", "mean"),
+        active_days=("completion_day", "nunique"),
+    )
+    throughput["tasks_per_hour"] = throughput["completed"] / (throughput["total_mins"] / 60)
+    throughput["tasks_per_active_day"] = throughput["completed"] / throughput["active_days"]
+    return throughput.sort_values("completed", ascending=False)
+
+
+def review_coverage(
+    tasks: pd.DataFrame, reviews: pd.DataFrame, author_column: str = REVIEW_AUTHOR_COLUMN
+) -> pd.DataFrame:
+    """Per-annotator review counts against their completed tasks.
+
+    Returns:
+        A frame indexed by annotator email with the columns completed, reviews,
+        coverage (reviews per completed task) and needs_review, for every annotator
+        with at least one completed task.
+    """
+    completed = _completed(tasks)["assigned_to_email"].value_counts().rename("completed")
+    reviewed = reviews[author_column].value_counts().rename("reviews")
+    coverage = pd.concat([completed, reviewed], axis=1, join="outer").fillna(0).astype(int)
+    coverage = coverage[coverage["completed"] > 0]
+    coverage.index = coverage.index.astype(str)
+    coverage["coverage"] = coverage["reviews"] / coverage["completed"]
+    coverage["needs_review"] = coverage["reviews"] == 0
+    return coverage.sort_values(["needs_review", "completed"], ascending=False)
+
+
+def topic_backlog(tasks: pd.DataFrame, by: str = "metadata__topic") -> pd.DataFrame:
+    """Task counts per topic and status, with the not yet completed ones as backlog.
+
+    Returns:
+        A frame indexed by `by` with one count column per status plus total, backlog
+        and completion_rate, largest backlog first.
+    """
+    backlog = pd.crosstab(tasks[by], tasks["completion_status"].astype(str))
+    backlog["total"] = backlog.sum(axis=1)
+    done = backlog[COMPLETED_STATUS] if COMPLETED_STATUS in backlog else 0
+    backlog["backlog"] = backlog["total"] - done
+    backlog["completion_rate"] = done / backlog["total"]
+    return backlog.sort_values("backlog", ascending=False)
+
+
+def time_to_completion(tasks: pd.DataFrame, by: str = "metadata__type") -> pd.DataFrame:
+    """Distribution of `duration_mins` of completed tasks, per group.
+
+    Returns:
+        A frame indexed by `by` with the columns completed, mean, p50 and p90 in minutes.
+    """
+    durations = _completed(tasks).groupby(by, observed=True)["duration_mins"]
+    return pd.DataFrame(
+        {
+            "completed": durations.size(),
+            "mean": durations.mean(),
+            "p50": durations.median(),
+            "p90": durations.quantile(0.9),
+        }
+    )
+
+
+class TeamReport(NamedTuple):
+    throughput: pd.DataFrame
+    coverage: pd.DataFrame
+    backlog: pd.DataFrame
+    time_to_completion: pd.DataFrame
+
+
+def build_report(
+    tasks: pd.DataFrame, reviews: pd.DataFrame, author_column: str = REVIEW_AUTHOR_COLUMN
+) -> TeamReport:
+    """Compute every table of the team report from typed task and review tabs."""
+    return TeamReport(
+        annotator_throughput(tasks),
+        review_coverage(tasks, reviews, author_column),
+        topic_backlog(tasks),
+        time_to_completion(tasks),
+    )
+
+
+class SnapshotStore:
+    """Typed snapshots of spreadsheet tabs on disk, keyed by the spreadsheet revision.
+
+    While the spreadsheet is unchanged, loading the tabs costs a single revision lookup
+    and a local Parquet or Feather read instead of downloading and re-typing every value.
+    """
+
+    def __init__(self, snapshot_dir: str, snapshot_format: str = "parquet"):
+        """
+        Args:
+            snapshot_dir: The directory to keep the snapshots in. Created if missing.
+            snapshot_format: "parquet" or "feather". Both need pyarrow.
+        """
+        if snapshot_format not in SNAPSHOT_FORMATS:
+            raise ValueError(f"Invalid snapshot format. Must be one of {list(SNAPSHOT_FORMATS)}")
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_format = snapshot_format
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+    def _path(self, sheet_id: str, sheet_name: str) -> str:
+        name = "".join(c if c.isalnum() else "_" for c in sheet_name)
+        # Tells apart names sanitized alike, e.g. "Batch 1" and "Batch_1"
+        digest = hashlib.sha1(sheet_name.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(
+            self.snapshot_dir, f"{sheet_id}__{name}_{digest}.{self.snapshot_format}"
+        )
+
+    def _revisions_path(self, sheet_id: str) -> str:
+        return os.path.join(self.snapshot_dir, f"{sheet_id}__revision.json")
+
+    def load(
+        self,
+        client: SheetsClient,
+        sheet_id: str,
+        typers: dict[str, Callable[[pd.DataFrame], pd.DataFrame]],
+    ) -> dict[str, pd.DataFrame]:
+        """Load typed tabs from the snapshots, downloading them only if the spreadsheet changed.
+
+        Args:
+            client: The SheetsClient to check the revision and download tabs with.
+            sheet_id: The ID of the spreadsheet.
+            typers: A dictionary mapping each sheet name to the function typing its frame,
+                e.g. `type_tasks`.
+
+        Returns:
+            A dictionary mapping each sheet name to its typed frame.
+        """
+        revision = client.revision(sheet_id)
+        saved = {}
+        if os.path.exists(self._revisions_path(sheet_id)):
+            with open(self._revisions_path(sheet_id)) as f:
+                saved = json.load(f)
+        fresh = [
+            name
+            for name in typers
+            if saved.get(name) == revision and os.path.exists(self._path(sheet_id, name))
+        ]
+        frames = {name: self._read(self._path(sheet_id, name)) for name in fresh}
+        stale = [name for name in typers if name not in frames]
+        if stale:
+            print(f"Downloading {len(stale)} changed tabs: {', '.join(stale)}.")
+            for name, df in client.read_dfs(sheet_id, stale).items():
+                frames[name] = typers[name](df)
+                self._write(frames[name], self._path(sheet_id, name))
+                saved[name] = revision
+            temp_path = f"{self._revisions_path(sheet_id)}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(saved, f)
+            os.replace(temp_path, self._revisions_path(sheet_id))
+        return {name: frames[name] for name in typers}
+
+    def _read(self, path: str) -> pd.DataFrame:
+        if self.snapshot_format == "parquet":
+            return pd.read_parquet(path)
+        return pd.read_feather(path)
+
+    def _write(self, df: pd.DataFrame, path: str):
+        # Feather only stores a default index
+        df = df.reset_index(drop=True)
+        if self.snapshot_format == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            df.to_feather(path)
+
+
+def load_team_report(
+    client: SheetsClient,
+    sheet_id: str,
+    tasks_sheet_name: str,
+    reviews_sheet_name: str,
+    snapshot_dir: Optional[str] = None,
+    snapshot_format: str = "parquet",
+) -> TeamReport:
+    """Load the task and review tabs with proper dtypes and compute the team report.
+
+    Args:
+        client: The SheetsClient to read the spreadsheet with.
+        sheet_id: The ID of the spreadsheet holding both tabs.
+        tasks_sheet_name: The name of the task tab, e.g. "Conversations_Batch_3".
+        reviews_sheet_name: The name of the review tab, e.g. "Reviews".
+        snapshot_dir: The directory of the tab snapshots. If None, both tabs are downloaded.
+        snapshot_format: "parquet" or "feather".
+    """
+    typers = {tasks_sheet_name: type_tasks, reviews_sheet_name: type_reviews}
+    if snapshot_dir is None:
+        frames = {
+            name: typers[name](df)
+            for name, df in client.read_dfs(sheet_id, list(typers)).items()
+        }
+    else:
+        frames = SnapshotStore(snapshot_dir, snapshot_format).load(client, sheet_id, typers)
+    return build_report(frames[tasks_sheet_name], frames[reviews_sheet_name])